@@ -2,345 +2,145 @@
 Plan de Acción • SERVQUAL (modo dual)
 
 Este archivo funciona en dos modos:
-1) **Modo Streamlit** (UI completa): si el paquete `streamlit` está disponible, se
-   renderiza la interfaz como app web para crear/editar/exportar la matriz.
-2) **Modo librería** (sin Streamlit): si NO hay `streamlit`, el módulo se puede
-   importar sin errores. En este modo quedan accesibles las funciones de
-   manipulación de datos (carga, guardado, alta por dimensión, etc.), lo que
-   permite correr pruebas o usar el código desde otros scripts.
+1) **Modo Streamlit** (UI completa): ``streamlit run streamlit_app.py`` (o
+   este mismo archivo) renderiza la interfaz web para crear/editar/exportar la
+   matriz.
+2) **Modo librería** (sin Streamlit): importar el módulo **nunca** importa
+   Streamlit ni lanza la UI. Quedan accesibles las funciones de manipulación
+   de datos (carga, guardado, alta por dimensión, etc.), lo que permite correr
+   pruebas o usar el código desde otros scripts y tareas programadas.
+
+La importación es liviana (milisegundos): NumPy, pandas y los submódulos
+pesados (``servqual_store``, ``servqual_export``, ``servqual_encuestas``,
+``servqual_libro``, ``servqual_sugerencias``) se cargan recién al usarlos por
+primera vez, así que los catálogos (``DIMENSIONES``, ``PREGUNTAS``, ``COLS``…)
+se leen sin pandas.
 
 Además, se usa almacenamiento en **CSV** para evitar dependencias extra (por
 
-Ej. `pyarrow`) que requiere Parquet.
+Ej. `pyarrow`) que requiere Parquet. La matriz vive en una instantánea binaria
+columnar (``plan_accion_servqual.sqcol``) más una bitácora de cambios
+(``plan_accion_servqual.csv.journal``) que se compacta periódicamente (ver
+``servqual_store``). El CSV queda como formato de importación/exportación.
+Con ``SERVQUAL_DATAFILE=<archivo>.db`` la matriz vive en SQLite
+(``servqual_sqlite``), apto para varios editores concurrentes.
 """
 from __future__ import annotations
 
-from datetime import date
+import importlib.util
+import os
+import sys
+import types
+from datetime import date, timedelta
+from functools import lru_cache
 from pathlib import Path
-import pandas as pd
+from typing import TYPE_CHECKING
+
+import servqual_metricas
+from servqual_catalog import CATALOGO, Catalogo, aviso_catalogo, catalogo_vigente
+from servqual_metricas import medido
+
+if TYPE_CHECKING:  # pragma: no cover
+    from servqual_sqlite import SQLiteStore
+    from servqual_store import JournalStore
 
-# -------------------------------------------------------------
-# Detectar si Streamlit está disponible (modo dual)
-# -------------------------------------------------------------
-try:  # pragma: no cover - la detección no es parte de la lógica de negocio
-    import streamlit as st  # type: ignore
-    _HAS_ST = True
-except Exception:  # ImportError o similar -> modo librería
-    st = None  # type: ignore
-    _HAS_ST = False
 
 # -------------------------------------------------------------
-# CONSTANTES / CATÁLOGOS (comparten UI y librería)
+# Importaciones diferidas (modo librería liviano)
 # -------------------------------------------------------------
-DIMENSIONES = [
-    ("FIA", "FIABILIDAD"),
-    ("CAP", "CAPACIDAD DE RESPUESTA"),
-    ("SEG", "SEGURIDAD"),
-    ("EMP", "EMPATÍA"),
-    ("TAN", "ASPECTOS TANGIBLES"),
-    ("EXP", "EXPERIENCIA / EXPANSIÓN"),
-]
+def _bajo_streamlit() -> bool:
+    """``True`` si el script corre dentro de ``streamlit run`` (sin importar Streamlit).
+
+    Mira ``streamlit.runtime`` y no ``streamlit``: el módulo perezoso de este
+    archivo queda en ``sys.modules`` sin haberse ejecutado.
+    """
+    if "streamlit.runtime" not in sys.modules:
+        return False
+    from streamlit import runtime
 
-ESTADOS = ["Pendiente", "En progreso", "Completado", "Bloqueado"]
+    return runtime.exists()
 
-RESPONSABLES = [
-    "BRYSEYDA A. ZUÑIGA GOMEZ",
-    "DANIEL ALEJANDRO MONTERR0SO MORALES",
-    "DARWIN RENE RODAS CHEGUEN",
-    "IVAN ALBERTO MOLINA ALVAREZ",
-]
 
-SUCURSALES = [
-    "CLINICA AMATITLAN",
-    "CLINICA ANTIGUA",
-    "CLINICA MAZATENANGO",
-]
+def _perezoso(nombre: str):
+    """Módulo *nombre* que se ejecuta recién al leer uno de sus atributos.
 
-# Mapa: código -> (dimensión, texto de la pregunta)
-PREGUNTAS: dict[str, tuple[str, str]] = {
-    # FIABILIDAD (5)
-    "FIA_P001": (
-        "FIABILIDAD",
-        "¿El personal de recepción le explicó de forma clara y sencilla todos los pasos que debía seguir para su consulta?",
-    ),
-    "FIA_P002": ("FIABILIDAD", "¿La atención en caja o el pago de sus servicios fue rápida?"),
-    "FIA_P003": ("FIABILIDAD", "¿Respetaron el orden de llegada y su turno para atenderle?"),
-    "FIA_P004": ("FIABILIDAD", "¿El doctor le explicó de manera clara y detallada su diagnóstico?"),
-    "FIA_P005": ("FIABILIDAD", "¿Fue fácil obtener su cita?"),
-    # CAPACIDAD DE RESPUESTA (4)
-    "CAP_P006": (
-        "CAPACIDAD DE RESPUESTA",
-        "¿Recibió atención rápidamente después de llegar al hospital/clínica?",
-    ),
-    "CAP_P007": (
-        "CAPACIDAD DE RESPUESTA",
-        "¿El personal le informó sobre otros servicios o programas de APROFAM que podrían complementar su cuidado de salud?",
-    ),
-    "CAP_P008": (
-        "CAPACIDAD DE RESPUESTA",
-        "¿El personal del call center atendió su llamada con rapidez y resolvió su solicitud?",
-    ),
-    "CAP_P009": (
-        "CAPACIDAD DE RESPUESTA",
-        "¿Su experiencia en la farmacia del hospital/clínica fue la que esperaba?",
-    ),
-    # SEGURIDAD (6)
-    "SEG_P010": (
-        "SEGURIDAD",
-        "¿El médico y la enfermera le inspiraron confianza en la atención?",
-    ),
-    "SEG_P011": (
-        "SEGURIDAD",
-        "¿El médico le examinó físicamente de forma completa según su problema de salud?",
-    ),
-    "SEG_P012": ("SEGURIDAD", "¿El doctor le respondió todas sus preguntas?"),
-    "SEG_P013": (
-        "SEGURIDAD",
-        "¿Encontró el hospital/clínica limpia y en buenas condiciones?",
-    ),
-    "SEG_P014": (
-        "SEGURIDAD",
-        "¿Le explicaron de forma clara todos los procedimientos o exámenes que se debe realizar?",
-    ),
-    "SEG_P015": (
-        "SEGURIDAD",
-        "¿Le explicaron claramente cómo tomar sus medicamentos y qué cuidados debe tener en casa?",
-    ),
-    # EMPATÍA (3)
-    "EMP_P016": (
-        "EMPATÍA",
-        "¿Todo el personal le trató con amabilidad, respeto y paciencia durante su visita?",
-    ),
-    "EMP_P017": (
-        "EMPATÍA",
-        "¿Sintió que el doctor realmente se interesó por resolver su problema de salud?",
-    ),
-    "EMP_P018": (
-        "EMPATÍA",
-        "¿Le dieron consejos sobre cómo mejorar su salud y prevenir complicaciones?",
-    ),
-    # TANGIBLES (3)
-    "TAN_P019": (
-        "ASPECTOS TANGIBLES",
-        "¿Las instalaciones del hospital/clínica son cómodas y accesibles para personas con discapacidad?",
-    ),
-    "TAN_P020": (
-        "ASPECTOS TANGIBLES",
-        "¿Recibió recordatorios sobre su cita o promoción de servicios?",
-    ),
-    "TAN_P021": (
-        "ASPECTOS TANGIBLES",
-        "¿El tiempo que esperó en laboratorio, farmacia y otros servicios fue razonable?",
-    ),
-    # EXPERIENCIA/EXPANSIÓN (7)
-    "EXP_P022": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Le informaron sobre otros servicios disponibles como vacunación, salud mental o nutrición?",
-    ),
-    "EXP_P023": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Le informaron sobre opciones de asesoría virtual o telemedicina disponibles para su seguimiento médico?",
-    ),
-    "EXP_P024": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Considera que APROFAM ofrece los servicios para atender su familia?",
-    ),
-    "EXP_P025": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Encontró fácilmente información confiable de APROFAM en redes sociales, página web o centros de atención?",
-    ),
-    "EXP_P026": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Le pareció justo el precio por el servicio que recibió?",
-    ),
-    "EXP_P027": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Nos considera como su primera opción en servicios de laboratorio, farmacia y ultrasonidos?",
-    ),
-    "EXP_P028": (
-        "EXPERIENCIA / EXPANSIÓN",
-        "¿Recomendaría este hospital/clínica a sus familiares y amigos por la buena atención que recibió?",
-    ),
-}
+    Se registra en ``sys.modules`` (``importlib.util.LazyLoader``): cualquier
+    ``import`` posterior del mismo nombre lo termina de cargar. Si ya estaba
+    importado, o dentro de Streamlit (varios hilos), se importa tal cual. Si no
+    está instalado (Streamlit en modo librería), ``ModuleNotFoundError`` salta
+    al usarlo y no al importar este archivo.
+    """
+    if nombre in sys.modules or _bajo_streamlit():
+        return importlib.import_module(nombre)
+    spec = importlib.util.find_spec(nombre)
+    if spec is None:
+        ausente = types.ModuleType(nombre)
+
+        def __getattr__(atributo: str):
+            if atributo.startswith("__"):  # repr, pickle, inspect...
+                raise AttributeError(atributo)
+            raise ModuleNotFoundError(f"No module named {nombre!r}", name=nombre)
+
+        ausente.__getattr__ = __getattr__
+        return ausente
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
 
-# Subopciones por pregunta (exactamente como en el documento)
-SUBOPCIONES: dict[str, list[str]] = {
-    # FIABILIDAD
-    "FIA_P001": [
-        "FIA_P001A - Explicación confusa",
-        "FIA_P001B - Faltó información",
-        "FIA_P001C - Personal desatento",
-        "FIA_P001D - Lenguaje técnico",
-    ],
-    "FIA_P002": [
-        "FIA_P002A - Caja muy lenta",
-        "FIA_P002B - Cola muy larga",
-        "FIA_P002C - Pocos cajeros",
-        "FIA_P002D - Sistema muy lento",
-    ],
-    "FIA_P003": [
-        "FIA_P003A - No respetaron orden",
-        "FIA_P003B - Saltaron turnos",
-        "FIA_P003C - Sin organización",
-        "FIA_P003D - Preferencias injustas",
-    ],
-    "FIA_P004": [
-        "FIA_P004A - Explicación rápida",
-        "FIA_P004B - Muy técnico",
-        "FIA_P004C - Faltó detalle",
-        "FIA_P004D - No entendí",
-    ],
-    "FIA_P005": [
-        "FIA_P005A - Sin disponibilidad",
-        "FIA_P005B - Proceso complicado",
-        "FIA_P005C - Mucha espera",
-        "FIA_P005D - Sistema deficiente",
-    ],
-    # CAPACIDAD DE RESPUESTA
-    "CAP_P006": [
-        "CAP_P006A - Mucha espera",
-        "CAP_P006B - Sistema lento",
-        "CAP_P006C - Falta personal",
-        "CAP_P006D - Desorganización",
-    ],
-    "CAP_P007": [
-        "CAP_P007A - No informaron",
-        "CAP_P007B - Info incompleta",
-        "CAP_P007C - Personal desconocía",
-        "CAP_P007D - No indagaron",
-    ],
-    "CAP_P008": [
-        "CAP_P008A - Tardaron en responder",
-        "CAP_P008B - No resolvieron mi solicitud",
-        "CAP_P008C - Me transfirieron muchas veces",
-        "CAP_P008D - Contestaron sin interés",
-    ],
-    "CAP_P009": [
-        "CAP_P009A - Precios altos",
-        "CAP_P009B - Sin disponibilidad",
-        "CAP_P009C - Sin alternativas",
-        "CAP_P009D - Me presionaron",
-    ],
-    # SEGURIDAD
-    "SEG_P010": [
-        "SEG_P010A - Parecían inexpertos",
-        "SEG_P010B - Dudaron mucho",
-        "SEG_P010C - Respuestas contradictorias",
-        "SEG_P010D - Falta seguridad",
-    ],
-    "SEG_P011": [
-        "SEG_P011A - Examen superficial",
-        "SEG_P011B - Muy rápido",
-        "SEG_P011C - Faltaron pruebas",
-        "SEG_P011D - No examinó",
-    ],
-    "SEG_P012": [
-        "SEG_P012A - Mucha prisa",
-        "SEG_P012B - No preguntó",
-        "SEG_P012C - Consulta corta",
-        "SEG_P012D - Me interrumpió",
-    ],
-    "SEG_P013": [
-        "SEG_P013A - Áreas sucias",
-        "SEG_P013B - Baños descuidados",
-        "SEG_P013C - Equipo sucio",
-        "SEG_P013D - Mal olor",
-    ],
-    "SEG_P014": [
-        "SEG_P014A - No explicaron",
-        "SEG_P014B - Muy técnico",
-        "SEG_P014C - Exp rápida",
-        "SEG_P014D - Quedé confuso",
-    ],
-    "SEG_P015": [
-        "SEG_P015A - Explicación confusa",
-        "SEG_P015B - Muy rápido",
-        "SEG_P015C - Faltó información",
-        "SEG_P015D - No explicaron",
-    ],
-    # EMPATÍA
-    "EMP_P016": [
-        "EMP_P016A - Trato brusco",
-        "EMP_P016B - Sin paciencia",
-        "EMP_P016C - Personal grosero",
-        "EMP_P016D - Me ignoraron",
-    ],
-    "EMP_P017": [
-        "EMP_P017A - Desinteresado",
-        "EMP_P017B - Muy automático",
-        "EMP_P017C - No escuchó",
-        "EMP_P017D - Falta empatía",
-    ],
-    "EMP_P018": [
-        "EMP_P018A - Consejos genéricos",
-        "EMP_P018B - No dieron",
-        "EMP_P018C - Muy básicos",
-        "EMP_P018D - No personalizados",
-    ],
-    # TANGIBLES
-    "TAN_P019": [
-        "TAN_P019A - Sin rampas",
-        "TAN_P019B - Espacios estrechos",
-        "TAN_P019C - Barreras físicas",
-        "TAN_P019D - Mal diseño",
-    ],
-    "TAN_P020": [
-        "TAN_P020A - Sin recordatorios",
-        "TAN_P020B - Info confusa",
-        "TAN_P020C - Llegó tarde",
-        "TAN_P020D - No recibí",
-    ],
-    "TAN_P021": [
-        "TAN_P021A - Mucha espera",
-        "TAN_P021B - Sistema lento",
-        "TAN_P021C - Falta personal",
-        "TAN_P021D - Desorganización",
-    ],
-    # EXP / EXPANSIÓN
-    "EXP_P022": [
-        "EXP_P022A - No informaron",
-        "EXP_P022B - Servicios limitados",
-        "EXP_P022C - Personal desconocía",
-        "EXP_P022D - No preguntaron",
-    ],
-    "EXP_P023": [
-        "EXP_P023A - No conocían telemedicina",
-        "EXP_P023B - Sin asesoría virtual",
-        "EXP_P023C - Solo presencial",
-        "EXP_P023D - Falta tecnología",
-    ],
-    "EXP_P024": [
-        "EXP_P024A - Sin programas",
-        "EXP_P024B - Servicios separados",
-        "EXP_P024C - No disponible",
-        "EXP_P024D - Falta integración",
-    ],
-    "EXP_P025": [
-        "EXP_P025A - No tienen redes",
-        "EXP_P025B - Difícil de encontrar",
-        "EXP_P025C - Información incompleta",
-        "EXP_P025D - Información desactualizada",
-    ],
-    "EXP_P026": [
-        "EXP_P026A - Muy caro",
-        "EXP_P026B - No vale",
-        "EXP_P026C - Precio elevado",
-        "EXP_P026D - Servicio regular",
-    ],
-    "EXP_P027": [
-        "EXP_P027A - Mejor otros",
-        "EXP_P027B - No siempre",
-        "EXP_P027C - Baja oferta",
-        "EXP_P027D - Poca confianza",
-    ],
-    "EXP_P028": [
-        "EXP_P028A - Mala experiencia",
-        "EXP_P028B - Mejor otras",
-        "EXP_P028C - No recomendaría",
-        "EXP_P028D - Problemas generales",
-    ],
+
+np = _perezoso("numpy")
+pd = _perezoso("pandas")
+servqual_encuestas = _perezoso("servqual_encuestas")
+servqual_export = _perezoso("servqual_export")
+servqual_historia = _perezoso("servqual_historia")
+servqual_kpi = _perezoso("servqual_kpi")
+servqual_libro = _perezoso("servqual_libro")
+servqual_plazos = _perezoso("servqual_plazos")
+servqual_reportes = _perezoso("servqual_reportes")
+servqual_store = _perezoso("servqual_store")
+servqual_sugerencias = _perezoso("servqual_sugerencias")
+
+# Streamlit solo lo usa la UI: se carga al primer ``st.<algo>``
+st = _perezoso("streamlit")
+
+# Nombres re-exportados de los submódulos (se resuelven al pedirlos)
+_REEXPORTADOS = {
+    "ID_COL": "servqual_store",
+    "VER_COL": "servqual_store",
+    "DuplicateKeyError": "servqual_store",
+    "ConflictError": "servqual_store",
+    "aplicar_cambios": "servqual_store",
+    "JournalStore": "servqual_store",
+    "get_store": "servqual_store",
+    "ExportTooLarge": "servqual_export",
 }
 
+
+def __getattr__(nombre: str):
+    """``app.DuplicateKeyError``, ``app.KPI`` y demás, sin importarlos al cargar."""
+    if nombre == "KPI":
+        return _kpi()
+    if nombre in _REEXPORTADOS:
+        return getattr(globals()[_REEXPORTADOS[nombre]], nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+# -------------------------------------------------------------
+# CONSTANTES / CATÁLOGOS (comparten UI y librería; ver servqual_catalog)
+# -------------------------------------------------------------
+# Los datos y sus tablas de búsqueda viven en ``servqual_catalog`` (integrados
+# o cargados de SERVQUAL_CATALOGO). Estos nombres son el catálogo al importar,
+# por compatibilidad; el código usa ``catalogo_vigente()``, que ve los cambios
+# del archivo sin reiniciar.
+DIMENSIONES = list(CATALOGO.dimensiones)
+ESTADOS = list(CATALOGO.estados)
+RESPONSABLES = list(CATALOGO.responsables)
+SUCURSALES = list(CATALOGO.sucursales)
+PREGUNTAS = dict(CATALOGO.preguntas)
+SUBOPCIONES = {c: list(v) for c, v in CATALOGO.subopciones.items()}
+
 COLS = [
     "Código",
     "Dimensión",
@@ -356,27 +156,403 @@ COLS = [
     "Sucursal",
 ]
 
-DATAFILE = Path("plan_accion_servqual.csv")
+# Tipo de cada columna en la instantánea binaria (ver servqual_snapshot)
+DTYPES = {
+    "Código": "category",
+    "Dimensión": "category",
+    "Pregunta evaluada": "category",
+    "Subproblema identificado": "category",
+    "Causa raíz": "text",
+    "Acción correctiva": "text",
+    "Fecha seguimiento": "date",
+    "Responsable": "category",
+    "Plazo": "text",
+    "Estado": "category",
+    "% Avance": "int",
+    "Sucursal": "category",
+}
+
+# Regla de integridad: una sola fila por (Código, Sucursal)
+CLAVE_UNICA = ("Código", "Sucursal")
+
+# Columnas con índice de filtros (selectores de "Filtros de visualización")
+FILTER_COLS = ["Dimensión", "Responsable", "Estado", "Sucursal"]
+
+# Columnas de la búsqueda libre ("Buscar"; sin tildes ni mayúsculas)
+TEXT_COLS = [
+    "Código",
+    "Dimensión",
+    "Pregunta evaluada",
+    "Subproblema identificado",
+    "Causa raíz",
+    "Acción correctiva",
+]
+
+# Indicadores de avance (tablero): conteos por Sucursal × Dimensión × Responsable.
+# Se arma al primer uso (``servqual_kpi`` importa pandas); también ``app.KPI``.
+@lru_cache(maxsize=None)
+def _kpi() -> servqual_kpi.KpiSpec:
+    return servqual_kpi.KpiSpec(
+        grupos=("Sucursal", "Dimensión", "Responsable"),
+        estado="Estado",
+        avance="% Avance",
+        fecha="Fecha seguimiento",
+        cerrados=("Completado",),
+    )
+
+
+# Fechas límite (Fecha seguimiento + Plazo) indexadas por Responsable y Sucursal
+@lru_cache(maxsize=None)
+def _plazos() -> servqual_plazos.PlazoSpec:
+    return servqual_plazos.PlazoSpec(
+        fecha="Fecha seguimiento",
+        plazo="Plazo",
+        estado="Estado",
+        cerrados=("Completado",),
+        grupos=("Responsable", "Sucursal"),
+    )
+
+
+# Tope de la descarga a Excel (bytes; ``None`` = sin tope)
+MAX_EXPORT_BYTES = 50 * 1024 * 1024
+
+# Archivo de datos: con extensión .db/.sqlite se usa el almacén SQLite (WAL,
+# escrituras por fila; recomendado con varios editores a la vez)
+DATAFILE = Path(os.environ.get("SERVQUAL_DATAFILE", "plan_accion_servqual.csv"))
+
+# Historial de cambios para auditoría (``<DATAFILE>.historia/``); ``SERVQUAL_HISTORIAL=0`` lo apaga
+HISTORIAL = os.environ.get("SERVQUAL_HISTORIAL", "1").strip().lower() not in ("0", "no", "false")
 
 # -------------------------------------------------------------
 # STORAGE helpers (compatibles con pruebas sin Streamlit)
 # -------------------------------------------------------------
+def _store() -> JournalStore | SQLiteStore:
+    """Almacén asociado a ``DATAFILE`` (uno por proceso): bitácora o SQLite."""
+    return servqual_store.get_store(
+        DATAFILE,
+        COLS,
+        dtypes=DTYPES,
+        index_columns=FILTER_COLS,
+        unique_key=CLAVE_UNICA,
+        kpi=_kpi(),
+        plazos=_plazos(),
+        text_columns=TEXT_COLS,
+        historial=HISTORIAL,
+    )
+
+
+@medido()
 def load_data() -> pd.DataFrame:
-    """Carga el CSV si existe, sino devuelve un DataFrame vacío con columnas.
+    """Carga la instantánea binaria (o el CSV heredado) más su bitácora.
 
+    Si todavía no hay archivo de datos devuelve un DataFrame vacío con
+    columnas; un archivo dañado o ilegible lanza el error del almacén. Además
+    de ``COLS`` incluye la columna ``_id`` (identificador estable de fila).
     No requiere Streamlit.
     """
-    if DATAFILE.exists():
-        try:
-            return pd.read_csv(DATAFILE)
-        except Exception:
-            # Si el archivo está corrupto o vacío, devolvemos estructura base
-            return pd.DataFrame(columns=COLS)
-    return pd.DataFrame(columns=COLS)
+    df = _store().load()
+    servqual_metricas.contar("filas_cargadas", len(df))
+    return df
+
+
+@medido()
+def save_data(df: pd.DataFrame, desde: int | None = None) -> None:
+    """Guarda *df* escribiendo a la bitácora solo las filas que cambiaron.
+
+    Las filas nuevas reciben su ``_id`` in situ. Si *df* salió de
+    ``load_data``/``shared_data`` (o se indica *desde*, la revisión en que se
+    leyó), no pisa lo que otras sesiones escribieron después: lanza
+    ``ConflictError`` si alguna fila editada cambió entretanto, y no borra las
+    filas que *df* no llegó a ver (sin revisión, las de ``_id`` mayor que el
+    último de *df*).
+    """
+    _store().save(df, desde)
+
+
+@medido()
+def insert_rows(rows: pd.DataFrame, skip_duplicates: bool = False) -> pd.DataFrame:
+    """Inserta filas nuevas y las devuelve con su ``_id`` asignado.
+
+    Si alguna repite un par (Código, Sucursal) existente lanza
+    ``DuplicateKeyError``, o la omite si *skip_duplicates* es ``True``.
+    """
+    nuevas = _store().insert(rows, skip_duplicates=skip_duplicates)
+    servqual_metricas.contar("filas_insertadas", len(nuevas))
+    return nuevas
+
 
+@medido()
+def update_row(row_id: int, values: dict, version: int | None = None, base: dict | None = None) -> int:
+    """Actualiza las columnas indicadas de la fila ``row_id``; devuelve su nueva versión.
 
-def save_data(df: pd.DataFrame) -> None:
-    df.to_csv(DATAFILE, index=False)
+    Con *version* (el ``_ver`` de la fila leída) la escritura es condicional:
+    si otra sesión cambió la fila entretanto lanza ``ConflictError``, salvo
+    que *base* (la fila tal como se leyó) permita fusionar: se escriben solo
+    las columnas editadas y hay conflicto si otra sesión cambió alguna de
+    ellas (``ConflictError.columnas``). Lanza ``DuplicateKeyError`` si el
+    nuevo (Código, Sucursal) ya existe.
+    """
+    return _store().update(row_id, values, version=version, base=base)
+
+
+@medido()
+def delete_rows(ids) -> int:
+    """Elimina filas por ``_id``; devuelve cuántas se eliminaron.
+
+    Las filas quedan marcadas (lápidas) y se purgan de forma diferida, sin
+    renumerar la matriz.
+    """
+    return _store().delete(ids)
+
+
+def get_row(row_id: int) -> pd.Series | None:
+    """Fila con ese ``_id`` (búsqueda binaria), o ``None`` si no existe."""
+    rows = _store().get_rows([row_id])
+    return None if rows.empty else rows.iloc[0]
+
+
+@medido()
+def cambios_desde(revision: int) -> servqual_store.Delta:
+    """Altas, ediciones y bajas posteriores a *revision* (``Delta``).
+
+    Una sesión que guarda su copia de la matriz se pone al día con
+    ``aplicar_cambios(df, cambios_desde(df.attrs["revision"]))``
+    sin recargarla; con *revision* 0 (o demasiado antigua) ``Delta.completa``
+    indica que ``filas`` es la matriz entera.
+    """
+    delta = _store().cambios(revision)
+    servqual_metricas.contar("filas_delta", len(delta.filas))
+    return delta
+
+
+def revision_actual() -> int:
+    """Revisión del almacén (aumenta con cada escritura, de cualquier proceso)."""
+    store = _store()
+    store.refresh()
+    return store.revision
+
+
+def shared_data() -> pd.DataFrame:
+    """Matriz compartida por todas las sesiones del proceso.
+
+    Solo se vuelve a leer de disco si los archivos cambiaron (mtime/tamaño).
+    No copia datos: con Copy-on-Write, modificar el resultado no afecta a
+    otras sesiones; para persistir cambios usa ``insert_rows``/``update_row``/
+    ``delete_rows`` o ``save_data``.
+    """
+    return _store().shared()
+
+
+@medido()
+def filter_data(
+    dimension: str | None = None,
+    responsable: str | None = None,
+    estado: str | None = None,
+    sucursal: str | None = None,
+    q: str | None = None,
+) -> pd.DataFrame:
+    """Filas de la matriz compartida que cumplen los filtros (``None`` = todos).
+
+    *q* busca palabras (o su comienzo) en ``TEXT_COLS``, sin distinguir tildes
+    ni mayúsculas: ``q="empatia"`` encuentra "EMPATÍA". Se resuelve con los
+    índices del almacén, sin copiar la matriz.
+    """
+    valores = [dimension, responsable, estado, sucursal]
+    return _store().filter(dict(zip(FILTER_COLS, valores)), q)
+
+
+PAGE_SIZES = (25, 50, 100, 200)
+
+
+@medido()
+def page_data(
+    dimension: str | None = None,
+    responsable: str | None = None,
+    estado: str | None = None,
+    sucursal: str | None = None,
+    page: int = 0,
+    page_size: int = PAGE_SIZES[1],
+    sort: str | None = None,
+    descending: bool = False,
+    q: str | None = None,
+) -> tuple[pd.DataFrame, int]:
+    """Página *page* (desde 0) de las filas filtradas: ``(filas, total)``.
+
+    Solo se leen/serializan ``page_size`` filas; *sort* es una columna de
+    ``COLS`` (``None`` = orden de alta) y *q* la búsqueda de :func:`filter_data`.
+    """
+    valores = [dimension, responsable, estado, sucursal]
+    filas, total = _store().page(
+        dict(zip(FILTER_COLS, valores)), page * page_size, page_size, sort, descending, q
+    )
+    servqual_metricas.contar("filas_pagina", len(filas))
+    return filas, total
+
+
+@medido()
+def kpi_resumen(por: list[str] | tuple[str, ...] = (), hoy: date | None = None) -> pd.DataFrame:
+    """Indicadores de avance agrupados por *por* (columnas de ``KPI.grupos``).
+
+    Filas por estado, % completado, avance medio y vencidas a *hoy*. Se
+    calculan sobre las celdas que el almacén mantiene en cada cambio, sin
+    recorrer la matriz.
+    """
+    estados = catalogo_vigente().estados
+    return servqual_kpi.resumen(_store().kpi_cells(), _kpi(), por, hoy, estados=estados)
+
+
+@medido()
+def agenda_plazos(
+    responsable: str | None = None,
+    sucursal: str | None = None,
+    dias: int = 7,
+    hoy: date | None = None,
+) -> pd.DataFrame:
+    """Acciones abiertas vencidas o que vencen en los próximos *dias* días.
+
+    Agrega ``Vencimiento`` (Fecha seguimiento + Plazo), ``Días`` (negativos =
+    atraso) y ``Situación`` (Vencida / Por vencer); de la más atrasada a la más
+    lejana. Sale del índice de fechas límite del almacén: no recorre la matriz.
+    """
+    hoy = hoy or date.today()
+    filas = _store().vencimientos(hoy + timedelta(days=dias), {"Responsable": responsable, "Sucursal": sucursal})
+    servqual_metricas.contar("filas_agenda", len(filas))
+    return servqual_plazos.agenda(filas, hoy)
+
+
+def _historia() -> servqual_historia.Historial:
+    historia = _store().historia
+    if historia is None:
+        raise ValueError("El historial está apagado (SERVQUAL_HISTORIAL=0)")
+    return historia
+
+
+@medido()
+def matriz_a_la_fecha(momento=None) -> pd.DataFrame:
+    """La matriz (con ``_id``) como estaba en *momento*: una fecha cuenta hasta
+    el cierre de ese día. Parte del último corte del historial, no de todo él."""
+    return _historia().a_la_fecha(momento)
+
+
+@medido()
+def serie_avance(fechas=None, por: list[str] | tuple[str, ...] = ("Sucursal",)) -> pd.DataFrame:
+    """Avance medio y filas por estado de cada grupo *por* en cada fecha.
+
+    Por defecto, los domingos desde que empezó el historial y hoy.
+    """
+    historia = _historia()
+    if fechas is None:
+        hoy = date.today()
+        inicio = historia.inicio.date() if historia.inicio else hoy
+        fechas = [d.date() for d in pd.date_range(inicio, hoy, freq="W-SUN") if d.date() != hoy] + [hoy]
+    return historia.serie(fechas, por, avance="% Avance", estado="Estado")
+
+
+@medido()
+def historial_cambios(
+    codigo: str | None = None,
+    sucursal: str | None = None,
+    desde=None,
+    hasta=None,
+    columnas: list[str] | None = None,
+) -> pd.DataFrame:
+    """Cambios registrados (ts, _id, op, columna, antes, despues, usuario), del
+    más antiguo al más reciente. Con *codigo*/*sucursal*, solo los de esas
+    filas vigentes (p. ej. la trayectoria de ``% Avance`` y ``Estado``)."""
+    ids = None
+    if codigo is not None or sucursal is not None:
+        filas = filter_data(sucursal=sucursal)
+        if codigo is not None:
+            filas = filas[filas["Código"] == codigo]
+        ids = filas[servqual_store.ID_COL].tolist()
+    return _historia().cambios(ids, desde, hasta, columnas)
+
+
+@medido()
+def compact_data() -> None:
+    """Compacta la bitácora en una instantánea nueva (renombrado atómico)."""
+    _store().compact()
+
+
+@medido()
+def import_csv(path: Path) -> pd.DataFrame:
+    """Importa las filas de un CSV con columnas ``COLS`` como filas nuevas."""
+    df = servqual_store.import_csv(Path(path), COLS, DTYPES)
+    return insert_rows(df[COLS])
+
+
+@medido()
+def import_excel(
+    path: Path,
+    estado: str | None = None,
+    chunk_rows: int | None = None,
+    progress=None,
+) -> tuple[int, int]:
+    """Importa la hoja de datos de un libro de Excel (ver ``servqual_libro``).
+
+    Se lee por bloques en modo de solo lectura; cada bloque se normaliza a
+    ``COLS``, recibe la acción sugerida donde falte y se agrega omitiendo los
+    (Código, Sucursal) que ya existen. *progress*, si se indica, recibe
+    ``(leidas, agregadas)`` después de cada bloque (de *chunk_rows* filas;
+    por defecto ``servqual_libro.CHUNK_ROWS``). Devuelve
+    ``(filas_leidas, filas_agregadas)``.
+    """
+    cat = catalogo_vigente()
+    leidas = agregadas = 0
+    for bloque in servqual_libro.leer_libro(path, chunk_rows or servqual_libro.CHUNK_ROWS):
+        leidas += len(bloque)
+        filas = servqual_libro.normalizar(bloque, COLS, cat, estado or cat.estados[0])
+        agregadas += len(insert_rows(completar_acciones(filas), skip_duplicates=True))
+        if progress is not None:
+            progress(leidas, agregadas)
+    return leidas, agregadas
+
+
+@medido()
+def export_csv(path: Path) -> None:
+    """Exporta la matriz actual a CSV (solo columnas ``COLS``)."""
+    servqual_store.export_csv(_store().frame(), Path(path), COLS)
+
+
+@medido()
+def export_excel(
+    view: pd.DataFrame | None = None,
+    progress=None,
+    max_bytes: int | None = MAX_EXPORT_BYTES,
+) -> bytes:
+    """Contenido ``.xlsx`` de *view* (o de toda la matriz) para descargar.
+
+    Se genera por bloques con ``openpyxl`` en modo de solo escritura; lanza
+    ``ExportTooLarge`` si el archivo superaría *max_bytes*. *progress* recibe
+    ``(filas_escritas, total)``.
+    """
+    df = _store().frame() if view is None else view
+    contenido = servqual_export.to_xlsx_bytes(df, COLS, max_bytes=max_bytes, progress=progress)
+    servqual_metricas.contar("bytes_exportados", len(contenido))
+    return contenido
+
+
+@medido()
+def generar_reportes(
+    destino: Path, procesos: int = 1, hoy: date | None = None, log=None
+) -> tuple[dict[str, Path], dict[str, Exception]]:
+    """Reporte mensual por sucursal: un ``.xlsx`` por sucursal en *destino*.
+
+    Cada libro trae el avance por dimensión, las acciones vencidas y las filas
+    de la sucursal (ver ``servqual_reportes``). La matriz se particiona una vez
+    en un archivo columnar que cada proceso lee por rango. Devuelve
+    ``(archivos, errores)`` por sucursal; un libro que falla no frena al resto.
+    """
+    spec = servqual_reportes.ReporteSpec(
+        columnas=tuple(COLS),
+        dtypes=DTYPES,
+        kpi=_kpi(),
+        plazos=_plazos(),
+        estados=tuple(catalogo_vigente().estados),
+    )
+    archivos, errores = servqual_reportes.generar(_store().shared(), Path(destino), spec, procesos, hoy, log)
+    servqual_metricas.contar("reportes", len(archivos))
+    return archivos, errores
 
 
 # -------------------------------------------------------------
@@ -384,10 +560,11 @@ def save_data(df: pd.DataFrame) -> None:
 # -------------------------------------------------------------
 
 def preguntas_por_dimension(nombre_dimension: str) -> list[str]:
-    """Devuelve los códigos de pregunta asociados a una dimensión (nombre largo).
-    Ej.: "FIABILIDAD" -> ["FIA_P001", ...]
+    """Devuelve los códigos de pregunta asociados a una dimensión.
+    Acepta el nombre largo o el código corto (tabla precalculada, O(1)).
+    Ej.: "FIABILIDAD" o "FIA" -> ["FIA_P001", ...]
     """
-    return [code for code, (dim, _) in PREGUNTAS.items() if dim == nombre_dimension]
+    return list(catalogo_vigente().codigos_de(nombre_dimension))
 
 
 def construir_filas_dimension(
@@ -401,29 +578,8 @@ def construir_filas_dimension(
 
     No guarda en disco; solo genera las filas.
     """
-    if fecha is None:
-        fecha = date.today()
-
-    rows = []
-    for code in preguntas_por_dimension(dimension):
-        _, texto = PREGUNTAS[code]
-        rows.append(
-            {
-                "Código": code,
-                "Dimensión": dimension,
-                "Pregunta evaluada": texto,
-                "Subproblema identificado": "",
-                "Causa raíz": "",
-                "Acción correctiva": "",
-                "Fecha seguimiento": str(fecha),
-                "Responsable": responsable,
-                "Plazo": "",
-                "Estado": estado,
-                "% Avance": 0,
-                "Sucursal": sucursal,
-            }
-        )
-    return pd.DataFrame(rows, columns=COLS)
+    plan = construir_plan([dimension], [sucursal], responsable, estado, fecha)
+    return construir_filas_plan(plan)
 
 
 def upsert_por_dimension(
@@ -438,85 +594,349 @@ def upsert_por_dimension(
 
     Devuelve el DataFrame actualizado (no guarda en disco).
     """
-    nuevos = construir_filas_dimension(dimension, responsable, estado, sucursal, fecha)
+    plan = construir_plan([dimension], [sucursal], responsable, estado, fecha)
+    return upsert_plan(base, plan)
+
+
+@lru_cache(maxsize=4)
+def _tabla_preguntas(cat: Catalogo) -> tuple[pd.DataFrame, dict[str, np.ndarray]]:
+    """Catálogo de preguntas como tabla + posiciones por dimensión (para generar
+    filas de forma vectorizada). Se calcula una vez por catálogo."""
+    tabla = pd.DataFrame(
+        [(code, *cat.preguntas[code]) for code in cat.codigos],
+        columns=["Código", "Dimensión", "Pregunta evaluada"],
+    )
+    posiciones = {
+        dim: np.fromiter((cat.posicion[c] for c in codigos), dtype="int64", count=len(codigos))
+        for dim, codigos in cat.por_dimension.items()
+    }
+    return tabla, posiciones
+
+
+PLAN_COLS = ["Dimensión", "Sucursal", "Responsable", "Estado", "Fecha seguimiento"]
+
+
+def construir_plan(
+    dimensiones: list[str],
+    sucursales: list[str],
+    responsables: str | list[str] | dict[str, str],
+    estado: str = ESTADOS[0],
+    fechas: date | list[date] | dict[str, date] | None = None,
+) -> pd.DataFrame:
+    """Plan de carga: una fila por cada par (dimensión, sucursal).
+
+    *responsables* y *fechas* pueden ser un valor único, una lista alineada
+    con *dimensiones* o un dict ``dimensión -> valor``. Ej.::
+
+        construir_plan(["FIABILIDAD", "EMPATÍA"], SUCURSALES,
+                       {"FIABILIDAD": RESPONSABLES[0], "EMPATÍA": RESPONSABLES[1]})
+    """
+    if fechas is None:
+        fechas = date.today()
+    cat = catalogo_vigente()
+
+    def por_dimension(valor) -> list:
+        if isinstance(valor, dict):
+            return [valor[d] if d in valor else valor[cat.largo_a_corto[d]] for d in dimensiones]
+        if isinstance(valor, (list, tuple)):
+            if len(valor) != len(dimensiones):
+                raise ValueError("La lista debe tener un valor por dimensión")
+            return list(valor)
+        return [valor] * len(dimensiones)
+
+    dimensiones = [cat.nombre_dimension(d) for d in dimensiones]
+    n_suc = len(sucursales)
+    return pd.DataFrame(
+        {
+            "Dimensión": np.repeat(np.asarray(dimensiones, dtype=object), n_suc),
+            "Sucursal": np.tile(np.asarray(sucursales, dtype=object), len(dimensiones)),
+            "Responsable": np.repeat(np.asarray(por_dimension(responsables), dtype=object), n_suc),
+            "Estado": estado,
+            "Fecha seguimiento": np.repeat(
+                np.asarray([str(f) for f in por_dimension(fechas)], dtype=object), n_suc
+            ),
+        },
+        columns=PLAN_COLS,
+    )
+
+
+@medido()
+def construir_filas_plan(plan: pd.DataFrame) -> pd.DataFrame:
+    """Filas de la matriz para todas las preguntas de cada entrada del *plan*.
+
+    Genera el producto (entrada del plan × preguntas de su dimensión) con
+    ``np.repeat``/``take``, sin ciclos por fila. No guarda en disco.
+    """
+    plan = pd.DataFrame(plan, columns=PLAN_COLS).reset_index(drop=True)
+    tabla, pos_por_dimension = _tabla_preguntas(catalogo_vigente())
+    vacio = np.empty(0, dtype="int64")
+    listas = [pos_por_dimension.get(d, vacio) for d in plan["Dimensión"]]
+    cuantas = np.fromiter((len(p) for p in listas), dtype="int64", count=len(listas))
+    pos_plan = np.repeat(np.arange(len(plan)), cuantas)
+    pos_preg = np.concatenate(listas) if listas else vacio
+
+    preguntas = tabla.take(pos_preg)
+    meta = plan.take(pos_plan)
+    n = len(pos_preg)
+    return pd.DataFrame(
+        {
+            "Código": preguntas["Código"].to_numpy(),
+            "Dimensión": preguntas["Dimensión"].to_numpy(),
+            "Pregunta evaluada": preguntas["Pregunta evaluada"].to_numpy(),
+            "Subproblema identificado": np.full(n, "", dtype=object),
+            "Causa raíz": np.full(n, "", dtype=object),
+            "Acción correctiva": np.full(n, "", dtype=object),
+            "Fecha seguimiento": meta["Fecha seguimiento"].astype(str).to_numpy(),
+            "Responsable": meta["Responsable"].to_numpy(),
+            "Plazo": np.full(n, "", dtype=object),
+            "Estado": meta["Estado"].to_numpy(),
+            "% Avance": np.zeros(n, dtype="int64"),
+            "Sucursal": meta["Sucursal"].to_numpy(),
+        },
+        columns=COLS,
+    )
+
+
+@medido()
+def agregar_plan(plan: pd.DataFrame) -> pd.DataFrame:
+    """Genera y guarda las filas de *plan* que aún no existen.
+
+    A diferencia de ``upsert_plan`` trabaja directo sobre el almacén: los
+    duplicados por (Código, Sucursal) se descartan con el índice de claves
+    (O(1) por fila), sin ``merge`` contra la matriz. Devuelve las filas
+    agregadas con su ``_id``.
+    """
+    return insert_rows(construir_filas_plan(plan), skip_duplicates=True)
+
+
+@medido()
+def upsert_plan(base: pd.DataFrame, plan: pd.DataFrame) -> pd.DataFrame:
+    """Agrega las filas de todo un *plan* evitando duplicados por (Código, Sucursal).
+
+    Las claves de *base* se indexan una sola vez (tabla hash de
+    ``pd.MultiIndex``) y las filas nuevas se anexan con un único ``concat``,
+    en lugar de un ``merge`` + ``concat`` por cada dimensión y sucursal.
+    Devuelve el DataFrame actualizado, con los ``attrs`` de *base* (la
+    revisión que usa ``save_data``); no guarda en disco.
+    """
+    nuevos = construir_filas_plan(plan)
+    claves = pd.MultiIndex.from_arrays(
+        [nuevos["Código"].astype(str), nuevos["Sucursal"].astype(str)]
+    )
+    nuevas = ~claves.duplicated()
+    if not base.empty:
+        existentes = pd.MultiIndex.from_arrays(
+            [base["Código"].astype(str), base["Sucursal"].astype(str)]
+        )
+        nuevas &= ~claves.isin(existentes)
+    to_add = nuevos[nuevas]
     if base.empty:
-        return nuevos.copy()
+        out = to_add.reset_index(drop=True)
+    elif to_add.empty:
+        out = base.copy()
+    else:
+        out = pd.concat([base, to_add], ignore_index=True)
+    out.attrs = dict(base.attrs)
+    return out
 
-    # Duplicado si ya existe el par (Código, Sucursal)
-    clave = ["Código", "Sucursal"]
-    merged = nuevos.merge(base[clave], on=clave, how="left", indicator=True)
-    to_add = nuevos[merged["_merge"] == "left_only"][COLS]
-    if to_add.empty:
-        return base.copy()
-    return pd.concat([base, to_add], ignore_index=True)
+
+def sugerir_acciones(df: pd.DataFrame) -> pd.Series:
+    """Acción correctiva sugerida para cada fila (subproblema + pregunta), como
+    ``suggestActionFromText`` de la app JSX. Ver ``servqual_sugerencias``."""
+    textos = df["Subproblema identificado"].astype(str) + " " + df["Pregunta evaluada"].astype(str)
+    return servqual_sugerencias.sugerir_columna(textos)
+
+
+def completar_acciones(df: pd.DataFrame) -> pd.DataFrame:
+    """Copia de *df* con la acción sugerida en las filas que tienen subproblema
+    pero aún no tienen "Acción correctiva"."""
+    accion = df["Acción correctiva"]
+    vacias = (accion.isna() | (accion.astype(str).str.strip() == "")) & (
+        df["Subproblema identificado"].fillna("").astype(str) != ""
+    )
+    if not vacias.any():
+        return df
+    out = df.copy()
+    out["Acción correctiva"] = accion.astype(object)
+    out.loc[vacias, "Acción correctiva"] = sugerir_acciones(df[vacias])
+    return out
+
+
+def filas_de_indicadores(
+    criticas: pd.DataFrame,
+    responsable: str,
+    estado: str = ESTADOS[0],
+    fecha: date | None = None,
+) -> pd.DataFrame:
+    """Una fila de la matriz por cada (Sucursal, Código) crítico de la encuesta.
+
+    El subproblema más mencionado por los encuestados queda como
+    "Subproblema identificado", con su acción sugerida. No guarda en disco.
+    """
+    tabla, _ = _tabla_preguntas(catalogo_vigente())
+    preguntas = tabla.set_index("Código")["Pregunta evaluada"]
+    n = len(criticas)
+    filas = pd.DataFrame(
+        {
+            "Código": criticas["Código"].to_numpy(),
+            "Dimensión": criticas["Dimensión"].to_numpy(),
+            "Pregunta evaluada": preguntas.reindex(criticas["Código"]).to_numpy(),
+            "Subproblema identificado": criticas["Subproblema frecuente"].to_numpy(),
+            "Causa raíz": np.full(n, "", dtype=object),
+            "Acción correctiva": np.full(n, "", dtype=object),
+            "Fecha seguimiento": np.full(n, str(fecha or date.today()), dtype=object),
+            "Responsable": np.full(n, responsable, dtype=object),
+            "Plazo": np.full(n, "", dtype=object),
+            "Estado": np.full(n, estado, dtype=object),
+            "% Avance": np.zeros(n, dtype="int64"),
+            "Sucursal": criticas["Sucursal"].to_numpy(),
+        },
+        columns=COLS,
+    )
+    return completar_acciones(filas)
+
+
+@medido()
+def ingerir_encuestas(
+    path: Path,
+    responsable: str = RESPONSABLES[0],
+    umbral: float = 30.0,
+    brecha_max: float | None = -1.0,
+    min_respuestas: int = 20,
+    max_insatisfecho: float = 2,
+    chunk_rows: int | None = None,
+    progress=None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Procesa un archivo de respuestas de encuesta y agrega al plan las
+    preguntas críticas por sucursal (ver ``servqual_encuestas``).
+
+    El archivo se lee por bloques de *chunk_rows* filas (por defecto
+    ``servqual_encuestas.CHUNK_ROWS``), así que la memoria no depende de su
+    tamaño.
+    Las filas que ya existen por (Código, Sucursal) no se tocan. Devuelve
+    ``(indicadores, filas_agregadas)``.
+    """
+    acumulador = servqual_encuestas.analizar(
+        path, catalogo_vigente(), chunk_rows or servqual_encuestas.CHUNK_ROWS, max_insatisfecho, progress
+    )
+    indicadores = acumulador.resultado()
+    criticas = servqual_encuestas.criticas(indicadores, umbral, brecha_max, min_respuestas)
+    agregadas = insert_rows(filas_de_indicadores(criticas, responsable), skip_duplicates=True)
+    return indicadores, agregadas
 
 
 # -------------------------------------------------------------
-# UI STREAMLIT (solo si _HAS_ST es True)
+# UI STREAMLIT (solo con ``streamlit run``; ver run_streamlit_app)
 # -------------------------------------------------------------
 
-def _header_actions_ui():
+@medido("ui.exportar")
+def _export_ui(filtros: dict):
+    """Genera el Excel solo al pulsar el botón (no en cada interacción)."""
+    solo_vista = st.checkbox("Solo la vista filtrada", value=False, key="export_vista")
+    if st.button("⬇️ Exportar a Excel", use_container_width=True):
+        barra = st.progress(0.0, text="Generando Excel…")
+
+        def avance(hechas: int, total: int) -> None:
+            barra.progress(hechas / total if total else 1.0, text=f"Generando Excel… {hechas}/{total} filas")
+
+        try:
+            vista = filter_data(**filtros) if solo_vista else None
+            st.session_state.export_xlsx = export_excel(vista, progress=avance)
+        except servqual_export.ExportTooLarge as exc:
+            st.session_state.pop("export_xlsx", None)
+            st.error(f"{exc}. Aplica filtros y exporta solo la vista.")
+        barra.empty()
+    if "export_xlsx" in st.session_state:
+        st.download_button(
+            "💾 Descargar Excel",
+            data=st.session_state.export_xlsx,
+            file_name=servqual_export.export_file_name(),
+            mime=servqual_export.MIME_XLSX,
+            use_container_width=True,
+            on_click=lambda: st.session_state.pop("export_xlsx", None),
+        )
+
+
+@medido("ui.acciones")
+def _header_actions_ui(filtros: dict):
     left, mid, right = st.columns([1, 2, 1])
     with left:
         if st.button("➕ Nuevo / Editar fila", use_container_width=True, key="open_modal"):
             st.session_state["modal_open"] = True
     with mid:
-        df = st.session_state.df
-        st.download_button(
-            "⬇️ Exportar a Excel",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name=f"PlanAccion_SERVQUAL_{date.today()}.csv",
-            mime="text/csv",
-            use_container_width=True,
-        )
+        _export_ui(filtros)
     with right:
         if st.button("🗑️ Eliminar seleccionadas", use_container_width=True):
             sel = st.session_state.get("selected_rows", [])
             if sel:
-                st.session_state.df = st.session_state.df.drop(index=sel).reset_index(drop=True)
-                save_data(st.session_state.df)
+                delete_rows(sel)
                 st.toast(f"Se eliminaron {len(sel)} fila(s)")
             else:
                 st.toast("Primero selecciona fila(s) en la tabla", icon="❗")
 
 
+@medido("ui.modal")
 def _modal_editor_ui():
     if not st.session_state.get("modal_open"):
         return
     with st.modal("Editar / Crear fila", key="m1"):
-        df = st.session_state.df
+        cat = catalogo_vigente()
         st.write("Completa los campos obligatorios (⭐)")
-        # Selector de fila opcional
-        idx_sel = st.selectbox("Fila existente (opcional):", options=["<Nueva>"] + list(range(len(df))), index=0)
-
-        if idx_sel == "<Nueva>":
-            codigo = st.selectbox("⭐ Código", options=list(PREGUNTAS.keys()))
-        else:
-            codigo = st.selectbox(
-                "⭐ Código",
-                options=list(PREGUNTAS.keys()),
-                index=list(PREGUNTAS.keys()).index(df.loc[idx_sel, "Código"]),
-            )
-
-        dim, texto = PREGUNTAS[codigo]
+        # Selector de fila opcional (por _id: no cambia al borrar otras filas).
+        # Solo se ofrecen las filas seleccionadas y las de la página visible.
+        candidatos = dict.fromkeys(st.session_state.get("selected_rows", []) + st.session_state.get("page_ids", []))
+        id_sel = st.selectbox("Fila existente (opcional):", options=["<Nueva>"] + list(candidatos), index=0)
+        fila = None if id_sel == "<Nueva>" else get_row(id_sel)
+        # La fila tal como estaba al elegirla: los campos parten de ella y el
+        # guardado es condicional a su versión (se fusiona con lo que otras
+        # sesiones cambien mientras tanto, o se avisa si tocaron lo mismo)
+        if fila is None:
+            st.session_state.pop("edit_base", None)
+        elif st.session_state.get("edit_base", {}).get(servqual_store.ID_COL) != id_sel:
+            st.session_state.edit_base = fila.to_dict()
+            st.session_state.pop("edit_conflicto", None)
+        base = st.session_state.get("edit_base") if fila is not None else None
+
+        def previo(col: str, defecto=""):
+            valor = None if base is None else base.get(col)
+            return defecto if valor is None or pd.isna(valor) else valor
+
+        def posicion(opciones, col: str) -> int:
+            opciones = list(opciones)
+            return opciones.index(previo(col)) if previo(col) in opciones else 0
+
+        codigo = st.selectbox(
+            "⭐ Código",
+            options=cat.codigos,
+            index=cat.posicion.get(previo("Código"), 0),
+        )
+
+        dim, texto = cat.preguntas[codigo]
         st.caption(f"**Dimensión detectada:** {dim}")
         st.text_area("⭐ Pregunta evaluada (completa)", value=texto, key="edit_pregunta", height=80)
 
+        opciones_sub = ("",) + cat.subopciones_de(codigo)
         sub = st.selectbox(
             "⭐ Subproblema identificado (se muestra según código)",
-            options=[""] + SUBOPCIONES.get(codigo, []),
+            options=opciones_sub,
+            index=posicion(opciones_sub, "Subproblema identificado"),
         )
         colA, colB = st.columns(2)
         with colA:
-            causa = st.text_input("Causa raíz")
-            accion = st.text_input("Acción correctiva")
-            fecha = st.date_input("Fecha seguimiento", value=date.today())
+            causa = st.text_input("Causa raíz", value=str(previo("Causa raíz")))
+            sugerida = servqual_sugerencias.sugerir(f"{sub} {texto}") if sub else ""
+            accion = st.text_input("Acción correctiva", value=str(previo("Acción correctiva") or sugerida))
+            fecha = st.date_input("Fecha seguimiento", value=pd.Timestamp(previo("Fecha seguimiento", date.today())).date())
         with colB:
-            responsable = st.selectbox("⭐ Responsable", options=RESPONSABLES)
-            plazo = st.text_input("Plazo (ej. 30 días)")
-            estado = st.selectbox("⭐ Estado", options=ESTADOS)
-            avance = st.slider("% Avance", 0, 100, 0)
-        sucursal = st.selectbox("⭐ Sucursal", options=SUCURSALES)
+            responsable = st.selectbox("⭐ Responsable", options=cat.responsables, index=posicion(cat.responsables, "Responsable"))
+            plazo = st.text_input("Plazo (ej. 30 días)", value=str(previo("Plazo")))
+            estado = st.selectbox("⭐ Estado", options=cat.estados, index=posicion(cat.estados, "Estado"))
+            avance = st.slider("% Avance", 0, 100, int(previo("% Avance", 0)))
+        sucursal = st.selectbox("⭐ Sucursal", options=cat.sucursales, index=posicion(cat.sucursales, "Sucursal"))
+        conflicto = st.session_state.get("edit_conflicto")
+        if conflicto:
+            st.warning(f"Otra sesión cambió estos campos mientras editabas: {conflicto}.")
+        forzar = bool(conflicto) and st.checkbox("Sobrescribir esos campos con mis valores")
 
         if st.button("💾 Guardar", type="primary"):
             new_row = {
@@ -533,116 +953,294 @@ def _modal_editor_ui():
                 "% Avance": avance,
                 "Sucursal": sucursal,
             }
-            if idx_sel == "<Nueva>":
-                st.session_state.df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            else:
-                for k, v in new_row.items():
-                    st.session_state.df.loc[idx_sel, k] = v
-            save_data(st.session_state.df)
+            try:
+                if fila is None:
+                    insert_rows(pd.DataFrame([new_row], columns=COLS))
+                else:
+                    # solo lo que se editó: lo demás que cambió la otra sesión se conserva
+                    cambios = servqual_store.editadas(base, new_row, DTYPES)
+                    if cambios and forzar:
+                        update_row(id_sel, cambios)
+                    elif cambios:
+                        update_row(id_sel, cambios, version=base[servqual_store.VER_COL], base=base)
+            except servqual_store.DuplicateKeyError:
+                st.error(f"Ya existe una fila para {codigo} en {sucursal}.")
+                return
+            except servqual_store.ConflictError as exc:
+                actual = get_row(id_sel)
+                if actual is None:
+                    st.error("Otra sesión eliminó esta fila mientras la editabas.")
+                    return
+                st.session_state.edit_conflicto = ", ".join(f"{c} = {actual[c]}" for c in exc.columnas)
+                st.rerun()
+            st.session_state.pop("edit_base", None)
+            st.session_state.pop("edit_conflicto", None)
             st.session_state.modal_open = False
             st.rerun()
 
 
+@medido("ui.rerun")
 def run_streamlit_app():  # pragma: no cover - UI
     st.set_page_config(page_title="Plan de Acción • SERVQUAL", layout="wide")
 
-    if "df" not in st.session_state:
-        st.session_state.df = load_data()
+    # La matriz no se carga completa en cada interacción: la grilla pide solo
+    # su página al almacén (compartido entre sesiones)
+    servqual_metricas.contar("reruns")
+    usuario = st.sidebar.text_input("Usuario", key="usuario", help="Firma tus cambios en el historial")
+    servqual_historia.fijar_usuario(usuario.strip() or None)
+    cat = catalogo_vigente()
+    if aviso_catalogo():
+        st.sidebar.warning(aviso_catalogo())
     if "selected_rows" not in st.session_state:
         st.session_state.selected_rows = []
 
     st.title("PLAN DE ACCIÓN • MATRIZ DE SEGUIMIENTO")
 
     # Filtros de visualización
-    with st.expander("Filtros de visualización", expanded=True):
+    with servqual_metricas.tramo("ui.filtros"), st.expander("Filtros de visualización", expanded=True):
         c1, c2, c3, c4 = st.columns(4)
         with c1:
-            f_dim = st.selectbox("Dimensión", options=["Todas"] + [d for _, d in DIMENSIONES])
+            f_dim = st.selectbox("Dimensión", options=("Todas",) + cat.nombres_dimension)
         with c2:
-            f_resp = st.selectbox("Responsable", options=["Todos"] + RESPONSABLES)
+            f_resp = st.selectbox("Responsable", options=("Todos",) + cat.responsables)
         with c3:
-            f_est = st.selectbox("Estado", options=["Todos"] + ESTADOS)
+            f_est = st.selectbox("Estado", options=("Todos",) + cat.estados)
         with c4:
-            f_suc = st.selectbox("Sucursal", options=["Todas"] + SUCURSALES)
+            f_suc = st.selectbox("Sucursal", options=("Todas",) + cat.sucursales)
+        f_q = st.text_input(
+            "Buscar", placeholder="Código, pregunta, subproblema, causa o acción (sin importar tildes)"
+        )
 
     # Agregar por dimensión (carga masiva y guardado automático)
-    with st.expander("Agregar filas por dimensión", expanded=True):
+    with servqual_metricas.tramo("ui.agregar_dimension"), st.expander("Agregar filas por dimensión", expanded=True):
         c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
         with c1:
-            dim_to_add = st.selectbox("Dimensión a cargar", options=[d for _, d in DIMENSIONES])
+            dim_to_add = st.selectbox("Dimensión a cargar", options=cat.nombres_dimension)
         with c2:
-            resp_asignar = st.selectbox("Responsable (asignar)", options=RESPONSABLES)
+            resp_asignar = st.selectbox("Responsable (asignar)", options=cat.responsables)
         with c3:
-            estado_asignar = st.selectbox("Estado (asignar)", options=ESTADOS, index=0)
+            estado_asignar = st.selectbox("Estado (asignar)", options=cat.estados, index=0)
         with c4:
-            suc_asignar = st.selectbox("Sucursal (asignar)", options=SUCURSALES)
+            suc_asignar = st.selectbox("Sucursal (asignar)", options=cat.sucursales)
         colx, _ = st.columns([1, 3])
         with colx:
             st.checkbox("Seleccionar TODAS las preguntas de esta dimensión", value=True, key="_all_q")
             if st.button("➕ Agregar por dimensión", type="primary"):
-                base = st.session_state.df
-                updated = upsert_por_dimension(base, dim_to_add, resp_asignar, estado_asignar, suc_asignar)
-                if len(updated) == len(base):
+                plan = construir_plan([dim_to_add], [suc_asignar], resp_asignar, estado_asignar)
+                agregadas = agregar_plan(plan)
+                if agregadas.empty:
                     st.info("Nada que agregar (posibles duplicados por Código+Sucursal).")
                 else:
-                    st.session_state.df = updated
-                    save_data(st.session_state.df)
-                    st.success(f"Agregadas {len(updated) - len(base)} fila(s) de {dim_to_add}. Se guardó automáticamente.")
+                    st.success(f"Agregadas {len(agregadas)} fila(s) de {dim_to_add}. Se guardó automáticamente.")
+
+    filtros = {
+        "dimension": None if f_dim == "Todas" else f_dim,
+        "responsable": None if f_resp == "Todos" else f_resp,
+        "estado": None if f_est == "Todos" else f_est,
+        "sucursal": None if f_suc == "Todas" else f_suc,
+        "q": f_q.strip() or None,
+    }
 
     # Acciones superiores (modal, exportar, eliminar)
-    _header_actions_ui()
+    _header_actions_ui(filtros)
     _modal_editor_ui()
 
-    # Aplicar filtros a una vista
-    view = st.session_state.df.copy()
-    if f_dim != "Todas":
-        view = view[view["Dimensión"] == f_dim]
-    if f_resp != "Todos":
-        view = view[view["Responsable"] == f_resp]
-    if f_est != "Todos":
-        view = view[view["Estado"] == f_est]
-    if f_suc != "Todas":
-        view = view[view["Sucursal"] == f_suc]
-
-    st.subheader("Matriz (editable)")
-    st.caption(
-        "Selecciona filas con la casilla del lado izquierdo para eliminarlas con el botón de arriba. Para editar una fila, usa ‘Nuevo / Editar fila’. El guardado es automático al agregar o guardar en el modal."
+    tab_matriz, tab_tablero, tab_plazos, tab_historial = st.tabs(["Matriz", "Tablero", "Plazos", "Historial"])
+    with tab_matriz:
+        st.subheader("Matriz (editable)")
+        st.caption(
+            "Selecciona filas con la casilla del lado izquierdo para eliminarlas con el botón de arriba. Para editar una fila, usa ‘Nuevo / Editar fila’. El guardado es automático al agregar o guardar en el modal."
+        )
+        _grid_ui(filtros)
+    with tab_tablero:
+        _dashboard_ui()
+    with tab_plazos:
+        _plazos_ui(cat)
+    with tab_historial:
+        _historial_ui()
+    if servqual_metricas.activo():
+        _debug_ui()
+
+
+def _debug_ui():  # pragma: no cover - UI
+    """Panel de diagnóstico (solo con SERVQUAL_METRICAS): tiempos por tramo,
+    contadores y los tramos más recientes."""
+    with st.sidebar.expander("🔧 Diagnóstico", expanded=False):
+        cuentas = servqual_metricas.contadores()
+        st.caption(" · ".join(f"{k}: {v:,}" for k, v in sorted(cuentas.items())) or "Sin contadores")
+        st.dataframe(pd.DataFrame(servqual_metricas.resumen()), hide_index=True, use_container_width=True)
+        st.dataframe(pd.DataFrame(servqual_metricas.recientes(30)[::-1]), hide_index=True, use_container_width=True)
+        if st.button("Reiniciar métricas"):
+            servqual_metricas.reiniciar()
+
+
+@medido("ui.tablero")
+def _dashboard_ui():  # pragma: no cover - UI
+    """Tablero de avance por sucursal / dimensión / responsable."""
+    total = kpi_resumen().iloc[0]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Acciones", int(total["Filas"]))
+    m2.metric("% Completado", f"{total['% Completado']:.1f}%" if pd.notna(total["% Completado"]) else "—")
+    m3.metric("Avance medio", f"{total['Avance medio']:.1f}%" if pd.notna(total["Avance medio"]) else "—")
+    m4.metric("Vencidas", int(total["Vencidas"]))
+
+    por = st.multiselect("Agrupar por", options=list(_kpi().grupos), default=["Sucursal"], key="kpi_por")
+    if not por:
+        return
+    tabla = kpi_resumen(por)
+    st.dataframe(
+        tabla,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "% Completado": st.column_config.ProgressColumn("% Completado", min_value=0, max_value=100, format="%.1f%%"),
+            "Avance medio": st.column_config.ProgressColumn("Avance medio", min_value=0, max_value=100, format="%.1f%%"),
+        },
     )
+    etiqueta = tabla[por].astype(str).agg(" · ".join, axis=1)
+    st.bar_chart(tabla.assign(Grupo=etiqueta).set_index("Grupo")[["% Completado", "Avance medio"]])
+
+
+@medido("ui.plazos")
+def _plazos_ui(cat: Catalogo):  # pragma: no cover - UI
+    """Acciones vencidas y por vencer de un responsable o una sucursal."""
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        responsable = st.selectbox("Responsable", options=("Todos",) + cat.responsables, key="plazo_resp")
+    with c2:
+        sucursal = st.selectbox("Sucursal", options=("Todas",) + cat.sucursales, key="plazo_suc")
+    with c3:
+        dias = st.number_input("Vencen en los próximos (días)", min_value=0, max_value=90, value=7, key="plazo_dias")
+    agenda = agenda_plazos(
+        None if responsable == "Todos" else responsable,
+        None if sucursal == "Todas" else sucursal,
+        int(dias),
+    )
+    vencidas = agenda["Situación"] == "Vencida"
+    m1, m2 = st.columns(2)
+    m1.metric("Vencidas", int(vencidas.sum()))
+    m2.metric("Por vencer", int((~vencidas).sum()))
+    columnas = ["Vencimiento", "Días", "Situación", "Código", "Sucursal", "Responsable", "Acción correctiva", "Plazo", "Estado", "% Avance"]
+    st.dataframe(
+        agenda[columnas],
+        hide_index=True,
+        use_container_width=True,
+        column_config={"Vencimiento": st.column_config.DateColumn("Vencimiento", format="DD/MM/YYYY")},
+    )
+
 
+@medido("ui.historial")
+def _historial_ui():  # pragma: no cover - UI
+    """Avance en el tiempo, matriz a una fecha y últimos cambios."""
+    if not HISTORIAL:
+        st.info("El historial está apagado (SERVQUAL_HISTORIAL=0).")
+        return
+    inicio = _historia().inicio
+    if inicio is None:
+        st.info("Aún no hay cambios registrados.")
+        return
+    c1, c2 = st.columns(2)
+    with c1:
+        fecha = st.date_input("Matriz al", value=date.today(), min_value=inicio.date(), max_value=date.today())
+    with c2:
+        por = st.selectbox("Avance por", options=list(_kpi().grupos), key="hist_por")
+    serie = serie_avance(por=[por])
+    if not serie.empty:
+        st.line_chart(serie.pivot_table(index="Fecha", columns=por, values="Avance medio", observed=True))
+    vista = matriz_a_la_fecha(fecha)
+    st.caption(f"{len(vista):,} fila(s) al {fecha:%d/%m/%Y} (se muestran hasta 500)")
+    st.dataframe(vista.drop(columns=[servqual_store.ID_COL]).head(500), hide_index=True, use_container_width=True)
+    st.markdown("**Últimos cambios**")
+    cambios = historial_cambios(desde=date.today() - timedelta(days=30))
+    st.dataframe(cambios.tail(200).iloc[::-1], hide_index=True, use_container_width=True)
+
+
+@medido("ui.matriz")
+def _grid_ui(filtros: dict):  # pragma: no cover - UI
+    """Matriz paginada: solo la página visible viaja al navegador."""
+    c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
+    with c1:
+        orden = st.selectbox("Ordenar por", options=["(alta)"] + COLS, key="grid_sort")
+    with c2:
+        descendente = st.toggle("Descendente", key="grid_desc")
+    with c3:
+        tam = st.selectbox("Filas por página", options=PAGE_SIZES, index=1, key="grid_size")
+
+    # Volver a la primera página si cambian filtros, orden o tamaño
+    contexto = (tuple(filtros.values()), orden, descendente, tam)
+    if st.session_state.get("grid_ctx") != contexto:
+        st.session_state.grid_ctx = contexto
+        st.session_state.grid_page = 1
+
+    sort = None if orden == "(alta)" else orden
+    pagina = st.session_state.get("grid_page", 1)
+    view, total = page_data(**filtros, page=pagina - 1, page_size=tam, sort=sort, descending=descendente)
+    paginas = max(1, -(-total // tam))
+    if pagina > paginas:  # la matriz se achicó (bajas de otras sesiones)
+        pagina = st.session_state.grid_page = paginas
+        view, total = page_data(**filtros, page=pagina - 1, page_size=tam, sort=sort, descending=descendente)
+    with c4:
+        st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, key="grid_page")
+
+    st.session_state.page_ids = view[servqual_store.ID_COL].tolist()
+    # Lo que escribieron otras sesiones desde la vista anterior: solo el delta
+    vista = st.session_state.get("revision")
+    if vista:
+        delta = cambios_desde(vista)
+        if not delta.completa and (len(delta.filas) or delta.borradas):
+            st.toast(f"🔄 Desde tu última vista: {len(delta.filas)} fila(s) nuevas o editadas, {len(delta.borradas)} eliminadas")
+        st.session_state.revision = delta.revision
+    else:
+        st.session_state.revision = revision_actual()
     if view.empty:
         st.info("No hay filas que coincidan con los filtros.")
-    else:
-        # Añadimos una columna de selección temporal
-        view = view.reset_index(names="_idx")
+        st.session_state.selected_rows = []
+        return
+    st.caption(f"Filas {(pagina - 1) * tam + 1}–{(pagina - 1) * tam + len(view)} de {total}")
+
+    # Casilla de selección + _id de la fila (no cambia entre recargas aunque
+    # otras sesiones editen la matriz)
+    view = view.drop(columns=[servqual_store.VER_COL]).rename(columns={servqual_store.ID_COL: "_idx"}).reset_index(drop=True)
+    view.insert(0, "Sel", False)
+    with servqual_metricas.tramo("ui.data_editor", filas=len(view)):
         sel = st.data_editor(
             view,
             column_config={
-                "_idx": st.column_config.NumberColumn("Sel", help="Marca la fila para eliminar", disabled=True),
+                "Sel": st.column_config.CheckboxColumn("Sel", help="Marca la fila para eliminar"),
+                "_idx": st.column_config.NumberColumn("ID", disabled=True),
             },
-            disabled=[c for c in view.columns if c != "_idx"],
+            disabled=[c for c in view.columns if c != "Sel"],
             hide_index=True,
             use_container_width=True,
             height=min(560, 100 + 30 * len(view)),
+            key=f"grid_{pagina}_{contexto}",
         )
-        st.session_state.selected_rows = sel["_idx"].tolist() if "_idx" in sel else []
+    st.session_state.selected_rows = sel.loc[sel["Sel"], "_idx"].tolist()
 
 
 # -------------------------------------------------------------
-# Punto de entrada (solo lanza UI si Streamlit está disponible)
+# Punto de entrada: la UI se lanza solo con ``streamlit run`` (este archivo
+# o streamlit_app.py); importar el módulo nunca la ejecuta
 # -------------------------------------------------------------
-if _HAS_ST:  # pragma: no cover - la UI no se somete a pruebas unitarias
+if __name__ == "__main__" and _bajo_streamlit():  # pragma: no cover - UI
     run_streamlit_app()
 
 # =============================================================
 # Pequeño set de pruebas sanitarias (usables sin Streamlit)
 # =============================================================
-if __name__ == "__main__":  # pragma: no cover
-    # "Smoke tests" rápidos en modo librería
-    df0 = load_data()
-    df1 = upsert_por_dimension(df0, "FIABILIDAD", RESPONSABLES[0], ESTADOS[0], SUCURSALES[0])
-    assert isinstance(df1, pd.DataFrame)
-    assert set(COLS).issubset(set(df1.columns))
-    # No debe duplicar si llamo de nuevo con los mismos parámetros
-    df2 = upsert_por_dimension(df1, "FIABILIDAD", RESPONSABLES[0], ESTADOS[0], SUCURSALES[0])
-    assert len(df2) == len(df1)
+elif __name__ == "__main__":  # pragma: no cover
+    # "Smoke tests" rápidos en modo librería, sobre una matriz temporal (las
+    # pruebas de cada módulo están en tests/, con pytest)
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        DATAFILE = Path(tmp) / "plan.csv"
+        df0 = load_data()
+        df1 = upsert_por_dimension(df0, "FIABILIDAD", RESPONSABLES[0], ESTADOS[0], SUCURSALES[0])
+        assert isinstance(df1, pd.DataFrame)
+        assert set(COLS).issubset(set(df1.columns))
+        # No debe duplicar si llamo de nuevo con los mismos parámetros
+        df2 = upsert_por_dimension(df1, "FIABILIDAD", RESPONSABLES[0], ESTADOS[0], SUCURSALES[0])
+        assert len(df2) == len(df1)
+        servqual_store.close_stores()
     print("✓ Pruebas básicas superadas (modo librería).")
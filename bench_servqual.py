@@ -0,0 +1,271 @@
+"""
+Benchmarks del modo librería sobre matrices sintéticas grandes.
+
+Genera un plan sintético (sucursales × ciclos × preguntas del catálogo) del
+tamaño pedido, lo guarda en un almacén temporal y mide tiempo y pico de
+memoria de las operaciones principales: ``construir_filas_plan``,
+``construir_filas_dimension``, ``save_data`` (inicial y con cambios),
+``load_data``, ``upsert_por_dimension``, ``filter_data`` (también con
+búsqueda libre), ``page_data``, ``kpi_resumen``, ``agenda_plazos``,
+``export_excel`` y ``generar_reportes`` (este último solo hasta 10k filas).
+
+Uso::
+
+    python bench_servqual.py                                 # 10k, 100k y 1M filas
+    python bench_servqual.py --sizes 10000 100000 --backend sqlite --out base.json
+    python bench_servqual.py --sizes 10000 --compare base.json   # código 1 si empeora
+
+Cada caso se ejecuta ``repeticiones`` veces sin instrumentar (se reporta el
+mínimo y la mediana) y una vez más bajo ``tracemalloc`` para el pico de
+memoria (``--sin-memoria`` lo omite). El resultado es un JSON con ``meta`` y
+una lista ``resultados`` (una entrada por caso y tamaño); ``--compare`` lo
+contrasta con otro JSON y marca como regresión lo que sea más lento que
+``--tolerancia`` (25 % por defecto) y más de 5 ms.
+
+Como la matriz admite una sola fila por (Código, Sucursal), cada ciclo de
+seguimiento de una sucursal sintética se representa como una sucursal
+distinta (``SUC 0001 · C2``).
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import app_servqual_plan_accion as app
+
+TAMANOS = (10_000, 100_000, 1_000_000)
+CICLOS = 4
+TOLERANCIA = 0.25
+PISO_SEGUNDOS = 0.005
+
+
+@dataclass
+class Caso:
+    """Operación medida. *preparar* hace el trabajo previo (no medido) y
+    devuelve la función a medir; se llama antes de cada repetición."""
+
+    nombre: str
+    preparar: Callable[[], Callable[[], object]]
+    repeticiones: int = 3
+
+
+# -------------------------------------------------------------
+# Datos sintéticos
+# -------------------------------------------------------------
+def sucursales_sinteticas(filas: int, ciclos: int = CICLOS) -> list[str]:
+    """Sucursales × ciclos necesarias para llegar a *filas* filas."""
+    por_sucursal = len(app.catalogo_vigente().codigos) * ciclos
+    n = -(-filas // por_sucursal)
+    return [f"SUC {s:04d} · C{c}" for s in range(1, n + 1) for c in range(1, ciclos + 1)]
+
+
+def plan_sintetico(filas: int, ciclos: int = CICLOS) -> pd.DataFrame:
+    """Plan de carga (todas las dimensiones × sucursales sintéticas)."""
+    cat = app.catalogo_vigente()
+    dims = list(cat.nombres_dimension)
+    responsables = [cat.responsables[i % len(cat.responsables)] for i in range(len(dims))]
+    fechas = [date(2025, 1, 1) + timedelta(days=30 * i) for i in range(len(dims))]
+    return app.construir_plan(dims, sucursales_sinteticas(filas, ciclos), responsables, cat.estados[0], fechas)
+
+
+def matriz_sintetica(filas: int, ciclos: int = CICLOS, semilla: int = 0) -> pd.DataFrame:
+    """*filas* filas de la matriz con estados, avance y subproblemas variados."""
+    cat = app.catalogo_vigente()
+    rng = np.random.default_rng(semilla)
+    df = app.construir_filas_plan(plan_sintetico(filas, ciclos)).head(filas).reset_index(drop=True)
+    df["Estado"] = np.asarray(cat.estados, dtype=object)[rng.integers(0, len(cat.estados), filas)]
+    df["% Avance"] = rng.integers(0, 101, filas)
+    primera = np.array([cat.subopciones_de(c)[0] if cat.subopciones_de(c) else "" for c in df["Código"]], dtype=object)
+    df["Subproblema identificado"] = np.where(rng.random(filas) < 0.3, primera, "")
+    return df
+
+
+# -------------------------------------------------------------
+# Casos
+# -------------------------------------------------------------
+def casos(filas: int, df: pd.DataFrame, tmp: Path, sufijo: str, incluir_export: bool) -> list[Caso]:
+    cat = app.catalogo_vigente()
+    principal = tmp / f"plan{sufijo}"
+    app.DATAFILE = principal
+    app.save_data(df.copy())
+    plan = plan_sintetico(filas)
+    pesado = 1 if filas >= 100_000 else 3
+    contador = iter(range(10**9))
+
+    def en_principal(f):
+        def preparar():
+            app.DATAFILE = principal
+            return f()
+        return preparar
+
+    def save_inicial():
+        app.servqual_store.close_stores(app.DATAFILE)  # libera la matriz de la repetición anterior
+        app.DATAFILE = tmp / f"inicial{next(contador)}{sufijo}"
+        datos = df.copy()
+        return lambda: app.save_data(datos)
+
+    def save_cambios():
+        base = app.load_data()
+        filas_cambio = np.arange(0, len(base), 100)
+        estados = base["Estado"].to_numpy(copy=True)
+        estados[filas_cambio] = np.where(estados[filas_cambio] == cat.estados[0], cat.estados[1], cat.estados[0])
+        base["Estado"] = estados
+        return lambda: app.save_data(base)
+
+    def upsert():
+        base = app.load_data()
+        return lambda: app.upsert_por_dimension(base, cat.nombres_dimension[0], cat.responsables[0], cat.estados[0], "SUC NUEVA")
+
+    lista = [
+        Caso("construir_filas_plan", lambda: lambda: app.construir_filas_plan(plan), pesado),
+        Caso(
+            "construir_filas_dimension",
+            lambda: lambda: app.construir_filas_dimension(
+                cat.nombres_dimension[0], cat.responsables[0], cat.estados[0], "SUC 0001 · C1"
+            ),
+            20,
+        ),
+        Caso("save_data_inicial", save_inicial, pesado),
+        Caso("load_data", en_principal(lambda: app.load_data), pesado),
+        Caso("save_data_cambios_1pct", en_principal(save_cambios), pesado),
+        Caso("upsert_por_dimension", en_principal(upsert), pesado),
+        Caso(
+            "filter_data",
+            en_principal(lambda: lambda: app.filter_data(estado=cat.estados[0], responsable=cat.responsables[0])),
+            10,
+        ),
+        Caso(
+            "filter_data_buscar",
+            en_principal(lambda: lambda: app.filter_data(estado=cat.estados[0], q="empatia")),
+            10,
+        ),
+        Caso("page_data", en_principal(lambda: lambda: app.page_data(page=10, page_size=50, sort="Fecha seguimiento")), 10),
+        Caso("kpi_resumen", en_principal(lambda: lambda: app.kpi_resumen(["Sucursal"])), 10),
+        Caso(
+            "agenda_plazos",
+            en_principal(lambda: lambda: app.agenda_plazos(responsable=cat.responsables[0], hoy=date(2025, 3, 1))),
+            10,
+        ),
+    ]
+    if incluir_export:
+        lista.append(Caso("export_excel", en_principal(lambda: lambda: app.export_excel(max_bytes=None)), 1))
+    if incluir_export and filas <= 10_000:  # un libro por sucursal sintética: miles con más filas
+        lista.append(
+            Caso("generar_reportes", en_principal(lambda: lambda: app.generar_reportes(tmp / f"reportes{sufijo}")), 1)
+        )
+    return lista
+
+
+# -------------------------------------------------------------
+# Medición
+# -------------------------------------------------------------
+def medir(caso: Caso, memoria: bool) -> dict:
+    tiempos = []
+    for _ in range(caso.repeticiones):
+        f = caso.preparar()
+        gc.collect()
+        t0 = time.perf_counter()
+        f()
+        tiempos.append(time.perf_counter() - t0)
+    pico = None
+    if memoria:
+        f = caso.preparar()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            f()
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        "caso": caso.nombre,
+        "segundos": round(min(tiempos), 6),
+        "mediana": round(statistics.median(tiempos), 6),
+        "repeticiones": caso.repeticiones,
+        "pico_mb": None if pico is None else round(pico / 2**20, 2),
+    }
+
+
+def correr(tamanos, backend: str, memoria: bool, incluir_export: bool, log=sys.stderr) -> dict:
+    sufijo = ".db" if backend == "sqlite" else ".csv"
+    resultados = []
+    for filas in tamanos:
+        df = matriz_sintetica(filas)
+        with tempfile.TemporaryDirectory() as tmp:
+            for caso in casos(filas, df, Path(tmp), sufijo, incluir_export):
+                r = {"filas": filas, "backend": backend, **medir(caso, memoria)}
+                resultados.append(r)
+                pico = "" if r["pico_mb"] is None else f"  {r['pico_mb']:9.1f} MB"
+                print(f"{filas:>9,} {backend:<8} {r['caso']:<26} {r['segundos']:10.4f} s{pico}", file=log)
+            app.servqual_store.close_stores()
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "ciclos": CICLOS,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(actual: dict, base: dict, tolerancia: float = TOLERANCIA) -> list[dict]:
+    """Casos de *actual* más lentos que en *base* más allá de la tolerancia."""
+    previos = {(r["caso"], r["filas"], r["backend"]): r for r in base["resultados"]}
+    regresiones = []
+    for r in actual["resultados"]:
+        b = previos.get((r["caso"], r["filas"], r["backend"]))
+        if b is None:
+            continue
+        if r["segundos"] > b["segundos"] * (1 + tolerancia) and r["segundos"] - b["segundos"] > PISO_SEGUNDOS:
+            regresiones.append({**r, "base": b["segundos"], "factor": round(r["segundos"] / b["segundos"], 2)})
+    return regresiones
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(TAMANOS), help="filas de cada matriz")
+    parser.add_argument("--backend", choices=("journal", "sqlite"), default="journal")
+    parser.add_argument("--out", type=Path, help="archivo JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--compare", type=Path, help="JSON de referencia para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--sin-memoria", action="store_true", help="no medir el pico de memoria")
+    parser.add_argument("--sin-export", action="store_true", help="omitir export_excel")
+    args = parser.parse_args(argv)
+
+    resultado = correr(args.sizes, args.backend, not args.sin_memoria, not args.sin_export)
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(texto, encoding="utf-8")
+    else:
+        print(texto)
+    if args.compare:
+        regresiones = comparar(resultado, json.loads(args.compare.read_text(encoding="utf-8")), args.tolerancia)
+        for r in regresiones:
+            print(
+                f"REGRESIÓN {r['caso']} ({r['filas']:,} filas, {r['backend']}): "
+                f"{r['base']:.4f} s -> {r['segundos']:.4f} s (x{r['factor']})",
+                file=sys.stderr,
+            )
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
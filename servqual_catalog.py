@@ -0,0 +1,749 @@
+"""
+Catálogos SERVQUAL: dimensiones, estados, responsables, sucursales, preguntas
+y subproblemas, con sus tablas de búsqueda precalculadas.
+
+Las tablas se calculan una sola vez al construir el :class:`Catalogo` (al
+importar el módulo para el catálogo por defecto) y quedan congeladas (tuplas y
+``MappingProxyType``), de modo que la UI y la librería las comparten sin
+riesgo de modificarlas:
+
+- ``codigos``: códigos de pregunta en orden; ``posicion``: código -> índice.
+- ``por_dimension``: nombre largo de dimensión -> tupla de códigos.
+- ``corto_a_largo`` / ``largo_a_corto``: ``"FIA"`` <-> ``"FIABILIDAD"``.
+- ``subopciones``: código -> tupla de subproblemas; ``subcodigo_padre``:
+  ``"FIA_P001A"`` -> ``"FIA_P001"``.
+
+Los catálogos también pueden venir de un archivo externo (JSON o libro de
+Excel, ver :func:`cargar_catalogo`), para cambiar responsables o sucursales sin
+redesplegar. El archivo se valida y se *compila* a un artefacto JSON junto a él
+(``.<archivo>.<sha256>.catalogo.json``); los arranques siguientes solo calculan
+el hash del archivo y leen el artefacto, sin volver a abrir el libro. Si se
+define la variable de entorno ``SERVQUAL_CATALOGO`` con la ruta del archivo,
+ese catálogo reemplaza al integrado; si falta o no es válido se usa el
+integrado con una advertencia (importar el módulo nunca falla por eso).
+
+El módulo no depende de pandas ni de Streamlit (``openpyxl`` solo se importa
+para leer libros de Excel).
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import warnings
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping
+
+from servqual_texto import normalizar
+
+DIMENSIONES = [
+    ("FIA", "FIABILIDAD"),
+    ("CAP", "CAPACIDAD DE RESPUESTA"),
+    ("SEG", "SEGURIDAD"),
+    ("EMP", "EMPATÍA"),
+    ("TAN", "ASPECTOS TANGIBLES"),
+    ("EXP", "EXPERIENCIA / EXPANSIÓN"),
+]
+
+ESTADOS = ["Pendiente", "En progreso", "Completado", "Bloqueado"]
+
+RESPONSABLES = [
+    "BRYSEYDA A. ZUÑIGA GOMEZ",
+    "DANIEL ALEJANDRO MONTERR0SO MORALES",
+    "DARWIN RENE RODAS CHEGUEN",
+    "IVAN ALBERTO MOLINA ALVAREZ",
+]
+
+SUCURSALES = [
+    "CLINICA AMATITLAN",
+    "CLINICA ANTIGUA",
+    "CLINICA MAZATENANGO",
+]
+
+# Mapa: código -> (dimensión, texto de la pregunta)
+PREGUNTAS: dict[str, tuple[str, str]] = {
+    # FIABILIDAD (5)
+    "FIA_P001": (
+        "FIABILIDAD",
+        "¿El personal de recepción le explicó de forma clara y sencilla todos los pasos que debía seguir para su consulta?",
+    ),
+    "FIA_P002": ("FIABILIDAD", "¿La atención en caja o el pago de sus servicios fue rápida?"),
+    "FIA_P003": ("FIABILIDAD", "¿Respetaron el orden de llegada y su turno para atenderle?"),
+    "FIA_P004": ("FIABILIDAD", "¿El doctor le explicó de manera clara y detallada su diagnóstico?"),
+    "FIA_P005": ("FIABILIDAD", "¿Fue fácil obtener su cita?"),
+    # CAPACIDAD DE RESPUESTA (4)
+    "CAP_P006": (
+        "CAPACIDAD DE RESPUESTA",
+        "¿Recibió atención rápidamente después de llegar al hospital/clínica?",
+    ),
+    "CAP_P007": (
+        "CAPACIDAD DE RESPUESTA",
+        "¿El personal le informó sobre otros servicios o programas de APROFAM que podrían complementar su cuidado de salud?",
+    ),
+    "CAP_P008": (
+        "CAPACIDAD DE RESPUESTA",
+        "¿El personal del call center atendió su llamada con rapidez y resolvió su solicitud?",
+    ),
+    "CAP_P009": (
+        "CAPACIDAD DE RESPUESTA",
+        "¿Su experiencia en la farmacia del hospital/clínica fue la que esperaba?",
+    ),
+    # SEGURIDAD (6)
+    "SEG_P010": (
+        "SEGURIDAD",
+        "¿El médico y la enfermera le inspiraron confianza en la atención?",
+    ),
+    "SEG_P011": (
+        "SEGURIDAD",
+        "¿El médico le examinó físicamente de forma completa según su problema de salud?",
+    ),
+    "SEG_P012": ("SEGURIDAD", "¿El doctor le respondió todas sus preguntas?"),
+    "SEG_P013": (
+        "SEGURIDAD",
+        "¿Encontró el hospital/clínica limpia y en buenas condiciones?",
+    ),
+    "SEG_P014": (
+        "SEGURIDAD",
+        "¿Le explicaron de forma clara todos los procedimientos o exámenes que se debe realizar?",
+    ),
+    "SEG_P015": (
+        "SEGURIDAD",
+        "¿Le explicaron claramente cómo tomar sus medicamentos y qué cuidados debe tener en casa?",
+    ),
+    # EMPATÍA (3)
+    "EMP_P016": (
+        "EMPATÍA",
+        "¿Todo el personal le trató con amabilidad, respeto y paciencia durante su visita?",
+    ),
+    "EMP_P017": (
+        "EMPATÍA",
+        "¿Sintió que el doctor realmente se interesó por resolver su problema de salud?",
+    ),
+    "EMP_P018": (
+        "EMPATÍA",
+        "¿Le dieron consejos sobre cómo mejorar su salud y prevenir complicaciones?",
+    ),
+    # TANGIBLES (3)
+    "TAN_P019": (
+        "ASPECTOS TANGIBLES",
+        "¿Las instalaciones del hospital/clínica son cómodas y accesibles para personas con discapacidad?",
+    ),
+    "TAN_P020": (
+        "ASPECTOS TANGIBLES",
+        "¿Recibió recordatorios sobre su cita o promoción de servicios?",
+    ),
+    "TAN_P021": (
+        "ASPECTOS TANGIBLES",
+        "¿El tiempo que esperó en laboratorio, farmacia y otros servicios fue razonable?",
+    ),
+    # EXPERIENCIA/EXPANSIÓN (7)
+    "EXP_P022": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Le informaron sobre otros servicios disponibles como vacunación, salud mental o nutrición?",
+    ),
+    "EXP_P023": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Le informaron sobre opciones de asesoría virtual o telemedicina disponibles para su seguimiento médico?",
+    ),
+    "EXP_P024": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Considera que APROFAM ofrece los servicios para atender su familia?",
+    ),
+    "EXP_P025": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Encontró fácilmente información confiable de APROFAM en redes sociales, página web o centros de atención?",
+    ),
+    "EXP_P026": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Le pareció justo el precio por el servicio que recibió?",
+    ),
+    "EXP_P027": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Nos considera como su primera opción en servicios de laboratorio, farmacia y ultrasonidos?",
+    ),
+    "EXP_P028": (
+        "EXPERIENCIA / EXPANSIÓN",
+        "¿Recomendaría este hospital/clínica a sus familiares y amigos por la buena atención que recibió?",
+    ),
+}
+
+# Subopciones por pregunta (exactamente como en el documento)
+SUBOPCIONES: dict[str, list[str]] = {
+    # FIABILIDAD
+    "FIA_P001": [
+        "FIA_P001A - Explicación confusa",
+        "FIA_P001B - Faltó información",
+        "FIA_P001C - Personal desatento",
+        "FIA_P001D - Lenguaje técnico",
+    ],
+    "FIA_P002": [
+        "FIA_P002A - Caja muy lenta",
+        "FIA_P002B - Cola muy larga",
+        "FIA_P002C - Pocos cajeros",
+        "FIA_P002D - Sistema muy lento",
+    ],
+    "FIA_P003": [
+        "FIA_P003A - No respetaron orden",
+        "FIA_P003B - Saltaron turnos",
+        "FIA_P003C - Sin organización",
+        "FIA_P003D - Preferencias injustas",
+    ],
+    "FIA_P004": [
+        "FIA_P004A - Explicación rápida",
+        "FIA_P004B - Muy técnico",
+        "FIA_P004C - Faltó detalle",
+        "FIA_P004D - No entendí",
+    ],
+    "FIA_P005": [
+        "FIA_P005A - Sin disponibilidad",
+        "FIA_P005B - Proceso complicado",
+        "FIA_P005C - Mucha espera",
+        "FIA_P005D - Sistema deficiente",
+    ],
+    # CAPACIDAD DE RESPUESTA
+    "CAP_P006": [
+        "CAP_P006A - Mucha espera",
+        "CAP_P006B - Sistema lento",
+        "CAP_P006C - Falta personal",
+        "CAP_P006D - Desorganización",
+    ],
+    "CAP_P007": [
+        "CAP_P007A - No informaron",
+        "CAP_P007B - Info incompleta",
+        "CAP_P007C - Personal desconocía",
+        "CAP_P007D - No indagaron",
+    ],
+    "CAP_P008": [
+        "CAP_P008A - Tardaron en responder",
+        "CAP_P008B - No resolvieron mi solicitud",
+        "CAP_P008C - Me transfirieron muchas veces",
+        "CAP_P008D - Contestaron sin interés",
+    ],
+    "CAP_P009": [
+        "CAP_P009A - Precios altos",
+        "CAP_P009B - Sin disponibilidad",
+        "CAP_P009C - Sin alternativas",
+        "CAP_P009D - Me presionaron",
+    ],
+    # SEGURIDAD
+    "SEG_P010": [
+        "SEG_P010A - Parecían inexpertos",
+        "SEG_P010B - Dudaron mucho",
+        "SEG_P010C - Respuestas contradictorias",
+        "SEG_P010D - Falta seguridad",
+    ],
+    "SEG_P011": [
+        "SEG_P011A - Examen superficial",
+        "SEG_P011B - Muy rápido",
+        "SEG_P011C - Faltaron pruebas",
+        "SEG_P011D - No examinó",
+    ],
+    "SEG_P012": [
+        "SEG_P012A - Mucha prisa",
+        "SEG_P012B - No preguntó",
+        "SEG_P012C - Consulta corta",
+        "SEG_P012D - Me interrumpió",
+    ],
+    "SEG_P013": [
+        "SEG_P013A - Áreas sucias",
+        "SEG_P013B - Baños descuidados",
+        "SEG_P013C - Equipo sucio",
+        "SEG_P013D - Mal olor",
+    ],
+    "SEG_P014": [
+        "SEG_P014A - No explicaron",
+        "SEG_P014B - Muy técnico",
+        "SEG_P014C - Exp rápida",
+        "SEG_P014D - Quedé confuso",
+    ],
+    "SEG_P015": [
+        "SEG_P015A - Explicación confusa",
+        "SEG_P015B - Muy rápido",
+        "SEG_P015C - Faltó información",
+        "SEG_P015D - No explicaron",
+    ],
+    # EMPATÍA
+    "EMP_P016": [
+        "EMP_P016A - Trato brusco",
+        "EMP_P016B - Sin paciencia",
+        "EMP_P016C - Personal grosero",
+        "EMP_P016D - Me ignoraron",
+    ],
+    "EMP_P017": [
+        "EMP_P017A - Desinteresado",
+        "EMP_P017B - Muy automático",
+        "EMP_P017C - No escuchó",
+        "EMP_P017D - Falta empatía",
+    ],
+    "EMP_P018": [
+        "EMP_P018A - Consejos genéricos",
+        "EMP_P018B - No dieron",
+        "EMP_P018C - Muy básicos",
+        "EMP_P018D - No personalizados",
+    ],
+    # TANGIBLES
+    "TAN_P019": [
+        "TAN_P019A - Sin rampas",
+        "TAN_P019B - Espacios estrechos",
+        "TAN_P019C - Barreras físicas",
+        "TAN_P019D - Mal diseño",
+    ],
+    "TAN_P020": [
+        "TAN_P020A - Sin recordatorios",
+        "TAN_P020B - Info confusa",
+        "TAN_P020C - Llegó tarde",
+        "TAN_P020D - No recibí",
+    ],
+    "TAN_P021": [
+        "TAN_P021A - Mucha espera",
+        "TAN_P021B - Sistema lento",
+        "TAN_P021C - Falta personal",
+        "TAN_P021D - Desorganización",
+    ],
+    # EXP / EXPANSIÓN
+    "EXP_P022": [
+        "EXP_P022A - No informaron",
+        "EXP_P022B - Servicios limitados",
+        "EXP_P022C - Personal desconocía",
+        "EXP_P022D - No preguntaron",
+    ],
+    "EXP_P023": [
+        "EXP_P023A - No conocían telemedicina",
+        "EXP_P023B - Sin asesoría virtual",
+        "EXP_P023C - Solo presencial",
+        "EXP_P023D - Falta tecnología",
+    ],
+    "EXP_P024": [
+        "EXP_P024A - Sin programas",
+        "EXP_P024B - Servicios separados",
+        "EXP_P024C - No disponible",
+        "EXP_P024D - Falta integración",
+    ],
+    "EXP_P025": [
+        "EXP_P025A - No tienen redes",
+        "EXP_P025B - Difícil de encontrar",
+        "EXP_P025C - Información incompleta",
+        "EXP_P025D - Información desactualizada",
+    ],
+    "EXP_P026": [
+        "EXP_P026A - Muy caro",
+        "EXP_P026B - No vale",
+        "EXP_P026C - Precio elevado",
+        "EXP_P026D - Servicio regular",
+    ],
+    "EXP_P027": [
+        "EXP_P027A - Mejor otros",
+        "EXP_P027B - No siempre",
+        "EXP_P027C - Baja oferta",
+        "EXP_P027D - Poca confianza",
+    ],
+    "EXP_P028": [
+        "EXP_P028A - Mala experiencia",
+        "EXP_P028B - Mejor otras",
+        "EXP_P028C - No recomendaría",
+        "EXP_P028D - Problemas generales",
+    ],
+}
+
+
+def subcodigo(opcion: str) -> str:
+    """Subcódigo de una subopción: ``"FIA_P001A - Explicación confusa"`` -> ``"FIA_P001A"``."""
+    return opcion.split(" - ", 1)[0].strip()
+
+
+def _congelar(mapa: dict) -> Mapping:
+    return MappingProxyType(dict(mapa))
+
+
+@dataclass(frozen=True, eq=False)
+class Catalogo:
+    """Catálogos inmutables con sus índices de búsqueda (O(1) por consulta).
+
+    Se compara e indexa por identidad, así que puede usarse como clave de
+    caché (``functools.lru_cache``, ``st.cache_data``...).
+    """
+
+    dimensiones: tuple[tuple[str, str], ...]
+    estados: tuple[str, ...]
+    responsables: tuple[str, ...]
+    sucursales: tuple[str, ...]
+    preguntas: Mapping[str, tuple[str, str]]
+    subopciones: Mapping[str, tuple[str, ...]]
+
+    codigos: tuple[str, ...] = field(init=False)
+    posicion: Mapping[str, int] = field(init=False)
+    nombres_dimension: tuple[str, ...] = field(init=False)
+    por_dimension: Mapping[str, tuple[str, ...]] = field(init=False)
+    corto_a_largo: Mapping[str, str] = field(init=False)
+    largo_a_corto: Mapping[str, str] = field(init=False)
+    subcodigo_padre: Mapping[str, str] = field(init=False)
+
+    @classmethod
+    def crear(
+        cls,
+        dimensiones,
+        estados,
+        responsables,
+        sucursales,
+        preguntas: Mapping[str, tuple[str, str]],
+        subopciones: Mapping[str, list[str]],
+    ) -> "Catalogo":
+        """Construye un catálogo congelado a partir de listas y dicts comunes."""
+        return cls(
+            dimensiones=tuple((str(c), str(n)) for c, n in dimensiones),
+            estados=tuple(estados),
+            responsables=tuple(responsables),
+            sucursales=tuple(sucursales),
+            preguntas=_congelar({c: (str(d), str(t)) for c, (d, t) in preguntas.items()}),
+            subopciones=_congelar({c: tuple(ops) for c, ops in subopciones.items()}),
+        )
+
+    def __post_init__(self) -> None:
+        definir = object.__setattr__.__get__(self)
+        codigos = tuple(self.preguntas)
+        definir("codigos", codigos)
+        definir("posicion", _congelar({c: i for i, c in enumerate(codigos)}))
+        definir("nombres_dimension", tuple(n for _, n in self.dimensiones))
+        definir("corto_a_largo", _congelar(dict(self.dimensiones)))
+        definir("largo_a_corto", _congelar({n: c for c, n in self.dimensiones}))
+
+        grupos: dict[str, list[str]] = {n: [] for n in self.nombres_dimension}
+        for codigo, (dim, _) in self.preguntas.items():
+            if dim not in grupos:
+                raise ValueError(f"La pregunta {codigo} usa una dimensión desconocida: {dim!r}")
+            grupos[dim].append(codigo)
+        definir("por_dimension", _congelar({d: tuple(cs) for d, cs in grupos.items()}))
+
+        padres = {}
+        for codigo, opciones in self.subopciones.items():
+            for opcion in opciones:
+                padres[subcodigo(opcion)] = codigo
+        definir("subcodigo_padre", _congelar(padres))
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def nombre_dimension(self, dimension: str) -> str:
+        """Nombre largo de *dimension* (acepta el código corto o el nombre largo)."""
+        return self.corto_a_largo.get(dimension, dimension)
+
+    def codigos_de(self, dimension: str) -> tuple[str, ...]:
+        """Códigos de pregunta de *dimension* (código corto o nombre largo)."""
+        return self.por_dimension.get(self.nombre_dimension(dimension), ())
+
+    def dimension_de(self, codigo: str) -> str:
+        return self.preguntas[codigo][0]
+
+    def texto_de(self, codigo: str) -> str:
+        return self.preguntas[codigo][1]
+
+    def subopciones_de(self, codigo: str) -> tuple[str, ...]:
+        return self.subopciones.get(codigo, ())
+
+    def pregunta_de_subcodigo(self, sub: str) -> str | None:
+        """Código de pregunta al que pertenece un subcódigo o una subopción completa."""
+        return self.subcodigo_padre.get(subcodigo(sub))
+
+    def datos(self) -> dict:
+        """Catálogo como tipos JSON (formato de :func:`cargar_catalogo`)."""
+        return {
+            "dimensiones": [list(d) for d in self.dimensiones],
+            "estados": list(self.estados),
+            "responsables": list(self.responsables),
+            "sucursales": list(self.sucursales),
+            "preguntas": {c: list(v) for c, v in self.preguntas.items()},
+            "subopciones": {c: list(v) for c, v in self.subopciones.items()},
+        }
+
+
+CATALOGO_INTEGRADO = Catalogo.crear(DIMENSIONES, ESTADOS, RESPONSABLES, SUCURSALES, PREGUNTAS, SUBOPCIONES)
+
+
+# -------------------------------------------------------------
+# Catálogos externos (JSON / Excel) con compilación en caché
+# -------------------------------------------------------------
+FORMATO_COMPILADO = 1
+_CLAVES = ("dimensiones", "estados", "responsables", "sucursales", "preguntas", "subopciones")
+
+
+class CatalogoInvalido(ValueError):
+    """El catálogo externo no pasó la validación; ``errores`` lista los problemas."""
+
+    def __init__(self, origen, errores: list[str]) -> None:
+        super().__init__(f"Catálogo inválido ({origen}): " + "; ".join(errores))
+        self.errores = errores
+
+
+# Encabezados aceptados en la hoja de preguntas (los mismos alias que
+# ``parseWorkbookToRows`` en la app React)
+_ALIAS = {
+    "codigo": {"codigo", "codigo pregunta", "cod p", "pregunta codigo"},
+    "pregunta": {"pregunta", "texto pregunta"},
+    "dimension": {"dimension"},
+    "subcodigo": {"subcodigo", "sub p", "codigo subpregunta", "subpregunta codigo", "cod sub"},
+    "subpregunta": {"subpregunta", "texto subpregunta", "categoria subpregunta"},
+}
+
+
+def _lista_hoja(hoja, patron: str) -> list[str]:
+    """Valores no vacíos de una hoja de catálogo (omite un encabezado con su nombre)."""
+    valores = []
+    for i, fila in enumerate(hoja.iter_rows(values_only=True)):
+        celdas = [str(v).strip() for v in fila if v is not None and str(v).strip()]
+        if i == 0 and celdas and re.fullmatch(rf"(?:{patron})\w*", normalizar(celdas[0])):
+            continue
+        valores.extend(celdas)
+    return valores
+
+
+def buscar_hoja(hojas, patron: str, defecto: str | None = None) -> str | None:
+    """Primera hoja cuyo nombre normalizado contiene *patron* (regex), como
+    ``pickSheet`` en la app React; si ninguna, *defecto*."""
+    return next((h for h in hojas if re.search(patron, normalizar(h))), defecto)
+
+
+def _leer_excel(path: Path) -> dict:
+    """Catálogo desde un libro: hojas de responsables, estados, sucursales,
+    dimensiones y preguntas (BD), localizadas por nombre como en la app React.
+    Las hojas que falten conservan el catálogo integrado."""
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as exc:
+        raise CatalogoInvalido(path, [f"el libro no se puede abrir ({exc})"]) from exc
+    try:
+        hojas = wb.sheetnames
+        datos: dict = {}
+        for clave, patron in (
+            ("responsables", r"respons"),
+            ("estados", r"estado"),
+            ("sucursales", r"sucursal|clinica|sede"),
+        ):
+            nombre = buscar_hoja(hojas, patron)
+            if nombre:
+                datos[clave] = _lista_hoja(wb[nombre], patron)
+
+        nombre = buscar_hoja(hojas, r"dimension")
+        if nombre:
+            dims = []
+            for fila in wb[nombre].iter_rows(values_only=True):
+                celdas = [str(v).strip() for v in fila[:2] if v is not None and str(v).strip()]
+                if len(celdas) == 2 and normalizar(celdas[0]) not in ("codigo", "clave"):
+                    dims.append(celdas)
+            datos["dimensiones"] = dims
+
+        nombre = buscar_hoja(hojas, r"bd|base|preg|servqual")
+        if nombre:
+            datos.update(_leer_preguntas(wb[nombre].iter_rows(values_only=True), datos.get("dimensiones", DIMENSIONES)))
+        return datos
+    finally:
+        wb.close()
+
+
+def _leer_preguntas(filas, dimensiones) -> dict:
+    """Preguntas y subopciones desde filas ``codigo | pregunta | [dimension] | subcodigo | subpregunta``."""
+    filas = iter(filas)
+    encabezado = [normalizar(c) for c in next(filas, ())]
+    columnas = {}
+    for campo, alias in _ALIAS.items():
+        columnas[campo] = next((i for i, c in enumerate(encabezado) if c in alias), None)
+    if columnas["codigo"] is None or columnas["pregunta"] is None:
+        return {}
+    corto_a_largo = dict((str(c), str(n)) for c, n in dimensiones)
+
+    def celda(fila, campo) -> str:
+        i = columnas[campo]
+        v = fila[i] if i is not None and i < len(fila) else None
+        return "" if v is None else str(v).strip()
+
+    preguntas: dict[str, list[str]] = {}
+    subopciones: dict[str, list[str]] = {}
+    for fila in filas:
+        codigo = celda(fila, "codigo")
+        if not codigo:
+            continue
+        if codigo not in preguntas:
+            dim = celda(fila, "dimension") or corto_a_largo.get(codigo.split("_", 1)[0], "")
+            preguntas[codigo] = [corto_a_largo.get(dim, dim), celda(fila, "pregunta")]
+        sub, texto = celda(fila, "subcodigo"), celda(fila, "subpregunta")
+        if sub or texto:
+            opcion = f"{sub} - {texto}" if sub and texto else (sub or texto)
+            if opcion not in subopciones.setdefault(codigo, []):
+                subopciones[codigo].append(opcion)
+    return {"preguntas": preguntas, "subopciones": subopciones}
+
+
+def validar_catalogo(datos: dict) -> list[str]:
+    """Problemas de un catálogo en tipos JSON (lista vacía = válido)."""
+    errores = []
+    for clave in ("estados", "responsables", "sucursales"):
+        valores = datos[clave]
+        if not isinstance(valores, list):
+            errores.append(f"'{clave}' debe ser una lista de textos")
+        elif not valores:
+            errores.append(f"'{clave}' está vacío")
+        elif any(not isinstance(v, str) or not v.strip() for v in valores):
+            errores.append(f"'{clave}' tiene valores vacíos o no textuales")
+        elif len(set(valores)) != len(valores):
+            errores.append(f"'{clave}' tiene valores repetidos")
+    dimensiones = datos["dimensiones"]
+    pares = [d for d in dimensiones if _textos(d) and len(d) == 2] if isinstance(dimensiones, list) else []
+    cortos = [d[0] for d in pares]
+    largos = [d[1] for d in pares]
+    if not isinstance(dimensiones, list) or not pares or len(pares) != len(dimensiones):
+        errores.append("'dimensiones' debe ser una lista de pares [código, nombre]")
+    if len(set(cortos)) != len(cortos) or len(set(largos)) != len(largos):
+        errores.append("'dimensiones' tiene códigos o nombres repetidos")
+    preguntas, subopciones = datos["preguntas"], datos["subopciones"]
+    if not isinstance(preguntas, dict) or not isinstance(subopciones, dict):
+        errores.append("'preguntas' y 'subopciones' deben ser objetos {código: lista}")
+        return errores
+    if not preguntas:
+        errores.append("'preguntas' está vacío")
+    for codigo, valor in preguntas.items():
+        if not _textos(valor) or len(valor) != 2 or not valor[1].strip():
+            errores.append(f"la pregunta {codigo} debe ser [dimensión, texto]")
+        elif valor[0] not in largos:
+            errores.append(f"la pregunta {codigo} usa una dimensión desconocida: {valor[0]!r}")
+    for codigo, opciones in subopciones.items():
+        if codigo not in preguntas:
+            errores.append(f"hay subopciones para una pregunta inexistente: {codigo}")
+        elif not _textos(opciones):
+            errores.append(f"las subopciones de {codigo} deben ser una lista de textos")
+    return errores
+
+
+def _textos(valor) -> bool:
+    return isinstance(valor, list) and all(isinstance(v, str) for v in valor)
+
+
+def _completar(datos: dict) -> dict:
+    """Rellena con el catálogo integrado las secciones que el archivo no trae."""
+    base = CATALOGO_INTEGRADO.datos()
+    if "preguntas" in datos and "subopciones" not in datos:
+        base["subopciones"] = {c: v for c, v in base["subopciones"].items() if c in datos["preguntas"]}
+    return {clave: datos.get(clave, base[clave]) for clave in _CLAVES}
+
+
+def _artefacto(path: Path, digest: str) -> Path:
+    return path.with_name(f".{path.name}.{digest[:16]}.catalogo.json")
+
+
+def cargar_catalogo(path, compilar: bool = True) -> Catalogo:
+    """Carga un catálogo externo (``.json``, ``.xlsx``/``.xlsm``).
+
+    El JSON usa las claves de :meth:`Catalogo.datos`; las que falten toman el
+    valor integrado. Con *compilar*, el resultado validado se guarda como
+    artefacto identificado por el SHA-256 del archivo: mientras el archivo no
+    cambie, las cargas siguientes leen el artefacto en lugar de reinterpretar
+    el libro (si no se puede escribir, se sigue sin él). Lanza
+    :class:`CatalogoInvalido` si el archivo no se puede interpretar (JSON o
+    libro dañado) o la validación falla.
+    """
+    import hashlib  # solo al cargar un catálogo externo (OpenSSL pesa al importar)
+
+    path = Path(path)
+    contenido = path.read_bytes()
+    digest = hashlib.sha256(contenido).hexdigest()
+    artefacto = _artefacto(path, digest)
+    if compilar:
+        try:
+            compilado = json.loads(artefacto.read_text(encoding="utf-8"))
+            if compilado.get("formato") == FORMATO_COMPILADO and compilado.get("sha256") == digest:
+                return Catalogo.crear(**compilado["datos"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # sin artefacto o inválido: se recompila
+
+    if path.suffix.lower() == ".json":
+        try:
+            datos = json.loads(contenido.decode("utf-8"))
+        except ValueError as exc:  # también UnicodeDecodeError
+            raise CatalogoInvalido(path, [f"JSON ilegible ({exc})"]) from exc
+        if not isinstance(datos, dict):
+            raise CatalogoInvalido(path, ["el JSON debe ser un objeto"])
+    elif path.suffix.lower() in (".xlsx", ".xlsm"):
+        datos = _leer_excel(path)
+    else:
+        raise ValueError(f"Formato de catálogo no admitido: {path.suffix!r}")
+    datos = _completar(datos)
+    errores = validar_catalogo(datos)
+    if errores:
+        raise CatalogoInvalido(path, errores)
+    catalogo = Catalogo.crear(**datos)
+
+    if compilar:
+        # El artefacto es un atajo: si no se puede escribir (carpeta de solo
+        # lectura, disco lleno) se usa el catálogo igual
+        tmp = artefacto.with_suffix(".tmp")
+        try:
+            for viejo in path.parent.glob(f".{path.name}.*.catalogo.json"):
+                viejo.unlink(missing_ok=True)
+            tmp.write_text(
+                json.dumps({"formato": FORMATO_COMPILADO, "sha256": digest, "datos": catalogo.datos()}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            os.replace(tmp, artefacto)
+        except OSError:
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+    return catalogo
+
+
+_vigente: dict = {}
+_avisos: dict = {}
+_vigente_lock = threading.Lock()
+
+
+def catalogo_vigente(path=None) -> Catalogo:
+    """Catálogo en uso: el de *path* (o ``SERVQUAL_CATALOGO``) o el integrado.
+
+    Se vuelve a cargar solo cuando cambia la fecha o el tamaño del archivo
+    (un ``stat`` por llamada), así una app en ejecución ve las listas nuevas
+    sin reiniciarse. Si el archivo falta o deja de ser válido se conserva el
+    último catálogo bueno (o el integrado, si nunca hubo uno) y se emite un
+    ``RuntimeWarning``, una vez por cambio del archivo; el motivo queda en
+    :func:`aviso_catalogo`.
+    """
+    path = path or os.environ.get("SERVQUAL_CATALOGO")
+    if not path:
+        return CATALOGO_INTEGRADO
+    path = Path(path)
+    try:
+        info = path.stat()
+        firma = (info.st_mtime_ns, info.st_size)
+    except OSError:
+        firma = None
+    with _vigente_lock:
+        actual = _vigente.get(path)
+        if actual is not None and actual[0] == firma:
+            return actual[1]
+        try:
+            if firma is None:
+                raise FileNotFoundError(f"no existe {path}")
+            catalogo = cargar_catalogo(path)
+        except (CatalogoInvalido, OSError, ValueError) as exc:
+            catalogo = CATALOGO_INTEGRADO if actual is None else actual[1]
+            usado = "el integrado" if actual is None else "el último válido"
+            _avisos[path] = f"No se pudo cargar el catálogo {path.name}: {exc}. Se usa {usado}."
+            warnings.warn(_avisos[path], RuntimeWarning, stacklevel=2)
+        else:
+            _avisos.pop(path, None)
+        _vigente[path] = (firma, catalogo)
+        return catalogo
+
+
+def aviso_catalogo(path=None) -> str | None:
+    """Por qué :func:`catalogo_vigente` no usa el archivo (``None`` si lo usa)."""
+    path = path or os.environ.get("SERVQUAL_CATALOGO")
+    return _avisos.get(Path(path)) if path else None
+
+
+CATALOGO = catalogo_vigente()
@@ -0,0 +1,416 @@
+"""
+Interfaz de línea de comandos para trabajos por lotes sobre la matriz.
+
+Las operaciones masivas de la app, sin Streamlit ni clics por dimensión::
+
+    python servqual_cli.py plan --dimensiones FIA EMP --responsable "Jefe de Clínica" --procesos 4
+    python servqual_cli.py plan --sucursales-archivo clinicas.txt --fecha 2025-07-01
+    python servqual_cli.py importar seguimiento.xlsx matriz_anterior.csv
+    python servqual_cli.py exportar salida/ --por-sucursal --estado Pendiente --formato xlsx
+    python servqual_cli.py eliminar --sucursal "CLÍNICA A" --dimension EMP --confirmar
+    python servqual_cli.py exportar demoras.csv --buscar "demora caja"
+    python servqual_cli.py compactar
+    python servqual_cli.py verificar
+    python servqual_cli.py resumenes resumenes/ --dias 7 --cada 60
+    python servqual_cli.py reportes reportes/ --procesos 8
+
+``resumenes`` deja un resumen Markdown de plazos (vencidas y por vencer) por
+responsable, sacado del índice de fechas límite sin recorrer la matriz; con
+``--cada`` se repite cada tantos minutos y solo reescribe los que cambiaron.
+
+``reportes`` deja el libro mensual de cada sucursal (resumen por dimensión,
+vencidas y filas): la matriz se particiona una sola vez en un archivo columnar
+temporal y cada proceso lee su rango mapeado en memoria.
+
+``--datos`` (por defecto ``SERVQUAL_DATAFILE``) elige la matriz; con
+``.db``/``.sqlite`` es el almacén SQLite.
+
+Los comandos por sucursal (``plan``, ``exportar --por-sucursal`` y
+``verificar``) y ``importar`` (un archivo por tarea) reparten las tareas en
+``--procesos`` procesos. Cada proceso abre su propio almacén y escribe con el
+bloqueo entre procesos del almacén (en SQLite, sus transacciones), así que las
+altas concurrentes no se pisan ni duplican un (Código, Sucursal). Ninguna tarea
+arma la matriz completa en el proceso principal: cada una filtra su sucursal
+por el índice y los libros se leen por bloques.
+
+Código de salida: 0 si todo salió bien; 1 si alguna tarea (o reporte) falló o ``verificar``
+encontró problemas.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+from typing import Callable
+
+import app_servqual_plan_accion as app
+
+FORMATOS = ("csv", "xlsx")
+MAX_DETALLE = 20
+
+
+# -------------------------------------------------------------
+# Tareas (se ejecutan en los procesos del pool)
+# -------------------------------------------------------------
+def _iniciar(datos: str) -> None:
+    """Inicializador de cada proceso: apunta la librería a la matriz *datos*."""
+    app.DATAFILE = Path(datos)
+
+
+def tarea_plan(sucursales: list[str], dimensiones: list[str], responsables, estado: str, fecha: date) -> int:
+    """Agrega las filas del plan de *sucursales* que aún no existen; devuelve cuántas."""
+    plan = app.construir_plan(dimensiones, sucursales, responsables, estado, fecha)
+    return len(app.agregar_plan(plan))
+
+
+def tarea_importar(ruta: str, estado: str | None) -> tuple[int, int]:
+    """Importa un CSV de la matriz o un libro de seguimiento: ``(leídas, agregadas)``."""
+    ruta = Path(ruta)
+    if ruta.suffix.lower() in (".xlsx", ".xlsm"):
+        return app.import_excel(ruta, estado)
+    df = app.servqual_store.import_csv(ruta, app.COLS, app.DTYPES)
+    return len(df), len(app.insert_rows(df[app.COLS], skip_duplicates=True))
+
+
+def tarea_exportar(filtros: dict, destino: str, formato: str) -> int:
+    """Escribe las filas que cumplen *filtros* en *destino*; devuelve cuántas."""
+    df = app.filter_data(**filtros)
+    if formato == "xlsx":
+        return app.servqual_export.export_xlsx(df, Path(destino), app.COLS)
+    app.servqual_store.export_csv(df, Path(destino), app.COLS)
+    return len(df)
+
+
+def tarea_verificar(sucursal: str) -> list[tuple[str, str, str]]:
+    """Problemas de integridad de las filas de *sucursal*: ``(sucursal, código, problema)``."""
+    return problemas(app.filter_data(sucursal=sucursal), app.catalogo_vigente())
+
+
+def problemas(df, cat) -> list[tuple[str, str, str]]:
+    """Reglas de integridad sobre un bloque de la matriz (vectorizadas)."""
+    codigo = df["Código"].astype(str)
+    sucursal = df["Sucursal"].astype(str)
+    dim_catalogo = codigo.map(lambda c: cat.preguntas.get(c, ("", ""))[0])
+    avance = app.pd.to_numeric(df["% Avance"], errors="coerce")
+    fecha = app.pd.to_datetime(df["Fecha seguimiento"].astype(str), errors="coerce")
+    reglas = {
+        "código fuera del catálogo": ~codigo.isin(list(cat.preguntas)),
+        "dimensión distinta a la del catálogo": (dim_catalogo != "") & (df["Dimensión"].astype(str) != dim_catalogo),
+        "estado fuera del catálogo": ~df["Estado"].astype(str).isin(list(cat.estados)),
+        "% avance fuera de 0-100": ~avance.between(0, 100),
+        "fecha de seguimiento inválida": fecha.isna(),
+        "sucursal vacía": sucursal.str.strip() == "",
+        "(Código, Sucursal) duplicado": df.duplicated(["Código", "Sucursal"], keep="first"),
+    }
+    encontrados = []
+    for nombre, mascara in reglas.items():
+        mascara = mascara.to_numpy(dtype=bool)
+        encontrados += [(s, c, nombre) for s, c in zip(sucursal[mascara], codigo[mascara])]
+    return encontrados
+
+
+# -------------------------------------------------------------
+# Reparto en procesos
+# -------------------------------------------------------------
+def repartir(
+    funcion: Callable,
+    tareas: list[tuple[str, tuple]],
+    datos: Path,
+    procesos: int,
+    log=None,
+) -> tuple[dict[str, object], dict[str, BaseException]]:
+    """Ejecuta ``funcion(*args)`` por cada ``(etiqueta, args)`` de *tareas*.
+
+    Con ``procesos > 1`` usa un pool de procesos *spawn* (no heredan
+    almacenes ni bloqueos abiertos del proceso principal). Devuelve
+    ``(resultados, errores)`` por etiqueta; una tarea que falla no detiene
+    a las demás. El avance por tarea va a *log* (por defecto, ``stderr``).
+    """
+    log = log or sys.stderr
+    resultados: dict[str, object] = {}
+    errores: dict[str, BaseException] = {}
+
+    def anotar(etiqueta: str, obtener: Callable[[], object]) -> None:
+        try:
+            resultados[etiqueta] = obtener()
+            print(f"{etiqueta}: {_texto(resultados[etiqueta])}", file=log)
+        except Exception as exc:  # se informa y sigue con las demás tareas
+            errores[etiqueta] = exc
+            print(f"{etiqueta}: ERROR {type(exc).__name__}: {exc}", file=log)
+
+    if procesos <= 1 or len(tareas) <= 1:
+        _iniciar(str(datos))
+        for etiqueta, args in tareas:
+            anotar(etiqueta, lambda: funcion(*args))
+        return resultados, errores
+
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(procesos, mp_context=contexto, initializer=_iniciar, initargs=(str(datos),)) as pool:
+        futuros = {pool.submit(funcion, *args): etiqueta for etiqueta, args in tareas}
+        for futuro in as_completed(futuros):
+            anotar(futuros[futuro], futuro.result)
+    return resultados, errores
+
+
+def _texto(resultado) -> str:
+    if isinstance(resultado, list):
+        return f"{len(resultado)} problema(s)"
+    if isinstance(resultado, tuple):
+        return "{} leídas, {} agregadas".format(*resultado)
+    return f"{resultado} fila(s)"
+
+
+def _lotes(valores: list[str], tamano: int) -> list[list[str]]:
+    tamano = max(1, tamano)
+    return [valores[i : i + tamano] for i in range(0, len(valores), tamano)]
+
+
+def _archivo_de(sucursal: str) -> str:
+    return app.servqual_reportes.nombre_archivo(sucursal)
+
+
+# -------------------------------------------------------------
+# Comandos
+# -------------------------------------------------------------
+def _responsables(valores: list[str] | None, dimensiones: list[str], cat) -> str | dict[str, str]:
+    """``--responsable X`` (todas las dimensiones) o ``DIM=X`` por dimensión."""
+    if not valores:
+        return cat.responsables[0]
+    if len(valores) == 1 and "=" not in valores[0]:
+        return valores[0]
+    if not all("=" in v for v in valores):
+        raise SystemExit("--responsable: un solo valor o pares DIMENSIÓN=RESPONSABLE")
+    por_dimension = {cat.nombre_dimension(d.strip()): r.strip() for d, r in (v.split("=", 1) for v in valores)}
+    faltan = [d for d in dimensiones if d not in por_dimension]
+    if faltan:
+        raise SystemExit(f"--responsable: falta el responsable de {', '.join(faltan)}")
+    return por_dimension
+
+
+def _sucursales(args, cat) -> list[str]:
+    sucursales = list(args.sucursales or [])
+    if args.sucursales_archivo:
+        texto = Path(args.sucursales_archivo).read_text(encoding="utf-8")
+        sucursales += [s.strip() for s in texto.splitlines() if s.strip()]
+    return list(dict.fromkeys(sucursales)) or list(cat.sucursales)
+
+
+def comando_plan(args) -> int:
+    cat = app.catalogo_vigente()
+    dimensiones = [cat.nombre_dimension(d) for d in args.dimensiones or cat.nombres_dimension]
+    desconocidas = [d for d in dimensiones if d not in cat.nombres_dimension]
+    if desconocidas:
+        raise SystemExit(f"Dimensiones desconocidas: {', '.join(desconocidas)}")
+    responsables = _responsables(args.responsable, dimensiones, cat)
+    estado = args.estado or cat.estados[0]
+    fecha = args.fecha or date.today()
+    tareas = [
+        (" + ".join(lote), (lote, dimensiones, responsables, estado, fecha))
+        for lote in _lotes(_sucursales(args, cat), args.lote)
+    ]
+    resultados, errores = repartir(tarea_plan, tareas, args.datos, args.procesos)
+    print(f"Plan: {sum(resultados.values())} fila(s) agregadas en {len(resultados)} tarea(s)")
+    return 1 if errores else 0
+
+
+def comando_importar(args) -> int:
+    tareas = [(str(r), (str(r), args.estado)) for r in args.archivos]
+    resultados, errores = repartir(tarea_importar, tareas, args.datos, args.procesos)
+    leidas = sum(r[0] for r in resultados.values())
+    agregadas = sum(r[1] for r in resultados.values())
+    print(f"Importación: {leidas} fila(s) leídas, {agregadas} agregadas, {len(errores)} archivo(s) con error")
+    return 1 if errores else 0
+
+
+def _filtros(args) -> dict:
+    from servqual_index import tokens
+
+    cat = app.catalogo_vigente()
+    return {
+        "dimension": cat.nombre_dimension(args.dimension) if args.dimension else None,
+        "responsable": args.responsable,
+        "estado": args.estado,
+        "sucursal": args.sucursal,
+        # sin palabras (p. ej. "¿?") la búsqueda no filtra: no cuenta como filtro
+        "q": args.buscar if args.buscar and tokens(args.buscar) else None,
+    }
+
+
+def comando_exportar(args) -> int:
+    filtros = _filtros(args)
+    destino = Path(args.destino)
+    if not args.por_sucursal:
+        formato = args.formato or ("xlsx" if destino.suffix.lower() == ".xlsx" else "csv")
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        resultados, errores = repartir(tarea_exportar, [(str(destino), (filtros, str(destino), formato))], args.datos, 1)
+    else:
+        formato = args.formato or "xlsx"
+        destino.mkdir(parents=True, exist_ok=True)
+        sucursales = [filtros["sucursal"]] if filtros["sucursal"] else _sucursales_con_datos()
+        tareas = [
+            (s, ({**filtros, "sucursal": s}, str(destino / f"{_archivo_de(s)}.{formato}"), formato))
+            for s in sucursales
+        ]
+        resultados, errores = repartir(tarea_exportar, tareas, args.datos, args.procesos)
+    print(f"Exportación: {sum(resultados.values())} fila(s) en {len(resultados)} archivo(s)")
+    return 1 if errores else 0
+
+
+def _sucursales_con_datos() -> list[str]:
+    """Sucursales presentes en la matriz, leídas del índice de filtros."""
+    return sorted(str(s) for s in app.filter_data()["Sucursal"].dropna().unique())
+
+
+def comando_verificar(args) -> int:
+    sucursales = [args.sucursal] if args.sucursal else _sucursales_con_datos()
+    resultados, errores = repartir(tarea_verificar, [(s, (s,)) for s in sucursales], args.datos, args.procesos)
+    encontrados = [p for lista in resultados.values() for p in lista]
+    for nombre, n in Counter(p[2] for p in encontrados).most_common():
+        print(f"{nombre}: {n}")
+    for sucursal, codigo, nombre in encontrados[: args.max_detalle]:
+        print(f"  {sucursal} / {codigo}: {nombre}")
+    print(f"Verificación: {len(encontrados)} problema(s) en {len(resultados)} sucursal(es)")
+    return 1 if encontrados or errores else 0
+
+
+def comando_eliminar(args) -> int:
+    filtros = _filtros(args)
+    if not any(filtros.values()) and not args.todo:
+        raise SystemExit("Indica al menos un filtro (o --todo para vaciar la matriz)")
+    ids = app.filter_data(**filtros)[app.servqual_store.ID_COL].tolist()
+    if not args.confirmar:
+        print(f"Se eliminarían {len(ids)} fila(s); repite con --confirmar para hacerlo")
+        return 0
+    print(f"Eliminadas: {app.delete_rows(ids)} fila(s)")
+    return 0
+
+
+def escribir_resumenes(destino: Path, dias: int, hoy: date | None = None) -> int:
+    """Un resumen de plazos por responsable (los del catálogo y los que tengan
+    acciones en la agenda) en ``<destino>/<responsable>.md``. Solo se reescriben
+    los que cambiaron; devuelve cuántos se escribieron."""
+    hoy = hoy or date.today()
+    agenda = app.agenda_plazos(dias=dias, hoy=hoy)
+    grupos = {str(r): g for r, g in agenda.groupby("Responsable", observed=True, sort=True)}
+    escritos = 0
+    for responsable in dict.fromkeys(list(app.catalogo_vigente().responsables) + list(grupos)):
+        texto = app.servqual_plazos.resumen_md(responsable, grupos.get(responsable, agenda.iloc[:0]), hoy, dias)
+        ruta = destino / f"{_archivo_de(responsable)}.md"
+        if ruta.exists() and ruta.read_text(encoding="utf-8") == texto:
+            continue
+        tmp = ruta.with_name(ruta.name + ".tmp")
+        tmp.write_text(texto, encoding="utf-8")
+        os.replace(tmp, ruta)
+        escritos += 1
+    return escritos
+
+
+def comando_resumenes(args) -> int:
+    destino = Path(args.destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    try:
+        while True:
+            escritos = escribir_resumenes(destino, args.dias)
+            print(f"Resúmenes: {escritos} archivo(s) actualizados en {destino}", flush=True)
+            if not args.cada:
+                return 0
+            time.sleep(args.cada * 60)
+    except KeyboardInterrupt:
+        return 0
+
+
+def comando_reportes(args) -> int:
+    archivos, errores = app.generar_reportes(args.destino, args.procesos, args.fecha, log=sys.stdout)
+    print(f"Reportes: {len(archivos)} libro(s) en {args.destino}" + (f", {len(errores)} con error" if errores else ""))
+    return 1 if errores else 0
+
+
+def comando_compactar(args) -> int:
+    app.compact_data()
+    print(f"Compactado: {args.datos}")
+    return 0
+
+
+# -------------------------------------------------------------
+# Argumentos
+# -------------------------------------------------------------
+def _agregar_filtros(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--dimension", help="código corto o nombre de la dimensión")
+    p.add_argument("--responsable")
+    p.add_argument("--estado")
+    p.add_argument("--sucursal")
+    p.add_argument("--buscar", help="palabras en código, pregunta, subproblema, causa o acción (sin tildes)")
+
+
+def parser() -> argparse.ArgumentParser:
+    raiz = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    raiz.add_argument("--datos", type=Path, default=app.DATAFILE, help="archivo de la matriz (SERVQUAL_DATAFILE)")
+    sub = raiz.add_subparsers(dest="comando", required=True)
+
+    def con_procesos(p: argparse.ArgumentParser) -> argparse.ArgumentParser:
+        p.add_argument("--procesos", type=int, default=1, help="procesos en paralelo (por defecto 1)")
+        return p
+
+    p = con_procesos(sub.add_parser("plan", help="alta masiva: dimensiones × sucursales"))
+    p.add_argument("--dimensiones", nargs="+", help="por defecto, todas")
+    p.add_argument("--sucursales", nargs="+", help="por defecto, las del catálogo")
+    p.add_argument("--sucursales-archivo", type=Path, help="una sucursal por línea")
+    p.add_argument("--responsable", nargs="+", help="un responsable, o DIMENSIÓN=RESPONSABLE")
+    p.add_argument("--estado")
+    p.add_argument("--fecha", type=date.fromisoformat, help="AAAA-MM-DD (por defecto, hoy)")
+    p.add_argument("--lote", type=int, default=1, help="sucursales por tarea")
+    p.set_defaults(func=comando_plan)
+
+    p = con_procesos(sub.add_parser("importar", help="CSV de la matriz o libros de seguimiento (.xlsx)"))
+    p.add_argument("archivos", nargs="+", type=Path)
+    p.add_argument("--estado", help="estado de las filas que no lo traen")
+    p.set_defaults(func=comando_importar)
+
+    p = con_procesos(sub.add_parser("exportar", help="vista filtrada a CSV/Excel"))
+    p.add_argument("destino", type=Path, help="archivo, o carpeta con --por-sucursal")
+    p.add_argument("--formato", choices=FORMATOS, help="por defecto, según la extensión (xlsx por sucursal)")
+    p.add_argument("--por-sucursal", action="store_true", help="un archivo por sucursal")
+    _agregar_filtros(p)
+    p.set_defaults(func=comando_exportar)
+
+    p = sub.add_parser("eliminar", help="baja de las filas que cumplen los filtros")
+    _agregar_filtros(p)
+    p.add_argument("--todo", action="store_true", help="permite eliminar sin filtros")
+    p.add_argument("--confirmar", action="store_true", help="sin esto solo informa cuántas filas")
+    p.set_defaults(func=comando_eliminar)
+
+    p = sub.add_parser("compactar", help="vuelca la bitácora a una instantánea nueva")
+    p.set_defaults(func=comando_compactar)
+
+    p = con_procesos(sub.add_parser("verificar", help="reglas de integridad por sucursal"))
+    p.add_argument("--sucursal")
+    p.add_argument("--max-detalle", type=int, default=MAX_DETALLE, help="problemas a listar")
+    p.set_defaults(func=comando_verificar)
+
+    p = sub.add_parser("resumenes", help="resumen de plazos por responsable (Markdown)")
+    p.add_argument("destino", type=Path, help="carpeta de los resúmenes")
+    p.add_argument("--dias", type=int, default=7, help="ventana de 'por vencer' (por defecto 7 días)")
+    p.add_argument("--cada", type=float, help="repetir cada tantos minutos (trabajo en segundo plano)")
+    p.set_defaults(func=comando_resumenes)
+
+    p = con_procesos(sub.add_parser("reportes", help="reporte mensual por sucursal (un .xlsx por sucursal)"))
+    p.add_argument("destino", type=Path, help="carpeta de los libros")
+    p.add_argument("--fecha", type=date.fromisoformat, help="AAAA-MM-DD: corte de vencidas y mes del nombre (por defecto, hoy)")
+    p.set_defaults(func=comando_reportes)
+    return raiz
+
+
+def main(argv=None) -> int:
+    args = parser().parse_args(argv)
+    app.DATAFILE = args.datos
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
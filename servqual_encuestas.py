@@ -0,0 +1,337 @@
+"""
+Ingesta de respuestas de encuestas SERVQUAL (CSV o Excel) por bloques.
+
+Los archivos de respuestas pueden tener miles de filas por sucursal y mes; se
+leen por bloques de ``chunk_rows`` (``pandas.read_csv(chunksize=...)`` o
+``openpyxl`` en modo de solo lectura) y cada bloque se reduce de inmediato a
+contadores por ``(Sucursal, Código)``, así que la memoria depende del número
+de sucursales × preguntas, no del tamaño del archivo.
+
+Formatos admitidos (se detectan por los encabezados):
+
+- **Ancho**: una fila por encuestado, una columna por pregunta. El encabezado
+  lleva el código (``FIA_P001``) o el texto completo de la pregunta. Columnas
+  opcionales ``E_FIA_P001`` (expectativa) y ``FIA_P001_SUB`` (subproblema
+  elegido).
+- **Largo**: una fila por respuesta, con columnas ``codigo``, ``respuesta`` y
+  opcionalmente ``expectativa`` y ``subcodigo``.
+
+En ambos hace falta una columna de sucursal (``sucursal``/``clínica``/``sede``).
+Una respuesta cuenta como insatisfecha si es numérica y no supera
+``max_insatisfecho`` (escala Likert) o si es un "No". Si hay expectativas se
+calcula además la brecha SERVQUAL media (percepción − expectativa).
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from servqual_catalog import Catalogo, subcodigo
+from servqual_texto import normalizar
+
+CHUNK_ROWS = 50_000
+RESULT_COLS = [
+    "Sucursal",
+    "Código",
+    "Dimensión",
+    "Respuestas",
+    "Insatisfechas",
+    "% Insatisfacción",
+    "Brecha media",
+    "Subproblema frecuente",
+]
+
+_CODIGO = re.compile(r"(?<![A-Z])([A-Z]{3}_P\d{3})([A-Z])?(?![A-Z0-9])", re.IGNORECASE)
+_SI = {"si", "sí", "s", "yes", "y", "true"}
+_NO = {"no", "n", "false"}
+
+
+@lru_cache(maxsize=4)
+def _mapas(cat: Catalogo) -> tuple[dict, dict, dict]:
+    """Texto normalizado -> código de pregunta / subcódigo, y nombre -> sucursal."""
+    por_texto = {normalizar(texto): codigo for codigo, (_, texto) in cat.preguntas.items()}
+    subs = {}  # (código, texto de la opción) -> subcódigo; el texto se repite entre preguntas
+    for codigo, opciones in cat.subopciones.items():
+        for opcion in opciones:
+            sc = subcodigo(opcion)
+            subs[(codigo, normalizar(opcion))] = sc
+            subs[(codigo, normalizar(opcion.split(" - ", 1)[-1]))] = sc
+    sucursales = {normalizar(s): s for s in cat.sucursales}
+    return por_texto, subs, sucursales
+
+
+# -------------------------------------------------------------
+# Lectura por bloques
+# -------------------------------------------------------------
+def leer_bloques(path, chunk_rows: int = CHUNK_ROWS, sheet: str | None = None) -> Iterator[pd.DataFrame]:
+    """Bloques de ``chunk_rows`` filas de un CSV o libro de Excel (celdas vacías = nulo)."""
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        yield from _bloques_excel(path, chunk_rows, sheet)
+        return
+    with open(path, encoding="utf-8-sig", errors="replace") as fh:
+        primera = fh.readline()
+    sep = max(",;\t", key=primera.count)  # exportaciones con coma, punto y coma o tabulador
+    yield from pd.read_csv(path, chunksize=chunk_rows, sep=sep, encoding="utf-8-sig")
+
+
+def _bloques_excel(path: Path, chunk_rows: int, sheet: str | None) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+        encabezado = [
+            str(c).strip() if c is not None else f"col{i}" for i, c in enumerate(next(filas, ()))
+        ]
+        ancho = len(encabezado)
+        bloque = []
+        for fila in filas:
+            bloque.append(fila[:ancho] + (None,) * (ancho - len(fila)))
+            if len(bloque) >= chunk_rows:
+                yield pd.DataFrame(bloque, columns=encabezado)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezado)
+    finally:
+        wb.close()
+
+
+# -------------------------------------------------------------
+# Formato: columnas -> (sucursal, código, valor, expectativa, subcódigo)
+# -------------------------------------------------------------
+class Formato:
+    """Interpretación de los encabezados de un archivo de respuestas."""
+
+    def __init__(self, columnas: list[str], cat: Catalogo) -> None:
+        por_texto, _, _ = _mapas(cat)
+        normal = {c: normalizar(c) for c in columnas}
+        self.sucursal = next(
+            (c for c, n in normal.items() if re.fullmatch(r"(sucursal|clinica|sede)\w*", n)), None
+        )
+        if self.sucursal is None:
+            raise ValueError("El archivo no tiene columna de sucursal (sucursal/clínica/sede)")
+        largo = {n: c for c, n in normal.items()}
+        self.largo = "codigo" in largo and "respuesta" in largo
+        self.percepcion: dict[str, str] = {}  # código -> columna
+        self.expectativa: dict[str, str] = {}
+        self.sub: dict[str, str] = {}
+        if self.largo:
+            self.cols_largo = {
+                k: largo.get(k) for k in ("codigo", "respuesta", "expectativa", "subcodigo")
+            }
+            return
+        for col, n in normal.items():
+            m = _CODIGO.search(col)
+            codigo = m.group(1).upper() if m else por_texto.get(n)
+            if codigo is None or codigo not in cat.preguntas:
+                continue
+            if n.startswith("e ") or n.endswith(" e"):
+                self.expectativa[codigo] = col
+            elif n.endswith(" sub") or "subproblema" in n or (m and m.group(2)):
+                self.sub[codigo] = col
+            else:
+                self.percepcion[codigo] = col
+        if not self.percepcion:
+            raise ValueError("No se reconoció ninguna columna de pregunta en el archivo")
+
+    def a_largo(self, bloque: pd.DataFrame, sucursal: np.ndarray) -> pd.DataFrame:
+        """Bloque en formato largo: ``sucursal, codigo, valor`` y, si el archivo
+        las trae, ``expectativa`` y ``subcodigo``. *sucursal* son los códigos
+        enteros de sucursal de cada fila del bloque; las filas sin código se
+        descartan."""
+        if self.largo:
+            c = self.cols_largo
+            # un bloque sin ningún código llega como columna float (todo NaN)
+            codigo = bloque[c["codigo"]].astype("string").str.strip().str.upper()
+            con_codigo = codigo.fillna("").ne("").to_numpy()
+            out = pd.DataFrame(
+                {
+                    "sucursal": sucursal[con_codigo],
+                    "codigo": codigo[con_codigo].to_numpy(dtype=object),
+                    "valor": bloque[c["respuesta"]].to_numpy()[con_codigo],
+                }
+            )
+            for col in ("expectativa", "subcodigo"):
+                if c[col]:
+                    out[col] = bloque[c[col]].to_numpy()[con_codigo]
+            return out
+        codigos = list(self.percepcion)
+        n = len(bloque)
+
+        def columnas(por_codigo: dict) -> np.ndarray:
+            vacio = np.full(n, "", dtype=object)
+            return np.concatenate(
+                [bloque[por_codigo[k]].to_numpy() if k in por_codigo else vacio for k in codigos]
+            )
+
+        out = pd.DataFrame(
+            {
+                "sucursal": np.tile(sucursal, len(codigos)),
+                "codigo": pd.Categorical.from_codes(
+                    np.repeat(np.arange(len(codigos)), n), categories=codigos
+                ),
+                "valor": columnas(self.percepcion),
+            }
+        )
+        if self.expectativa:
+            out["expectativa"] = columnas(self.expectativa)
+        if self.sub:
+            out["subcodigo"] = columnas(self.sub)
+        return out
+
+
+# -------------------------------------------------------------
+# Acumulación de brechas
+# -------------------------------------------------------------
+class AcumuladorBrechas:
+    """Contadores por ``(Sucursal, Código)``: respuestas, insatisfechas, brecha
+    y subproblemas mencionados. Memoria O(sucursales × preguntas)."""
+
+    def __init__(self, cat: Catalogo, max_insatisfecho: float = 2) -> None:
+        self.cat = cat
+        self.max_insatisfecho = max_insatisfecho
+        self.formato: Formato | None = None
+        self._n: Counter = Counter()
+        self._insat: Counter = Counter()
+        self._gap_suma: Counter = Counter()
+        self._gap_n: Counter = Counter()
+        self._subs: dict[tuple, Counter] = {}
+        self.filas_leidas = 0
+
+    def agregar(self, bloque: pd.DataFrame) -> None:
+        """Suma un bloque de respuestas (en el formato del archivo)."""
+        if self.formato is None:
+            self.formato = Formato(list(bloque.columns), self.cat)
+        self.filas_leidas += len(bloque)
+        _, subs, sucursales = _mapas(self.cat)
+        # Sucursal: se normaliza una vez por valor distinto y se trabaja con enteros
+        codigos_suc, nombres = pd.factorize(bloque[self.formato.sucursal].fillna("").astype(str))
+        nombres = [sucursales.get(normalizar(s), s.strip()) for s in nombres]
+        df = self.formato.a_largo(bloque, codigos_suc)
+        vacias = [i for i, s in enumerate(nombres) if not s]
+        df = df[df["codigo"].isin(self.cat.preguntas.keys()) & ~df["sucursal"].isin(vacias)]
+
+        valor = pd.to_numeric(df["valor"], errors="coerce")
+        texto = df["valor"][valor.isna()].astype(str).str.strip().str.lower()
+        si = texto.isin(_SI).reindex(df.index, fill_value=False)
+        no = texto.isin(_NO).reindex(df.index, fill_value=False)
+        valida = valor.notna() | si | no
+        insat = ((valor <= self.max_insatisfecho) | no) & valida
+        if "expectativa" in df:
+            brecha = valor - pd.to_numeric(df["expectativa"], errors="coerce")
+        else:
+            brecha = pd.Series(np.nan, index=df.index)
+
+        tabla = pd.DataFrame(
+            {
+                "sucursal": df["sucursal"],
+                "codigo": df["codigo"],
+                "n": valida.astype("int64"),
+                "insat": insat.astype("int64"),
+                "gap": brecha.fillna(0.0),
+                "gap_n": brecha.notna().astype("int64"),
+            }
+        )
+        sumas = tabla.groupby(["sucursal", "codigo"], sort=False, observed=True)[
+            ["n", "insat", "gap", "gap_n"]
+        ].sum()
+        for (s, c), (n, ins, gap, gap_n) in zip(sumas.index, sumas.to_numpy()):
+            clave = (nombres[s], c)
+            self._n[clave] += int(n)
+            self._insat[clave] += int(ins)
+            self._gap_suma[clave] += float(gap)
+            self._gap_n[clave] += int(gap_n)
+
+        if "subcodigo" not in df:
+            return
+        sub = df["subcodigo"]
+        con_sub = sub.notna() & (sub != "")
+        if con_sub.any():
+            elegidos = [
+                _subcodigo(str(v).strip(), c, subs)
+                for v, c in zip(sub[con_sub], df["codigo"][con_sub])
+            ]
+            cuenta = pd.DataFrame(
+                {
+                    "sucursal": df["sucursal"][con_sub].to_numpy(),
+                    "codigo": df["codigo"][con_sub].astype(str).to_numpy(),
+                    "sub": elegidos,
+                }
+            ).dropna().groupby(["sucursal", "codigo", "sub"], sort=False).size()
+            for (s, c, sc), n in cuenta.items():
+                if self.cat.subcodigo_padre.get(sc) == c:
+                    self._subs.setdefault((nombres[s], c), Counter())[sc] += int(n)
+
+    def resultado(self) -> pd.DataFrame:
+        """Indicadores por ``(Sucursal, Código)`` (columnas ``RESULT_COLS``)."""
+        filas = []
+        etiquetas = {subcodigo(o): o for ops in self.cat.subopciones.values() for o in ops}
+        for (suc, codigo), n in self._n.items():
+            if not n:
+                continue
+            gap_n = self._gap_n[(suc, codigo)]
+            subs = self._subs.get((suc, codigo))
+            frecuente = etiquetas.get(subs.most_common(1)[0][0], "") if subs else ""
+            filas.append(
+                (
+                    suc,
+                    codigo,
+                    self.cat.dimension_de(codigo),
+                    n,
+                    self._insat[(suc, codigo)],
+                    round(100 * self._insat[(suc, codigo)] / n, 1),
+                    round(self._gap_suma[(suc, codigo)] / gap_n, 2) if gap_n else np.nan,
+                    frecuente,
+                )
+            )
+        out = pd.DataFrame(filas, columns=RESULT_COLS)
+        orden = {c: i for i, c in enumerate(self.cat.codigos)}
+        return out.sort_values(["Sucursal", "Código"], key=lambda s: s.map(orden) if s.name == "Código" else s).reset_index(drop=True)
+
+
+def _subcodigo(valor: str, codigo: str, subs: dict) -> str | None:
+    """Subcódigo a partir de ``FIA_P001A``, ``FIA_P001A - texto`` o solo el texto
+    de la opción (este último se busca entre las opciones de *codigo*)."""
+    m = _CODIGO.search(valor)
+    if m and m.group(2):
+        return (m.group(1) + m.group(2)).upper()
+    return subs.get((codigo, normalizar(valor)))
+
+
+def criticas(
+    resultado: pd.DataFrame,
+    umbral: float = 30.0,
+    brecha_max: float | None = -1.0,
+    min_respuestas: int = 20,
+) -> pd.DataFrame:
+    """Filas de *resultado* que requieren plan de acción.
+
+    Una pregunta es crítica en una sucursal si tiene al menos
+    *min_respuestas* y su ``% Insatisfacción`` llega a *umbral* o su brecha
+    media es menor o igual a *brecha_max*.
+    """
+    alta = resultado["% Insatisfacción"] >= umbral
+    if brecha_max is not None:
+        alta |= resultado["Brecha media"] <= brecha_max
+    return resultado[alta & (resultado["Respuestas"] >= min_respuestas)].reset_index(drop=True)
+
+
+def analizar(path, cat: Catalogo, chunk_rows: int = CHUNK_ROWS, max_insatisfecho: float = 2, progress=None) -> AcumuladorBrechas:
+    """Lee *path* por bloques y devuelve el acumulador con los indicadores.
+
+    *progress*, si se indica, recibe las filas leídas después de cada bloque.
+    """
+    acumulador = AcumuladorBrechas(cat, max_insatisfecho)
+    for bloque in leer_bloques(path, chunk_rows):
+        acumulador.agregar(bloque)
+        if progress is not None:
+            progress(acumulador.filas_leidas)
+    return acumulador
@@ -0,0 +1,171 @@
+"""
+Exportación de la matriz a Excel (``.xlsx``) en modo *streaming*.
+
+El libro se escribe con ``openpyxl`` en modo de solo escritura
+(``Workbook(write_only=True)``): las filas se vuelcan por bloques de
+``chunk_rows`` a un archivo temporal de ``openpyxl`` y nunca se arma en memoria
+la hoja completa ni una copia en texto de la matriz. Solo se convierten a
+objetos Python las filas del bloque en curso.
+
+El resultado se comprime a un destino con tope de tamaño (``max_bytes``): si el
+archivo lo supera se interrumpe la escritura con :class:`ExportTooLarge`, sin
+haber llegado a retener más de ``max_bytes`` en memoria.
+"""
+from __future__ import annotations
+
+import io
+from datetime import date
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 5000
+MAX_BYTES = 50 * 1024 * 1024
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ExportTooLarge(ValueError):
+    """El archivo exportado supera el tope de bytes permitido."""
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(f"La exportación supera el máximo de {max_bytes:,} bytes")
+        self.max_bytes = max_bytes
+
+
+class _CappedBuffer(io.BytesIO):
+    """``BytesIO`` que rechaza crecer por encima de *max_bytes*."""
+
+    def __init__(self, max_bytes: int | None) -> None:
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    def write(self, data) -> int:
+        if self.max_bytes is not None and self.tell() + len(data) > self.max_bytes:
+            raise ExportTooLarge(self.max_bytes)
+        return super().write(data)
+
+
+def _python_column(s: pd.Series) -> np.ndarray:
+    """Columna como arreglo de objetos Python aptos para ``openpyxl`` (nulos -> ``None``)."""
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        fechas = s.dt.date.astype(object)
+        return fechas.where(s.notna(), None).to_numpy()
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return s.astype(object).to_numpy()
+    out = s.astype(object)
+    return out.where(out.notna(), None).to_numpy()
+
+
+def iter_rows(df: pd.DataFrame, columns: list[str], chunk_rows: int = CHUNK_ROWS) -> Iterator[list[tuple]]:
+    """Filas de *df* (solo *columns*) en bloques de tuplas, sin convertir todo de una vez."""
+    for inicio in range(0, len(df), chunk_rows):
+        bloque = df.iloc[inicio : inicio + chunk_rows]
+        valores = [_python_column(bloque[c]) for c in columns]
+        yield list(zip(*valores))
+
+
+def _hoja(
+    wb,
+    df: pd.DataFrame,
+    columns: list[str],
+    sheet: str,
+    chunk_rows: int = CHUNK_ROWS,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Agrega a *wb* (de solo escritura) una hoja con *df*, por bloques."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    ws = wb.create_sheet(title=sheet)
+    ws.freeze_panes = "A2"
+    negrita = Font(bold=True)
+    encabezado = []
+    for col in columns:
+        celda = WriteOnlyCell(ws, value=col)
+        celda.font = negrita
+        encabezado.append(celda)
+    ws.append(encabezado)
+
+    total = len(df)
+    escritas = 0
+    if progress is not None:
+        progress(0, total)
+    for filas in iter_rows(df, columns, chunk_rows):
+        for fila in filas:
+            ws.append(fila)
+        escritas += len(filas)
+        if progress is not None:
+            progress(escritas, total)
+    return escritas
+
+
+def _guardar(wb, dest) -> None:
+    try:
+        wb.save(dest)
+    except BaseException:
+        for ws in wb.worksheets:
+            if not ws.closed:  # cierra el temporal de openpyxl si se abortó a medias
+                ws.close()
+        raise
+
+
+def write_xlsx(
+    df: pd.DataFrame,
+    dest,
+    columns: list[str],
+    sheet: str = "Plan de acción",
+    chunk_rows: int = CHUNK_ROWS,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Escribe *df* como ``.xlsx`` en *dest* (ruta o archivo binario).
+
+    *progress*, si se indica, recibe ``(filas_escritas, total)`` después de cada
+    bloque. Devuelve el número de filas escritas.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    escritas = _hoja(wb, df, columns, sheet, chunk_rows, progress)
+    _guardar(wb, dest)
+    return escritas
+
+
+def write_workbook(hojas: list[tuple[str, pd.DataFrame, list[str]]], dest, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Libro con varias hojas ``(título, df, columnas)``, todas por bloques.
+
+    Devuelve el total de filas escritas.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    escritas = sum(_hoja(wb, df, columns, titulo, chunk_rows) for titulo, df, columns in hojas)
+    _guardar(wb, dest)
+    return escritas
+
+
+def to_xlsx_bytes(
+    df: pd.DataFrame,
+    columns: list[str],
+    max_bytes: int | None = MAX_BYTES,
+    **kwargs,
+) -> bytes:
+    """Contenido ``.xlsx`` de *df* como ``bytes`` (para descargas).
+
+    Lanza :class:`ExportTooLarge` si el archivo pasaría de *max_bytes*
+    (``None`` = sin tope). El resto de argumentos van a :func:`write_xlsx`.
+    """
+    buf = _CappedBuffer(max_bytes)
+    write_xlsx(df, buf, columns, **kwargs)
+    return buf.getvalue()
+
+
+def export_file_name(prefix: str = "PlanAccion_SERVQUAL", when: date | None = None) -> str:
+    """Nombre sugerido para la descarga, p. ej. ``PlanAccion_SERVQUAL_2024-05-01.xlsx``."""
+    return f"{prefix}_{when or date.today()}.xlsx"
+
+
+def export_xlsx(df: pd.DataFrame, path: Path, columns: list[str], **kwargs) -> int:
+    """Exporta *df* a la ruta *path* (sin tope de tamaño); devuelve las filas escritas."""
+    return write_xlsx(df, Path(path), columns, **kwargs)
@@ -0,0 +1,473 @@
+"""
+Historial de cambios de la matriz (auditoría) y reconstrucción "a la fecha".
+
+Con ``historial=True`` el almacén registra cada alta, edición y baja como
+deltas ``(ts, _id, op, columna, antes, despues, usuario)`` en
+``<archivo>.historia/``:
+
+- ``deltas.jsonl``: la cola activa, un delta por línea (anexar es barato).
+  Una edición es un delta por columna que cambió; un alta o una baja es un
+  delta por fila, con la fila completa en ``despues`` o en ``antes``.
+- ``deltas-000001.sqcol``, ...: cuando la cola pasa de ``MAX_COLA`` bytes se
+  vuelca a un segmento columnar (``servqual_snapshot``: ``op``, ``columna`` y
+  ``usuario`` como categorías, los valores como texto JSON con diccionario),
+  con el rango de fechas en los metadatos.
+- ``corte-000000.sqcol``, ...: la matriz completa a una fecha. El corte 0 es
+  la matriz al activar el historial; después se escribe uno cada
+  ``CORTE_CADA`` segmentos.
+
+:meth:`Historial.a_la_fecha` parte del último corte anterior a la fecha y
+aplica solo los deltas posteriores, leyendo únicamente los segmentos cuyo
+rango la alcanza. :meth:`Historial.serie` avanza un estado de pocas columnas
+de una fecha a la siguiente para calcular el avance por sucursal en el tiempo
+sin armar cada versión de la matriz.
+
+Las escrituras toman un bloqueo entre procesos (``<archivo>.historia/lock``).
+Si un volcado se interrumpe entre escribir el segmento y vaciar la cola, los
+deltas quedan repetidos, lo que no cambia ninguna reconstrucción: aplicar dos
+veces el mismo delta da lo mismo.
+
+El usuario de cada delta es el de :func:`como_usuario` / :func:`fijar_usuario`
+(la app lo fija por sesión); si no, ``SERVQUAL_USUARIO`` o el del sistema.
+"""
+from __future__ import annotations
+
+import getpass
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from datetime import time as hora
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from servqual_snapshot import (
+    coerce_column,
+    coerce_frame,
+    concat_typed,
+    read_columnar,
+    read_header,
+    write_columnar,
+)
+from servqual_store import ID_COL, _fsync_dir, _json_default, _limpiar, bloqueo_archivo
+
+DELTA_COLS = ["ts", ID_COL, "op", "columna", "antes", "despues", "usuario"]
+DELTA_DTYPES = {
+    "ts": "int",  # milisegundos desde 1970 (UTC)
+    ID_COL: "int",
+    "op": "category",  # ins | upd | del
+    "columna": "category",  # "" en altas y bajas
+    "antes": "text",  # JSON
+    "despues": "text",  # JSON
+    "usuario": "category",
+}
+
+_USUARIO: ContextVar[str | None] = ContextVar("servqual_usuario", default=None)
+
+
+def usuario_actual() -> str:
+    """Usuario que firma los cambios de este contexto."""
+    usuario = _USUARIO.get() or os.environ.get("SERVQUAL_USUARIO")
+    if usuario:
+        return usuario
+    try:
+        return getpass.getuser()
+    except Exception:  # pragma: no cover - sin usuario de sistema
+        return "desconocido"
+
+
+def fijar_usuario(nombre: str | None) -> None:
+    """Firma con *nombre* los cambios de este contexto (p. ej. una sesión)."""
+    _USUARIO.set(nombre or None)
+
+
+@contextmanager
+def como_usuario(nombre: str | None):
+    """Firma con *nombre* los cambios hechos dentro del bloque."""
+    token = _USUARIO.set(nombre or None)
+    try:
+        yield
+    finally:
+        _USUARIO.reset(token)
+
+
+def a_ms(momento=None, fin_del_dia: bool = True) -> int:
+    """Milisegundos desde 1970 de *momento* (``None`` = ahora).
+
+    Una fecha sin hora (``date`` o ``"2025-07-01"``) cuenta hasta el final de
+    ese día (o desde su comienzo, sin *fin_del_dia*); las horas sin zona son
+    locales.
+    """
+    if momento is None:
+        return int(time.time() * 1000)
+    if isinstance(momento, str):
+        ts = pd.Timestamp(momento)
+        momento = ts.date() if len(momento.strip()) <= 10 else ts.to_pydatetime()
+    elif isinstance(momento, pd.Timestamp):
+        momento = momento.to_pydatetime()
+    if isinstance(momento, datetime):
+        return int(momento.timestamp() * 1000)
+    if isinstance(momento, date):
+        return int(datetime.combine(momento, hora.max if fin_del_dia else hora.min).timestamp() * 1000)
+    raise TypeError(f"Fecha no válida: {momento!r}")
+
+
+def _fecha_local(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def _json(valor) -> str | None:
+    """Valor como texto JSON (``None`` si es nulo)."""
+    valor = _limpiar({"v": valor})["v"]
+    if valor is None:
+        return None
+    return json.dumps(valor, ensure_ascii=False, default=_json_default)
+
+
+def _iguales(a, b) -> bool:
+    return _json(a) == _json(b)
+
+
+class Historial:
+    """Bitácora de deltas en segmentos columnares + cortes de la matriz.
+
+    *path* es el archivo de la matriz; *columns* y *dtypes* los del almacén,
+    que se usan para tipar las matrices reconstruidas.
+    """
+
+    MAX_COLA = 4 * 1024 * 1024  # bytes de la cola activa antes de volcarla
+    CORTE_CADA = 10  # segmentos entre cortes
+
+    def __init__(self, path: Path, columns: list[str], dtypes: dict[str, str], fsync: bool = True) -> None:
+        path = Path(path)
+        self.dir = path.with_name(path.name + ".historia")
+        self.cola = self.dir / "deltas.jsonl"
+        self.lockfile = self.dir / "lock"
+        self.columns = list(columns)
+        self.dtypes = {**dtypes, ID_COL: "int"}
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._bloqueado = False  # este proceso ya tiene el bloqueo de archivo
+        self._ultimo = 0  # último ts emitido: monótono aunque el reloj retroceda
+
+    # ---------------------------------------------------------
+    # Archivos
+    # ---------------------------------------------------------
+    def _archivos(self, prefijo: str) -> list[Path]:
+        return sorted(self.dir.glob(f"{prefijo}-*.sqcol"))
+
+    @staticmethod
+    def _numero(path: Path) -> int:
+        return int(path.stem.split("-")[1])
+
+    def _escribir(self, df: pd.DataFrame, path: Path, dtypes: dict, meta: dict) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        write_columnar(df, tmp, dtypes, meta=meta, fsync=self.fsync)
+        os.replace(tmp, path)
+        if self.fsync:
+            _fsync_dir(self.dir)
+
+    @contextmanager
+    def _escritura(self):
+        """Exclusión entre hilos y procesos (reentrante: ``volcar`` corre dentro de ``_anexar``)."""
+        with self._lock:
+            if self._bloqueado:
+                yield
+                return
+            with bloqueo_archivo(self.lockfile):
+                self._bloqueado = True
+                try:
+                    yield
+                finally:
+                    self._bloqueado = False
+
+    @property
+    def iniciado(self) -> bool:
+        return (self.dir / "corte-000000.sqcol").exists()
+
+    @property
+    def inicio(self) -> datetime | None:
+        """Fecha (local) desde la que hay historial (``None`` si aún no empezó)."""
+        if not self.iniciado:
+            return None
+        return _fecha_local(read_header(self.dir / "corte-000000.sqcol")[0]["meta"]["ts"])
+
+    def iniciar(self, df: pd.DataFrame) -> None:
+        """Escribe el corte 0 (la matriz *df*, con ``_id``) si aún no existe."""
+        with self._escritura():
+            if self.iniciado:
+                return
+            self.dir.mkdir(parents=True, exist_ok=True)
+            base = df.reindex(columns=[ID_COL] + self.columns)
+            self._escribir(base, self.dir / "corte-000000.sqcol", self.dtypes, {"ts": a_ms(), "segmentos": 0})
+
+    # ---------------------------------------------------------
+    # Registro
+    # ---------------------------------------------------------
+    def _anexar(self, deltas: Iterable[tuple]) -> None:
+        """Anexa ``(_id, op, columna, antes, despues)`` (valores ya en JSON)."""
+        with self._escritura():
+            ts = self._ultimo = max(a_ms(), self._ultimo)
+            usuario = usuario_actual()
+            payload = "".join(
+                json.dumps([ts, rid, op, col, antes, despues, usuario], ensure_ascii=False) + "\n"
+                for rid, op, col, antes, despues in deltas
+            ).encode("utf-8")
+            if not payload:
+                return
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.cola, "a+b") as fh:
+                fh.seek(0, os.SEEK_END)
+                if fh.tell():
+                    fh.seek(-1, os.SEEK_END)
+                    if fh.read(1) != b"\n":  # cola cortada: se descarta esa línea
+                        payload = b"\n" + payload
+                fh.write(payload)
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+                tamano = fh.tell()
+            if tamano > self.MAX_COLA:
+                self.volcar()
+
+    def _de_filas(self, rows: pd.DataFrame, op: str) -> Iterator[tuple]:
+        """Deltas de filas completas que entran (``ins``) o salen (``del``)."""
+        for r in rows.reindex(columns=[ID_COL] + self.columns).to_dict("records"):
+            rid = int(r.pop(ID_COL))
+            valores = _json(r)
+            yield (rid, op, "", None, valores) if op == "ins" else (rid, op, "", valores, None)
+
+    @staticmethod
+    def _de_edicion(row_id: int, antes: dict, despues: dict) -> Iterator[tuple]:
+        return (
+            (int(row_id), "upd", col, _json(antes.get(col)), _json(valor))
+            for col, valor in despues.items()
+            if not _iguales(antes.get(col), valor)
+        )
+
+    def altas(self, rows: pd.DataFrame) -> None:
+        """Registra filas nuevas (*rows* con ``_id``)."""
+        self._anexar(self._de_filas(rows, "ins"))
+
+    def ediciones(self, row_id: int, antes: dict, despues: dict) -> None:
+        """Registra los valores de una fila que cambiaron (*antes* -> *despues*)."""
+        self._anexar(self._de_edicion(row_id, antes, despues))
+
+    def bajas(self, rows: pd.DataFrame) -> None:
+        """Registra filas eliminadas (*rows* con ``_id`` y sus valores)."""
+        self._anexar(self._de_filas(rows, "del"))
+
+    def lote(self, bajas: pd.DataFrame, ediciones: Iterable[tuple[int, dict, dict]], altas: pd.DataFrame) -> None:
+        """Registra un guardado completo con una sola escritura a la cola:
+        *bajas* y *altas* como en :meth:`bajas`/:meth:`altas` y *ediciones*
+        como ``(_id, antes, después)``."""
+        self._anexar(itertools.chain(
+            self._de_filas(bajas, "del"),
+            itertools.chain.from_iterable(self._de_edicion(*e) for e in ediciones),
+            self._de_filas(altas, "ins"),
+        ))
+
+    # ---------------------------------------------------------
+    # Segmentos y cortes
+    # ---------------------------------------------------------
+    def _leer_cola(self) -> pd.DataFrame:
+        filas = []
+        if self.cola.exists():
+            for linea in self.cola.read_bytes().split(b"\n"):
+                if not linea.strip():
+                    continue
+                try:
+                    filas.append(json.loads(linea))
+                except ValueError:  # línea cortada
+                    continue
+        df = pd.DataFrame(filas, columns=DELTA_COLS)
+        return coerce_frame(df, DELTA_DTYPES)
+
+    def volcar(self) -> None:
+        """Pasa la cola activa a un segmento columnar (y escribe un corte si toca)."""
+        with self._escritura():
+            cola = self._leer_cola()
+            if cola.empty:
+                return
+            segmentos = self._archivos("deltas")
+            n = self._numero(segmentos[-1]) + 1 if segmentos else 1
+            meta = {"desde": int(cola["ts"].min()), "hasta": int(cola["ts"].max()), "deltas": len(cola)}
+            self._escribir(cola, self.dir / f"deltas-{n:06d}.sqcol", DELTA_DTYPES, meta)
+            tmp = self.cola.with_name(self.cola.name + ".tmp")
+            tmp.write_bytes(b"")
+            os.replace(tmp, self.cola)
+            if n % self.CORTE_CADA == 0:
+                estado = self._reconstruir(meta["hasta"], hasta_segmento=n)
+                self._escribir(estado, self.dir / f"corte-{n:06d}.sqcol", self.dtypes, {"ts": meta["hasta"], "segmentos": n})
+
+    def _deltas(
+        self,
+        despues_de_segmento: int,
+        hasta: int,
+        desde: int | None = None,
+        hasta_segmento: int | None = None,
+        cache: dict | None = None,
+    ) -> pd.DataFrame:
+        """Deltas con ``desde < ts <= hasta`` de los segmentos posteriores a
+        *despues_de_segmento* (y de la cola, salvo con *hasta_segmento*)."""
+        partes = []
+        for path in self._archivos("deltas"):
+            n = self._numero(path)
+            if n <= despues_de_segmento or (hasta_segmento is not None and n > hasta_segmento):
+                continue
+            meta = read_header(path)[0]["meta"]
+            if meta["desde"] > hasta or (desde is not None and meta["hasta"] <= desde):
+                continue
+            if cache is not None and path in cache:
+                partes.append(cache[path])
+                continue
+            df = read_columnar(path)[0]
+            if cache is not None:
+                cache[path] = df
+            partes.append(df)
+        if hasta_segmento is None:
+            partes.append(self._leer_cola())
+        partes = [p for p in partes if len(p)]
+        if not partes:
+            return coerce_frame(pd.DataFrame(columns=DELTA_COLS), DELTA_DTYPES)
+        d = pd.concat([p.astype({"op": object, "columna": object, "usuario": object}) for p in partes], ignore_index=True)
+        ts = d["ts"].to_numpy()
+        dentro = ts <= hasta
+        if desde is not None:
+            dentro &= ts > desde
+        return d[dentro].reset_index(drop=True)
+
+    def _corte(self, t: int) -> tuple[pd.DataFrame, dict]:
+        """Último corte con fecha <= *t*."""
+        elegido = None
+        for path in self._archivos("corte"):
+            meta = read_header(path)[0]["meta"]
+            if meta["ts"] <= t:
+                elegido = path
+        if elegido is None:
+            if not self.iniciado:
+                raise ValueError("El historial está vacío")
+            raise ValueError(f"El historial empieza el {self.inicio:%Y-%m-%d %H:%M:%S}")
+        return read_columnar(elegido)
+
+    def _reconstruir(
+        self, t: int, columnas: list[str] | None = None, hasta_segmento: int | None = None, cache: dict | None = None
+    ) -> pd.DataFrame:
+        base, meta = self._corte(t)
+        if columnas is not None:
+            base = base[[ID_COL] + columnas]
+        d = self._deltas(meta["segmentos"], t, hasta_segmento=hasta_segmento, cache=cache)
+        return self._aplicar(base, d)
+
+    def _aplicar(self, estado: pd.DataFrame, d: pd.DataFrame) -> pd.DataFrame:
+        """Aplica deltas (en orden) a *estado*. Los ``_id`` no se reutilizan, así
+        que basta con: altas, luego la última edición por fila y columna, luego bajas."""
+        if d.empty:
+            return estado
+        op = d["op"].to_numpy()
+        altas = d[op == "ins"].drop_duplicates(ID_COL, keep="last")
+        if len(altas):
+            nuevas = pd.DataFrame([json.loads(x) for x in altas["despues"]], index=range(len(altas)))
+            nuevas.insert(0, ID_COL, altas[ID_COL].to_numpy())
+            nuevas = nuevas.reindex(columns=estado.columns)
+            nuevas = nuevas[~nuevas[ID_COL].isin(estado[ID_COL])]
+            estado = concat_typed(estado, coerce_frame(nuevas, self.dtypes))
+        ediciones = d[(op == "upd") & d["columna"].isin(estado.columns).to_numpy()]
+        if len(ediciones):
+            ultimas = ediciones.drop_duplicates([ID_COL, "columna"], keep="last")
+            posiciones = pd.Index(estado[ID_COL]).get_indexer(ultimas[ID_COL])
+            estado = estado.copy(deep=False)
+            for col, grupo in ultimas.groupby("columna", sort=False):
+                pos = posiciones[(ultimas["columna"] == col).to_numpy()]
+                ok = pos >= 0
+                valores = [None if v is None or v != v else json.loads(v) for v in grupo["despues"]]
+                columna = estado[col].astype(object).to_numpy(copy=True)
+                columna[pos[ok]] = np.asarray(valores, dtype=object)[ok]
+                estado[col] = coerce_column(pd.Series(columna, index=estado.index), self.dtypes.get(col, "text"))
+        bajas = d.loc[op == "del", ID_COL]
+        if len(bajas):
+            estado = estado[~estado[ID_COL].isin(bajas)]
+        if not estado[ID_COL].is_monotonic_increasing:
+            estado = estado.sort_values(ID_COL, kind="stable")
+        return estado.reset_index(drop=True)
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def a_la_fecha(self, momento=None, columnas: list[str] | None = None) -> pd.DataFrame:
+        """La matriz (con ``_id``) tal como estaba en *momento* (ver :func:`a_ms`)."""
+        with self._lock:
+            return self._reconstruir(a_ms(momento), columnas)
+
+    def cambios(
+        self, ids: Iterable[int] | None = None, desde=None, hasta=None, columnas: list[str] | None = None
+    ) -> pd.DataFrame:
+        """Deltas (con ``ts`` como fecha y valores decodificados) para auditar.
+
+        *ids* y *columnas* filtran filas y columnas; *columnas* conserva las
+        altas y bajas (que afectan a todas).
+        """
+        with self._lock:
+            # "desde" incluye su primer milisegundo (el filtro es ts > desde)
+            d = self._deltas(-1, a_ms(hasta), desde=a_ms(desde, fin_del_dia=False) - 1 if desde is not None else None)
+        if ids is not None:
+            d = d[d[ID_COL].isin(list(ids))]
+        if columnas is not None:
+            d = d[(d["op"] != "upd") | d["columna"].isin(columnas)]
+        d = d.reset_index(drop=True)
+        for col in ("antes", "despues"):
+            d[col] = [None if v is None or v != v else json.loads(v) for v in d[col]]
+        d["ts"] = pd.to_datetime(d["ts"].map(_fecha_local))
+        return d
+
+    def serie(
+        self,
+        fechas: Iterable,
+        por: Iterable[str] = ("Sucursal",),
+        avance: str = "% Avance",
+        estado: str = "Estado",
+    ) -> pd.DataFrame:
+        """Avance en el tiempo: una fila por fecha y grupo *por* con ``Filas``,
+        ``Avance medio`` y el conteo de filas por cada valor de *estado*. Las
+        fechas anteriores al inicio del historial se omiten.
+
+        Solo se reconstruye la primera fecha (y solo las columnas necesarias);
+        las siguientes aplican a ese estado los deltas entre una y otra.
+        """
+        inicio = a_ms(self.inicio) if self.iniciado else None
+        fechas = sorted((f for f in fechas if inicio is not None and a_ms(f) >= inicio), key=a_ms)
+        por = list(por)
+        columnas = list(dict.fromkeys(por + [avance, estado]))
+        if not fechas:
+            return pd.DataFrame(columns=["Fecha"] + por + ["Filas", "Avance medio"])
+        cache: dict = {}
+        partes = []
+        with self._lock:
+            previo = a_ms(fechas[0])
+            actual = self._reconstruir(previo, columnas, cache=cache)
+            for i, fecha in enumerate(fechas):
+                t = a_ms(fecha)
+                if i:
+                    d = self._deltas(0, t, desde=previo, cache=cache)
+                    actual = self._aplicar(actual, d[(d["op"] != "upd") | d["columna"].isin(columnas)])
+                    previo = t
+                partes.append(_resumen(actual, por, avance, estado).assign(Fecha=fecha))
+        out = pd.concat(partes, ignore_index=True)
+        cuentas = [c for c in out.columns if c not in ["Fecha"] + por + ["Filas", "Avance medio"]]
+        out[cuentas] = out[cuentas].fillna(0).astype("int64")
+        return out[["Fecha"] + por + ["Filas", "Avance medio"] + cuentas]
+
+
+def _resumen(df: pd.DataFrame, por: list[str], avance: str, estado: str) -> pd.DataFrame:
+    grupos = df.groupby(por, observed=True, dropna=False)
+    out = pd.DataFrame({"Filas": grupos.size(), "Avance medio": grupos[avance].mean().round(1)})
+    conteos = df.groupby(por + [estado], observed=True, dropna=False).size().unstack(fill_value=0)
+    conteos.columns = [str(c) for c in conteos.columns]
+    return out.join(conteos).reset_index()
@@ -0,0 +1,413 @@
+"""
+Índice de filtros por columna para la matriz SERVQUAL.
+
+Para cada columna indexada (Dimensión, Responsable, Estado, Sucursal) se guarda
+un mapa ``valor -> posiciones`` con las posiciones de fila en un arreglo NumPy
+ordenado. Una combinación de filtros se resuelve intersectando los arreglos,
+empezando por el más corto y buscando sus elementos con ``searchsorted`` en los
+demás: el costo es O(k log m), con *k* el tamaño del filtro más selectivo, y no
+depende del total de filas.
+
+El índice se mantiene de forma incremental (altas al final, ediciones y bajas);
+quien lo posee (``servqual_store.JournalStore``) es responsable de notificarle
+cada cambio sobre el DataFrame que indexa.
+
+:class:`TextIndex` es la búsqueda libre sobre las columnas de texto: cada
+valor distinto se tokeniza **una vez** (sin tildes ni mayúsculas, ver
+:func:`tokens`) en un vocabulario ``palabra -> valores``, y cada fila guarda
+el código de su valor por columna. Una consulta busca sus palabras como
+prefijo en el vocabulario ordenado y marca las filas con una tabla booleana
+indexada por código, solo sobre las filas que ya dejaron los filtros.
+"""
+from __future__ import annotations
+
+import bisect
+from array import array
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from servqual_texto import SEPARADOR, normalizar
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _group_positions(s: pd.Series, offset: int = 0) -> dict:
+    """Agrupa posiciones (``offset + i``) por valor; omite los valores nulos."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s.astype(object), use_na_sentinel=True)
+    if not len(uniques):
+        return {}
+    order = np.argsort(codes, kind="stable")
+    cuentas = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    inicio = int((codes < 0).sum())  # los nulos (-1) quedan al principio
+    grupos = {}
+    for valor, n in zip(uniques, cuentas):
+        if n:
+            grupos[valor] = order[inicio : inicio + n].astype(np.int64) + offset
+        inicio += n
+    return grupos
+
+
+def intersect_sorted(arrays: list[np.ndarray]) -> np.ndarray:
+    """Intersección de arreglos ordenados (sin duplicados), del más corto al más largo."""
+    if not arrays:
+        return _EMPTY
+    arrays = sorted(arrays, key=len)
+    out = arrays[0]
+    for other in arrays[1:]:
+        if not len(out) or not len(other):
+            return _EMPTY
+        idx = np.searchsorted(other, out)
+        idx[idx == len(other)] = len(other) - 1
+        out = out[other[idx] == out]
+    return out
+
+
+class FilterIndex:
+    """Mapa ``columna -> valor -> posiciones ordenadas`` sobre un DataFrame."""
+
+    def __init__(self, columns: Iterable[str]) -> None:
+        self.columns = list(columns)
+        self._pos: dict[str, dict] = {c: {} for c in self.columns}
+        self.size = 0
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: Iterable[str]) -> "FilterIndex":
+        """Construye el índice completo (O(N log N)) a partir de *df*."""
+        idx = cls(columns)
+        for col in idx.columns:
+            idx._pos[col] = _group_positions(df[col])
+        idx.size = len(df)
+        return idx
+
+    # ---------------------------------------------------------
+    # Mantenimiento incremental
+    # ---------------------------------------------------------
+    def append(self, rows: pd.DataFrame) -> None:
+        """Registra *rows* como filas agregadas al final del DataFrame."""
+        for col in self.columns:
+            mapa = self._pos[col]
+            for valor, pos in _group_positions(rows[col], self.size).items():
+                actual = mapa.get(valor)
+                mapa[valor] = pos if actual is None else np.concatenate([actual, pos])
+        self.size += len(rows)
+
+    def update(self, position: int, col: str, old, new) -> None:
+        """Mueve *position* del valor *old* al valor *new* en la columna *col*."""
+        if col not in self._pos:
+            return
+        old = None if pd.isna(old) else old
+        new = None if pd.isna(new) else new
+        if old == new:
+            return
+        mapa = self._pos[col]
+        if old is not None and old in mapa:
+            arr = mapa[old]
+            i = np.searchsorted(arr, position)
+            if i < len(arr) and arr[i] == position:
+                arr = np.delete(arr, i)
+                if len(arr):
+                    mapa[old] = arr
+                else:
+                    del mapa[old]
+        if new is not None:
+            arr = mapa.get(new, _EMPTY)
+            mapa[new] = np.insert(arr, np.searchsorted(arr, position), position)
+
+    def discard(self, positions: np.ndarray, rows: pd.DataFrame) -> None:
+        """Quita *positions* sin recorrer las demás (filas marcadas como borradas).
+
+        *rows* son los datos de esas filas (alineados con *positions*): solo se
+        tocan los arreglos de los valores que tenían.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        for col in self.columns:
+            mapa = self._pos[col]
+            for valor, idx in _group_positions(rows[col].reset_index(drop=True)).items():
+                arr = mapa.get(valor)
+                if arr is None:
+                    continue
+                quitar = np.sort(positions[idx])
+                i = np.searchsorted(arr, quitar)
+                i = i[(i < len(arr)) & (arr[np.minimum(i, len(arr) - 1)] == quitar)]
+                arr = np.delete(arr, i)
+                if len(arr):
+                    mapa[valor] = arr
+                else:
+                    del mapa[valor]
+
+    def remove(self, positions: np.ndarray) -> None:
+        """Quita *positions* y recorre las posteriores (como ``reset_index``)."""
+        borradas = np.unique(np.asarray(positions, dtype=np.int64))
+        if not len(borradas):
+            return
+        for col in self.columns:
+            mapa = self._pos[col]
+            for valor in list(mapa):
+                arr = mapa[valor]
+                arr = arr[~np.isin(arr, borradas, assume_unique=True)]
+                if len(arr):
+                    mapa[valor] = arr - np.searchsorted(borradas, arr)
+                else:
+                    del mapa[valor]
+        self.size -= len(borradas)
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def values(self, col: str) -> list:
+        """Valores presentes en *col*."""
+        return list(self._pos[col])
+
+    def count(self, col: str, value) -> int:
+        """Número de filas con *value* en *col* (O(1))."""
+        return len(self._pos[col].get(value, _EMPTY))
+
+    def lookup(self, filters: dict) -> np.ndarray | None:
+        """Posiciones que cumplen todos los *filters* (``columna -> valor``).
+
+        Los valores ``None`` no filtran. Devuelve ``None`` si no hay ningún
+        filtro activo (es decir, todas las filas).
+        """
+        activos = {c: v for c, v in filters.items() if v is not None}
+        if not activos:
+            return None
+        arrays = []
+        for col, valor in activos.items():
+            if col not in self._pos:
+                raise KeyError(f"Columna no indexada: {col!r}")
+            arrays.append(self._pos[col].get(valor, _EMPTY))
+        return intersect_sorted(arrays)
+
+
+def _key_part(value) -> str:
+    return "" if value is None or pd.isna(value) else str(value)
+
+
+class KeyIndex:
+    """Índice único ``(col1, col2, ...) -> _id`` sobre una tabla hash (dict).
+
+    Consultar o registrar una clave es O(1); el índice completo se construye
+    en O(N) a partir de la instantánea. Los valores nulos cuentan como ``""``.
+    """
+
+    def __init__(self, columns: Iterable[str]) -> None:
+        self.columns = list(columns)
+        self._ids: dict[tuple, int] = {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: Iterable[str], id_col: str) -> "KeyIndex":
+        idx = cls(columns)
+        idx._ids = dict(zip(idx.keys(df), df[id_col].tolist()))
+        return idx
+
+    def keys(self, df: pd.DataFrame) -> list[tuple]:
+        """Claves de cada fila de *df*, normalizadas a texto."""
+        partes = [df[c].astype(object).where(df[c].notna(), "").astype(str).tolist() for c in self.columns]
+        return list(zip(*partes))
+
+    def key(self, row: dict) -> tuple:
+        return tuple(_key_part(row.get(c)) for c in self.columns)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._ids
+
+    def get(self, key: tuple) -> int | None:
+        return self._ids.get(key)
+
+    def contains(self, keys: list[tuple]) -> np.ndarray:
+        """Máscara booleana: qué *keys* ya existen (O(1) por clave)."""
+        ids = self._ids
+        return np.fromiter((k in ids for k in keys), dtype=bool, count=len(keys))
+
+    def add(self, keys: list[tuple], ids) -> None:
+        self._ids.update(zip(keys, (int(i) for i in ids)))
+
+    def discard(self, keys: list[tuple]) -> None:
+        for k in keys:
+            self._ids.pop(k, None)
+
+
+def tokens(texto) -> list[str]:
+    """Palabras de *texto* sin tildes ni mayúsculas (``"EMPATÍA"`` -> ``["empatia"]``)."""
+    if not isinstance(texto, str):
+        texto = "" if texto is None or pd.isna(texto) else str(texto)
+    return normalizar(texto.replace(SEPARADOR, " ")).split()
+
+
+def _tokens_lote(valores: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Como :func:`tokens` sobre muchos valores a la vez: (palabras, índice del
+    valor de cada palabra). Se normaliza un solo texto unido por separadores."""
+    unido = f" {SEPARADOR} ".join(v.replace(SEPARADOR, " ") for v in valores)
+    palabras = np.array(normalizar(unido).split(), dtype=object)
+    separa = palabras == SEPARADOR
+    de_valor = np.cumsum(separa)
+    return palabras[~separa], de_valor[~separa]
+
+
+class TextIndex:
+    """Búsqueda por palabras (prefijos) sobre columnas de texto de un DataFrame.
+
+    Por columna: ``valor -> código`` (el código 0 es el texto vacío, que no
+    tiene palabras; las filas borradas también pasan a 0) y un arreglo con el
+    código de cada fila. Las palabras de los valores registrados en bloque
+    (carga, importaciones) quedan en segmentos ordenados: palabras únicas en
+    orden, cortes y códigos contiguos, de modo que un prefijo es un rango de
+    ``searchsorted`` y una rebanada. Los valores sueltos (ediciones) van a un
+    vocabulario ``palabra -> {columna: códigos}`` pequeño. Ninguno se reduce:
+    los valores que dejan de usarse no marcan ninguna fila.
+    """
+
+    MIN_SEGMENTO = 256  # valores nuevos desde los que se arma un segmento
+    MAX_SEGMENTOS = 4  # por columna; al superarlo se funden en uno
+
+    def __init__(self, columns: Iterable[str]) -> None:
+        self.columns = list(columns)
+        self._codigos: dict[str, dict] = {c: {"": 0} for c in self.columns}
+        self._filas: dict[str, np.ndarray] = {c: np.zeros(0, dtype=np.int32) for c in self.columns}
+        # columna -> [(palabras ordenadas, cortes, códigos)]
+        self._segmentos: dict[str, list[tuple[np.ndarray, np.ndarray, np.ndarray]]] = {
+            c: [] for c in self.columns
+        }
+        self._vocab: dict[str, dict[str, array]] = {}
+        self._orden: list[str] = []  # claves de _vocab ordenadas (búsqueda por prefijo)
+        self._nuevas = 0  # palabras agregadas al final de _orden sin ordenar
+        self.size = 0
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: Iterable[str]) -> "TextIndex":
+        idx = cls(columns)
+        idx.append(df)
+        return idx
+
+    def _registrar(self, col: str, valores: list[str]) -> None:
+        """Da código a los *valores* nuevos de *col* y agrega sus palabras al índice."""
+        codigos = self._codigos[col]
+        base = len(codigos)
+        codigos.update(zip(valores, range(base, base + len(valores))))
+        palabras, de_valor = _tokens_lote(valores)
+        if not len(palabras):
+            return
+        de_valor = (de_valor + base).astype(np.int32)
+        if len(valores) < self.MIN_SEGMENTO:
+            for palabra, codigo in zip(palabras.tolist(), de_valor.tolist()):
+                por_columna = self._vocab.get(palabra)
+                if por_columna is None:
+                    por_columna = self._vocab[palabra] = {}
+                    self._orden.append(palabra)
+                    self._nuevas += 1
+                codigos_palabra = por_columna.get(col)
+                if codigos_palabra is None:
+                    codigos_palabra = por_columna[col] = array("i")
+                codigos_palabra.append(codigo)
+            return
+        segmentos = self._segmentos[col]
+        segmentos.append(_segmento(palabras, de_valor))
+        if len(segmentos) > self.MAX_SEGMENTOS:
+            todas = np.concatenate([np.repeat(p, np.diff(c)) for p, c, _ in segmentos])
+            self._segmentos[col] = [_segmento(todas, np.concatenate([v for _, _, v in segmentos]))]
+
+    def _codigo(self, col: str, valor) -> int:
+        """Código de *valor* en *col*; si es nuevo, lo tokeniza y lo registra."""
+        if not isinstance(valor, str):
+            valor = "" if valor is None or pd.isna(valor) else str(valor)
+        codigo = self._codigos[col].get(valor)
+        if codigo is None:
+            self._registrar(col, [valor])
+            codigo = self._codigos[col][valor]
+        return codigo
+
+    def _codigos_de(self, col: str, s: pd.Series) -> np.ndarray:
+        """Código de cada fila de *s* (se tokeniza cada valor distinto una vez)."""
+        if not len(s):
+            return np.zeros(0, dtype=np.int32)
+        posiciones, distintos = pd.factorize(s.astype(object).where(s.notna(), ""))
+        distintos = [v if isinstance(v, str) else str(v) for v in distintos]
+        codigos = self._codigos[col]
+        nuevos = [v for v in distintos if v not in codigos]
+        if nuevos:
+            self._registrar(col, nuevos)
+        tabla = np.fromiter(map(codigos.__getitem__, distintos), dtype=np.int32, count=len(distintos))
+        return tabla[posiciones]
+
+    # ---------------------------------------------------------
+    # Mantenimiento incremental (mismas llamadas que FilterIndex)
+    # ---------------------------------------------------------
+    def append(self, rows: pd.DataFrame) -> None:
+        for col in self.columns:
+            self._filas[col] = np.concatenate([self._filas[col], self._codigos_de(col, rows[col])])
+        self.size += len(rows)
+
+    def update(self, position: int, col: str, old, new) -> None:
+        if col in self._filas:
+            self._filas[col][position] = self._codigo(col, new)
+
+    def discard(self, positions: np.ndarray, rows: pd.DataFrame | None = None) -> None:
+        for col in self.columns:
+            self._filas[col][np.asarray(positions, dtype=np.int64)] = 0
+
+    def remove(self, positions: np.ndarray) -> None:
+        borradas = np.unique(np.asarray(positions, dtype=np.int64))
+        for col in self.columns:
+            self._filas[col] = np.delete(self._filas[col], borradas)
+        self.size -= len(borradas)
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def _prefijo(self, palabra: str) -> dict[str, list[np.ndarray]]:
+        """Códigos por columna de los valores con alguna palabra que empieza con *palabra*."""
+        partes: dict[str, list[np.ndarray]] = {}
+        # "{" sigue a "z" en ASCII: [palabra, palabra + "{") son sus extensiones
+        for col, segmentos in self._segmentos.items():
+            for palabras, cortes, codigos in segmentos:
+                a, b = np.searchsorted(palabras, [palabra, palabra + "{"])
+                if a < b:
+                    partes.setdefault(col, []).append(codigos[cortes[a]:cortes[b]])
+        if self._nuevas:
+            self._orden.sort()  # Timsort: casi lineal sobre lo ya ordenado + la cola nueva
+            self._nuevas = 0
+        i = bisect.bisect_left(self._orden, palabra)
+        while i < len(self._orden) and self._orden[i].startswith(palabra):
+            for col, codigos in self._vocab[self._orden[i]].items():
+                partes.setdefault(col, []).append(np.frombuffer(codigos, dtype=np.int32))
+            i += 1
+        return partes
+
+    def search(self, q: str, positions: np.ndarray | None = None) -> np.ndarray | None:
+        """Posiciones (de *positions*, o de todas) con **todas** las palabras de *q*
+        como prefijo de alguna palabra de las columnas. ``None`` si *q* no tiene
+        palabras (no filtra)."""
+        palabras = tokens(q)
+        if not palabras:
+            return None
+        pos = np.arange(self.size, dtype=np.int64) if positions is None else np.asarray(positions, dtype=np.int64)
+        # las palabras más largas suelen ser las más selectivas: van primero
+        for palabra in sorted(set(palabras), key=len, reverse=True):
+            if not len(pos):
+                break
+            cumple = np.zeros(len(pos), dtype=bool)
+            for col, partes in self._prefijo(palabra).items():
+                tabla = np.zeros(len(self._codigos[col]), dtype=bool)
+                for codigos in partes:
+                    tabla[codigos] = True
+                cumple |= tabla[self._filas[col][pos]]
+            pos = pos[cumple]
+        return pos
+
+
+def _segmento(palabras: np.ndarray, codigos: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Agrupa las parejas (palabra, código): palabras únicas ordenadas, cortes
+    (los códigos de ``unicas[i]`` son ``codigos[cortes[i]:cortes[i + 1]]``) y códigos."""
+    ids, unicas = pd.factorize(palabras, sort=True)
+    orden = np.argsort(ids, kind="stable")
+    cortes = np.zeros(len(unicas) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=len(unicas)), out=cortes[1:])
+    return np.asarray(unicas, dtype=object), cortes, codigos[orden]
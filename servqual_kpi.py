@@ -0,0 +1,173 @@
+"""
+Indicadores (KPI) de avance de la matriz, mantenidos de forma incremental.
+
+En lugar de un ``groupby`` sobre toda la matriz en cada consulta, el almacén
+mantiene *celdas* de conteo: para cada combinación de
+``grupos`` (Sucursal × Dimensión × Responsable) × Estado × Fecha seguimiento
+guarda ``[filas, suma de % Avance]``. Cada alta, edición o baja suma o resta
+una fila en una o dos celdas (O(1), independiente del tamaño de la matriz):
+
+- ``JournalStore`` las guarda en memoria (:class:`KpiCells`).
+- ``SQLiteStore`` las guarda en la tabla ``_kpi``, mantenida por *triggers*
+  (así también cuentan las escrituras de otros procesos).
+
+Las celdas son pocas frente a las filas, así que :func:`resumen` agrega a
+cualquier nivel (por sucursal, por dimensión...) y calcula filas por estado,
+avance medio y vencidas al día de la consulta sin recorrer la matriz: una fila
+vence si su fecha de seguimiento ya pasó y su estado no está en ``cerrados``.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+FECHA = "fecha"
+FILAS = "filas"
+SUMA = "suma"
+
+
+@dataclass(frozen=True)
+class KpiSpec:
+    """Columnas que usan los indicadores."""
+
+    grupos: tuple[str, ...] = ("Sucursal", "Dimensión", "Responsable")
+    estado: str = "Estado"
+    avance: str = "% Avance"
+    fecha: str = "Fecha seguimiento"
+    cerrados: tuple[str, ...] = ("Completado",)
+
+    @property
+    def claves(self) -> tuple[str, ...]:
+        return self.grupos + (self.estado,)
+
+    @property
+    def columnas(self) -> tuple[str, ...]:
+        return self.claves + (self.avance, self.fecha)
+
+
+def _dia(value) -> int | None:
+    """Fecha como número de día (``None`` si está vacía)."""
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    ts = pd.Timestamp(value)
+    return None if pd.isna(ts) else int(ts.value // 86_400_000_000_000)
+
+
+def _clave_valor(value):
+    return None if value is None or (not isinstance(value, str) and pd.isna(value)) else value
+
+
+class KpiCells:
+    """Celdas ``(grupos..., estado, día) -> [filas, suma_avance]`` en memoria."""
+
+    def __init__(self, spec: KpiSpec) -> None:
+        self.spec = spec
+        self._celdas: dict[tuple, list] = {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, spec: KpiSpec) -> "KpiCells":
+        """Construye las celdas con un único ``groupby`` (O(N))."""
+        kpi = cls(spec)
+        kpi.add_frame(df)
+        return kpi
+
+    def add_frame(self, df: pd.DataFrame, sign: int = 1) -> None:
+        """Suma (``sign=1``) o resta (``sign=-1``) las filas de *df*."""
+        if df.empty:
+            return
+        spec = self.spec
+        claves = {c: df[c].astype(object).where(df[c].notna(), None) for c in spec.claves}
+        fechas = pd.to_datetime(df[spec.fecha], errors="coerce")
+        dias = (fechas.to_numpy(dtype="datetime64[D]").astype("int64")).astype(object)
+        dias[fechas.isna().to_numpy()] = None
+        tabla = pd.DataFrame({**claves, FECHA: dias})
+        tabla[SUMA] = pd.to_numeric(df[spec.avance], errors="coerce").fillna(0).to_numpy()
+        grupos = tabla.groupby(list(spec.claves) + [FECHA], dropna=False, sort=False)[SUMA]
+        agregado = grupos.agg(["size", "sum"])
+        for clave, (n, suma) in zip(agregado.index, agregado.to_numpy()):
+            clave = tuple(_clave_valor(v) for v in clave)
+            self._sumar(clave, sign * int(n), sign * float(suma))
+
+    def add_row(self, row: dict, sign: int = 1) -> None:
+        """Versión de una fila de :meth:`add_frame` (sin pandas; O(1))."""
+        spec = self.spec
+        clave = tuple(_clave_valor(row.get(c)) for c in spec.claves) + (_dia(row.get(spec.fecha)),)
+        avance = row.get(spec.avance)
+        avance = 0.0 if avance is None or pd.isna(avance) else float(avance)
+        self._sumar(clave, sign, sign * avance)
+
+    def _sumar(self, clave: tuple, n: int, suma: float) -> None:
+        celda = self._celdas.get(clave)
+        if celda is None:
+            self._celdas[clave] = [n, suma]
+            return
+        celda[0] += n
+        celda[1] += suma
+        if celda[0] == 0:
+            del self._celdas[clave]
+
+    def __len__(self) -> int:
+        return len(self._celdas)
+
+    def frame(self) -> pd.DataFrame:
+        """Celdas como DataFrame (columnas ``claves + fecha + filas + suma``)."""
+        cols = list(self.spec.claves) + [FECHA, FILAS, SUMA]
+        if not self._celdas:
+            return celdas_vacias(self.spec)
+        filas = [clave + (n, suma) for clave, (n, suma) in self._celdas.items()]
+        df = pd.DataFrame(filas, columns=cols)
+        dias = pd.to_numeric(df[FECHA], errors="coerce")
+        df[FECHA] = pd.to_datetime(dias, unit="D")
+        return df
+
+
+def celdas_vacias(spec: KpiSpec) -> pd.DataFrame:
+    cols = list(spec.claves) + [FECHA, FILAS, SUMA]
+    df = pd.DataFrame(columns=cols)
+    df[FECHA] = pd.to_datetime(df[FECHA])
+    return df
+
+
+def resumen(
+    celdas: pd.DataFrame,
+    spec: KpiSpec,
+    por: list[str] | tuple[str, ...] = (),
+    hoy: date | None = None,
+    estados: list[str] | tuple[str, ...] = (),
+) -> pd.DataFrame:
+    """Indicadores agregados por las columnas *por* (subconjunto de ``spec.grupos``).
+
+    Columnas: ``Filas``, una por estado (``estados`` fija cuáles y su orden),
+    ``% Completado``, ``Avance medio`` (ponderado por filas) y ``Vencidas``.
+    Con *por* vacío devuelve una sola fila con el total.
+    """
+    hoy = pd.Timestamp(hoy or date.today())
+    claves = list(por) or ["_todo"]
+    cerrada = celdas[spec.estado].isin(spec.cerrados).to_numpy()
+    vencida = (celdas[FECHA].notna() & (celdas[FECHA] < hoy)).to_numpy() & ~cerrada
+    base = celdas.assign(
+        _todo="Total",
+        _cerradas=np.where(cerrada, celdas[FILAS], 0),
+        _vencidas=np.where(vencida, celdas[FILAS], 0),
+    )
+    totales = base.groupby(claves, dropna=False)[[FILAS, SUMA, "_cerradas", "_vencidas"]].sum()
+    if not por and totales.empty:
+        totales.loc["Total"] = 0
+    por_estado = base.groupby(claves + [spec.estado], dropna=False)[FILAS].sum().unstack(spec.estado)
+    columnas_estado = list(estados) or sorted(c for c in por_estado.columns if isinstance(c, str))
+    por_estado = por_estado.reindex(index=totales.index, columns=columnas_estado).fillna(0)
+
+    filas = totales[FILAS].astype("int64")
+    con_filas = filas.where(filas > 0)
+    out = pd.DataFrame({"Filas": filas}, index=totales.index)
+    out[columnas_estado] = por_estado.astype("int64")
+    out["% Completado"] = (100 * totales["_cerradas"] / con_filas).round(1)
+    out["Avance medio"] = (totales[SUMA] / con_filas).round(1)
+    out["Vencidas"] = totales["_vencidas"].astype("int64")
+    if not por:
+        out.index.name = None
+        return out
+    return out.reset_index()
@@ -0,0 +1,138 @@
+"""
+Importación de la matriz desde un libro de Excel (equivalente a
+``parseWorkbookToRows`` de la app React), por bloques.
+
+La hoja de datos se localiza por nombre (``bd``/``base``/``preg``/``servqual``;
+si ninguna, la primera) y se recorre con ``openpyxl`` en modo de solo lectura:
+nunca se arma la hoja completa ni un dict por fila. Los encabezados se
+resuelven **una vez por hoja** a columnas de la matriz (``ALIAS``, con las
+mismas variantes que acepta la app React) y cada bloque de ``chunk_rows``
+filas se normaliza de forma vectorizada:
+
+- Código en mayúsculas; Dimensión y Pregunta del catálogo si faltan.
+- Subproblema = ``"<subcódigo> - <subpregunta>"`` (o la opción del catálogo
+  si solo viene el subcódigo).
+- Estado vacío -> *estado*; % Avance numérico entre 0 y 100.
+- Si la hoja trae la columna ``activa``, solo se importan las filas activas.
+
+Las hojas de responsables, estados y sucursales son catálogo: se cargan con
+``SERVQUAL_CATALOGO`` (ver ``servqual_catalog``).
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+import servqual_texto
+from servqual_catalog import Catalogo, buscar_hoja, subcodigo
+
+CHUNK_ROWS = 20_000
+HOJA_DATOS = r"bd|base|preg|servqual"
+
+# Columna destino -> encabezados aceptados (normalizados con ``servqual_texto.normalizar``).
+# Las que empiezan con "_" son auxiliares y no quedan en la matriz.
+ALIAS: dict[str, tuple[str, ...]] = {
+    "Código": ("codigo", "codigo pregunta", "cod p", "pregunta codigo"),
+    "Dimensión": ("dimension",),
+    "Pregunta evaluada": ("pregunta evaluada", "pregunta", "texto pregunta"),
+    "Subproblema identificado": ("subproblema identificado", "subproblema"),
+    "_subcodigo": ("subcodigo", "sub p", "codigo subpregunta", "subpregunta codigo", "cod sub"),
+    "_subpregunta": ("subpregunta", "texto subpregunta", "categoria subpregunta"),
+    "Causa raíz": ("causa raiz", "causa"),
+    "Acción correctiva": ("accion correctiva", "accion"),
+    "Fecha seguimiento": ("fecha seguimiento", "fecha"),
+    "Responsable": ("responsable",),
+    "Plazo": ("plazo",),
+    "Estado": ("estado",),
+    "% Avance": ("avance",),
+    "Sucursal": ("sucursal", "clinica", "sede"),
+    "_activa": ("activa",),
+}
+_POR_ALIAS = {alias: col for col, alias_col in ALIAS.items() for alias in alias_col}
+_VERDADERO = {"1", "si", "sí", "true", "verdadero", "x", "yes"}
+
+
+def resolver_encabezado(encabezado) -> list[tuple[int, str]]:
+    """``(posición, columna destino)`` de cada encabezado reconocido (el
+    primero gana si dos encabezados apuntan a la misma columna)."""
+    vistos: dict[str, int] = {}
+    for i, celda in enumerate(encabezado):
+        col = _POR_ALIAS.get(servqual_texto.normalizar(celda))
+        if col is not None and col not in vistos:
+            vistos[col] = i
+    return [(i, col) for col, i in vistos.items()]
+
+
+def leer_libro(path, chunk_rows: int = CHUNK_ROWS, hoja: str | None = None) -> Iterator[pd.DataFrame]:
+    """Bloques crudos de la hoja de datos, solo con las columnas reconocidas."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(Path(path), read_only=True, data_only=True)
+    try:
+        ws = wb[hoja or buscar_hoja(wb.sheetnames, HOJA_DATOS, wb.sheetnames[0])]
+        filas = ws.iter_rows(values_only=True)
+        columnas = resolver_encabezado(next(filas, ()))
+        if not any(col == "Código" for _, col in columnas):
+            raise ValueError(f"La hoja {ws.title!r} no tiene columna de código")
+        posiciones = [i for i, _ in columnas]
+        nombres = [col for _, col in columnas]
+        ancho = max(posiciones) + 1
+        bloque = []
+        for fila in filas:
+            if len(fila) < ancho:
+                fila = fila + (None,) * (ancho - len(fila))
+            bloque.append([fila[i] for i in posiciones])
+            if len(bloque) >= chunk_rows:
+                yield pd.DataFrame(bloque, columns=nombres)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=nombres)
+    finally:
+        wb.close()
+
+
+def _texto(s: pd.Series) -> pd.Series:
+    return s.astype(object).where(s.notna(), "").astype(str).str.strip()
+
+
+def normalizar(bloque: pd.DataFrame, columnas: list[str], cat: Catalogo, estado: str) -> pd.DataFrame:
+    """Bloque crudo -> filas de la matriz con *columnas* (ver docstring del módulo)."""
+    if "_activa" in bloque:
+        activa = bloque["_activa"]
+        bloque = bloque[(activa == True) | _texto(activa).str.lower().isin(_VERDADERO)]  # noqa: E712
+    codigo = _texto(bloque["Código"]).str.upper()
+    bloque = bloque[(codigo != "").to_numpy()]
+
+    def texto(col: str) -> pd.Series:
+        if col in bloque:
+            return _texto(bloque[col])
+        return pd.Series(np.full(len(bloque), "", dtype=object), index=bloque.index)
+
+    out = pd.DataFrame({col: texto(col) for col in columnas}, index=bloque.index)
+    out["Código"] = codigo[codigo != ""]
+
+    # Dimensión y pregunta del catálogo cuando la hoja no las trae
+    conocidas = [cat.preguntas.get(c, ("", "")) for c in out["Código"]]
+    dim = out["Dimensión"].map(lambda d: cat.corto_a_largo.get(d.upper(), d))
+    out["Dimensión"] = np.where(dim != "", dim, [d for d, _ in conocidas])
+    preg = out["Pregunta evaluada"]
+    out["Pregunta evaluada"] = np.where(preg != "", preg, [p for _, p in conocidas])
+
+    if "_subcodigo" in bloque or "_subpregunta" in bloque:
+        sub, desc = texto("_subcodigo").str.upper(), texto("_subpregunta")
+        opciones = {subcodigo(o): o for ops in cat.subopciones.values() for o in ops}
+        solo_sub = sub.map(opciones).where(sub.isin(list(opciones)), sub)
+        armado = np.where(sub == "", desc, np.where(desc == "", solo_sub, sub + " - " + desc))
+        actual = out["Subproblema identificado"]
+        out["Subproblema identificado"] = np.where(actual != "", actual, armado)
+
+    out["Estado"] = out["Estado"].where(out["Estado"] != "", estado)
+    if "Fecha seguimiento" in bloque:
+        out["Fecha seguimiento"] = bloque["Fecha seguimiento"]
+    avance = bloque["% Avance"] if "% Avance" in bloque else 0
+    out["% Avance"] = pd.to_numeric(avance, errors="coerce")
+    out["% Avance"] = out["% Avance"].fillna(0).clip(0, 100).astype("int64")
+    return out.reset_index(drop=True)
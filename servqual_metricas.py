@@ -0,0 +1,208 @@
+"""
+Instrumentación liviana: tramos de tiempo, contadores y bitácora estructurada.
+
+Se activa con la variable de entorno ``SERVQUAL_METRICAS`` (``1`` = solo en
+memoria; cualquier otro valor = ruta de un archivo ``.jsonl`` que recibe un
+evento JSON por línea) o con :func:`activar`. Uso::
+
+    with tramo("ui.filtros"):
+        ...
+
+    @medido()
+    def load_data(): ...
+
+    contar("filas_cargadas", len(df))
+
+En memoria se guardan los totales por tramo (llamadas, tiempo total y máximo),
+los contadores y los últimos ``RECIENTES`` tramos, que muestra el panel de
+diagnóstico de la app. Los tramos anidados registran su tramo padre.
+
+Apagada, :func:`tramo` devuelve un contexto nulo compartido y :func:`contar`
+sale en la primera línea; :func:`medido` solo agrega una comparación por
+llamada. No depende de pandas.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+RECIENTES = 500
+
+_activo = False
+_lock = threading.Lock()
+_local = threading.local()
+_archivo = None
+_totales: dict[str, list] = {}  # nombre -> [llamadas, total_ns, max_ns]
+_contadores: Counter = Counter()
+_recientes: deque = deque(maxlen=RECIENTES)
+
+
+class _Nulo:
+    """Contexto que no hace nada (métricas apagadas)."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULO = _Nulo()
+
+
+class _Tramo:
+    __slots__ = ("nombre", "attrs", "t0", "padre")
+
+    def __init__(self, nombre: str, attrs: dict) -> None:
+        self.nombre = nombre
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        """Agrega atributos al evento (p. ej. filas procesadas)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        pila = getattr(_local, "pila", None)
+        if pila is None:
+            pila = _local.pila = []
+        self.padre = pila[-1].nombre if pila else None
+        pila.append(self)
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, exc, tb) -> bool:
+        dur = time.perf_counter_ns() - self.t0
+        _local.pila.pop()
+        evento = {"ts": round(time.time(), 3), "tramo": self.nombre, "ms": round(dur / 1e6, 3)}
+        if self.padre:
+            evento["padre"] = self.padre
+        if tipo is not None:
+            evento["error"] = tipo.__name__
+        evento.update(self.attrs)
+        with _lock:
+            total = _totales.get(self.nombre)
+            if total is None:
+                _totales[self.nombre] = [1, dur, dur]
+            else:
+                total[0] += 1
+                total[1] += dur
+                total[2] = max(total[2], dur)
+            _recientes.append(evento)
+            _escribir(evento)
+        return False
+
+
+def _escribir(evento: dict) -> None:
+    if _archivo is not None:
+        _archivo.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+
+
+def tramo(nombre: str, **attrs):
+    """Contexto que mide el tiempo de su bloque (nulo si está apagado)."""
+    if not _activo:
+        return _NULO
+    return _Tramo(nombre, attrs)
+
+
+def medido(nombre: str | None = None):
+    """Decorador: mide cada llamada a la función como un tramo."""
+
+    def decorar(func):
+        etiqueta = nombre or func.__name__
+
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return func(*args, **kwargs)
+            with _Tramo(etiqueta, {}):
+                return func(*args, **kwargs)
+
+        return envoltura
+
+    return decorar
+
+
+def contar(nombre: str, n: int = 1) -> None:
+    """Suma *n* al contador *nombre*."""
+    if not _activo:
+        return
+    with _lock:
+        _contadores[nombre] += n
+        _escribir({"ts": round(time.time(), 3), "contador": nombre, "n": n})
+
+
+def activar(log: Path | str | None = None) -> None:
+    """Enciende la instrumentación; con *log*, agrega los eventos a ese archivo."""
+    global _activo, _archivo
+    with _lock:
+        if _archivo is not None:
+            _archivo.close()
+            _archivo = None
+        if log:
+            Path(log).parent.mkdir(parents=True, exist_ok=True)
+            _archivo = open(log, "a", encoding="utf-8", buffering=1)
+        _activo = True
+
+
+def desactivar() -> None:
+    """Apaga la instrumentación y cierra la bitácora (conserva lo acumulado)."""
+    global _activo, _archivo
+    with _lock:
+        _activo = False
+        if _archivo is not None:
+            _archivo.close()
+            _archivo = None
+
+
+def activo() -> bool:
+    return _activo
+
+
+def reiniciar() -> None:
+    """Borra totales, contadores y tramos recientes."""
+    with _lock:
+        _totales.clear()
+        _contadores.clear()
+        _recientes.clear()
+
+
+def resumen() -> list[dict]:
+    """Totales por tramo, del que más tiempo acumula al que menos."""
+    with _lock:
+        filas = [
+            {
+                "tramo": nombre,
+                "llamadas": n,
+                "total_ms": round(total / 1e6, 3),
+                "medio_ms": round(total / n / 1e6, 3),
+                "max_ms": round(maximo / 1e6, 3),
+            }
+            for nombre, (n, total, maximo) in _totales.items()
+        ]
+    return sorted(filas, key=lambda f: f["total_ms"], reverse=True)
+
+
+def contadores() -> dict[str, int]:
+    with _lock:
+        return dict(_contadores)
+
+
+def recientes(n: int = 50) -> list[dict]:
+    """Últimos *n* tramos terminados (el más reciente al final)."""
+    with _lock:
+        return list(_recientes)[-n:]
+
+
+_config = os.environ.get("SERVQUAL_METRICAS", "").strip()
+if _config:
+    activar(None if _config.lower() in ("1", "true", "si", "sí") else _config)
@@ -0,0 +1,462 @@
+"""
+Fechas límite del plan de acción y agenda de vencimientos.
+
+``Plazo`` es texto libre: un lapso ("30 días", "2 semanas", "1 mes y 15 días",
+"15 días hábiles", "un trimestre", "15" = días, "inmediato") o una fecha
+("2025-03-31", "31/03/2025"). :func:`lapso` lo interpreta (cada texto distinto
+una sola vez) y :func:`vencimiento` / :func:`vencimientos` lo convierten en una
+fecha límite real:
+
+- un lapso se cuenta desde ``Fecha seguimiento`` (meses y años de calendario,
+  días hábiles de lunes a viernes);
+- una fecha vale por sí misma;
+- sin plazo, o con uno que no se entiende, la fecha límite es la de
+  seguimiento (como en ``servqual_kpi``).
+
+Las acciones en un estado de ``cerrados`` no vencen.
+
+El almacén calcula la fecha límite al escribir y mantiene un índice por fecha
+límite, así que listar lo vencido o por vencer no recorre la matriz:
+
+- ``JournalStore`` en memoria (:class:`Vencimientos`): arreglos ordenados por
+  día, generales y por grupo (Responsable, Sucursal), más un montículo por
+  grupo con los cambios posteriores.
+- ``SQLiteStore`` en la tabla ``_plazos`` (``_id``, día límite y grupos),
+  indexada por (grupo, día) y mantenida por *triggers* que llaman a la
+  función ``servqual_vence`` que el almacén registra en cada conexión.
+
+En ambos, las *k* filas que vencen hasta un día salen en O(k log n).
+:func:`agenda` las clasifica en vencidas y por vencer y :func:`resumen_md`
+arma el resumen de un responsable.
+"""
+from __future__ import annotations
+
+import heapq
+import re
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from servqual_index import tokens
+from servqual_kpi import _clave_valor, _dia
+
+VENCIMIENTO = "Vencimiento"
+DIAS = "Días"
+SITUACION = "Situación"
+VENCIDA = "Vencida"
+POR_VENCER = "Por vencer"
+
+# aaaa-mm-dd (ISO) o dd/mm/aaaa, dd-mm-aaaa, dd/mm/aa (día primero)
+_FECHA = re.compile(
+    r"^\s*(?:(?P<iso>\d{4}-\d{1,2}-\d{1,2})|(?P<dma>\d{1,2}(?P<sep>[/-])\d{1,2}(?P=sep)(?:\d{4}|\d{2})))\s*$"
+)
+# unidad -> (meses, días corridos, días hábiles si dice "hábiles")
+_UNIDADES = {
+    "d": (0, 1, 1),
+    "dia": (0, 1, 1),
+    "dias": (0, 1, 1),
+    "sem": (0, 7, 5),
+    "semana": (0, 7, 5),
+    "semanas": (0, 7, 5),
+    "quincena": (0, 15, 10),
+    "quincenas": (0, 15, 10),
+    "mes": (1, 0, 0),
+    "meses": (1, 0, 0),
+    "trimestre": (3, 0, 0),
+    "trimestres": (3, 0, 0),
+    "semestre": (6, 0, 0),
+    "semestres": (6, 0, 0),
+    "ano": (12, 0, 0),
+    "anos": (12, 0, 0),
+}
+_NUMEROS = {
+    "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
+    "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "quince": 15,
+    "veinte": 20, "treinta": 30, "sesenta": 60, "noventa": 90,
+}
+_HABILES = {"habil", "habiles", "laborable", "laborables"}
+_INMEDIATO = {"inmediato", "inmediata", "inmediatamente", "hoy"}
+
+
+@dataclass(frozen=True)
+class PlazoSpec:
+    """Columnas que usan las fechas límite."""
+
+    fecha: str = "Fecha seguimiento"
+    plazo: str = "Plazo"
+    estado: str = "Estado"
+    cerrados: tuple[str, ...] = ("Completado",)
+    grupos: tuple[str, ...] = ("Responsable", "Sucursal")
+
+    @property
+    def columnas(self) -> tuple[str, ...]:
+        return (self.fecha, self.plazo, self.estado) + self.grupos
+
+
+class Lapso(NamedTuple):
+    meses: int = 0
+    dias: int = 0
+    habiles: int = 0
+
+
+@lru_cache(maxsize=4096)
+def lapso(texto: str) -> Lapso | pd.Timestamp | None:
+    """Interpreta un ``Plazo``: un :class:`Lapso`, una fecha fija o ``None``
+    (vacío o sin unidades reconocibles).
+
+    Las fechas se leen con formato explícito: ``aaaa-mm-dd`` o día primero
+    (``31/03/2025``, ``31-03-2025``, ``31/03/25``). Una semana hábil son 5 días
+    hábiles (``"2 semanas hábiles"`` -> 10).
+    """
+    fecha = _FECHA.match(texto or "")
+    if fecha:
+        if fecha["iso"]:
+            valor = pd.to_datetime(fecha["iso"], format="%Y-%m-%d", errors="coerce")
+        else:
+            dma = fecha["dma"].replace("-", "/")
+            anio = "%Y" if len(dma.rsplit("/", 1)[1]) == 4 else "%y"
+            valor = pd.to_datetime(dma, format=f"%d/%m/{anio}", dayfirst=True, errors="coerce")
+        return None if pd.isna(valor) else valor.normalize()
+    meses = dias = habiles = 0
+    numero = ultimo = None
+    entendido = False
+    for palabra in tokens(texto or ""):
+        if palabra.isdigit():
+            numero = int(palabra)
+        elif palabra in _NUMEROS:
+            numero = _NUMEROS[palabra]
+        elif palabra in _UNIDADES:
+            n = 1 if numero is None else numero
+            m, d, h = _UNIDADES[palabra]
+            meses += n * m
+            dias += n * d
+            ultimo = (n * d, n * h)
+            numero = None
+            entendido = True
+        elif palabra in _HABILES and ultimo and ultimo[1]:
+            # "15 días hábiles", "2 semanas hábiles": cuentan de lunes a viernes
+            dias -= ultimo[0]
+            habiles += ultimo[1]
+            ultimo = None
+        elif palabra in _INMEDIATO:
+            entendido = True
+    if numero is not None:  # número suelto ("15"): días
+        dias += numero
+        entendido = True
+    return Lapso(meses, dias, habiles) if entendido else None
+
+
+def _lapso_de(plazo) -> Lapso | pd.Timestamp | None:
+    if plazo is None or (not isinstance(plazo, str) and pd.isna(plazo)):
+        return None
+    return lapso(str(plazo))
+
+
+def vencimiento(fecha, plazo) -> pd.Timestamp:
+    """Fecha límite de una fila (``NaT`` si no tiene)."""
+    extension = _lapso_de(plazo)
+    if isinstance(extension, pd.Timestamp):
+        return extension
+    if isinstance(fecha, str) and not fecha.strip():
+        fecha = None
+    base = pd.to_datetime(fecha, errors="coerce")
+    if pd.isna(base):
+        return pd.NaT
+    base = pd.Timestamp(base).normalize()
+    if extension is None:
+        return base
+    if extension.meses:
+        base += pd.DateOffset(months=extension.meses)
+    if extension.dias:
+        base += pd.Timedelta(days=extension.dias)
+    if extension.habiles:
+        base = pd.Timestamp(np.busday_offset(np.datetime64(base.date()), extension.habiles, roll="forward"))
+    return base
+
+
+@lru_cache(maxsize=65536)
+def dia_limite(fecha, plazo) -> int | None:
+    """:func:`vencimiento` como número de día (``None`` si no tiene).
+
+    Con caché: los triggers de SQLite la llaman por fila y los pares
+    (fecha, plazo) se repiten mucho.
+    """
+    return _dia(vencimiento(fecha, plazo))
+
+
+def vencimientos(fechas, plazos) -> pd.Series:
+    """Fechas límite de varias filas (cada texto de plazo se interpreta una vez)."""
+    base = pd.to_datetime(pd.Series(fechas).reset_index(drop=True).replace("", None), errors="coerce")
+    base = base.astype("datetime64[ns]").dt.normalize()
+    plazos = pd.Series(plazos).reset_index(drop=True).astype(object)
+    codigos, textos = pd.factorize(plazos.where(plazos.notna(), ""))
+    out = base.copy()
+    for i, texto in enumerate(textos):
+        extension = lapso(str(texto))
+        if extension is None:
+            continue
+        mascara = codigos == i
+        if isinstance(extension, pd.Timestamp):
+            out[mascara] = extension
+            continue
+        parte = base[mascara]
+        if extension.meses:
+            parte = parte + pd.DateOffset(months=extension.meses)
+        if extension.dias:
+            parte = parte + pd.Timedelta(days=extension.dias)
+        if extension.habiles:
+            dias = np.busday_offset(parte.to_numpy(dtype="datetime64[D]"), extension.habiles, roll="forward")
+            parte = pd.Series(dias.astype("datetime64[ns]"), index=parte.index)
+        out[mascara] = parte
+    return out
+
+
+def _a_dias(fechas: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """``(días, con_fecha)``: fechas como número de día y máscara de no nulas."""
+    con_fecha = fechas.notna().to_numpy()
+    dias = fechas.to_numpy(dtype="datetime64[D]").astype("int64")
+    return dias, con_fecha
+
+
+class Vencimientos:
+    """Índice de fechas límite de las filas abiertas (por ``_id``).
+
+    La *base* se arma en bloque: ``_id`` y día límite ordenados por
+    ``(día, _id)`` y, por cada columna de ``grupos``, el código de grupo de
+    cada entrada y un orden ``(grupo, día, _id)`` con sus cortes, de modo que
+    "lo de Ana hasta el día d" es una rebanada más un ``searchsorted``. Los
+    cambios posteriores no tocan esos arreglos: marcan la entrada de la base
+    como vieja (``_viva``) y dejan ``_id -> (versión, día, grupos)`` en
+    ``_cambios`` más ``(día, _id, versión)`` en un montículo general y uno por
+    grupo; al consultar solo cuentan las entradas con la versión vigente.
+    Cuando los cambios pasan de ``MIN_CAMBIOS`` y de la octava parte de la
+    base, todo se funde en una base nueva.
+    """
+
+    MIN_CAMBIOS = 4096
+
+    def __init__(self, spec: PlazoSpec) -> None:
+        self.spec = spec
+        self._version = 0  # versión de la última entrada de montículo
+        self._base(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), {c: [] for c in spec.grupos})
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, spec: PlazoSpec, id_col: str = "_id") -> "Vencimientos":
+        idx = cls(spec)
+        ids, dias, grupos = idx._abiertas(df, id_col)
+        idx._base(ids, dias, grupos)
+        return idx
+
+    def _abiertas(self, df: pd.DataFrame, id_col: str) -> tuple[np.ndarray, np.ndarray, dict]:
+        """``_id``, día límite y grupos de las filas de *df* que pueden vencer."""
+        spec = self.spec
+        dias, con_fecha = _a_dias(vencimientos(df[spec.fecha], df[spec.plazo]))
+        abierta = con_fecha & ~df[spec.estado].isin(spec.cerrados).to_numpy()
+        grupos = {c: df[c].astype(object).to_numpy()[abierta] for c in spec.grupos}
+        return df[id_col].to_numpy(dtype=np.int64)[abierta], dias[abierta], grupos
+
+    def _base(self, ids: np.ndarray, dias: np.ndarray, grupos: dict) -> None:
+        orden = np.lexsort((ids, dias))
+        self._ids = ids[orden]
+        self._dias = dias[orden]
+        self._viva = np.ones(len(orden), dtype=bool)
+        self._por_id = np.argsort(self._ids, kind="stable")
+        self._ids_ordenados = self._ids[self._por_id]
+        self._grupos = {}
+        for col, valores in grupos.items():
+            codigos, unicos = pd.factorize(pd.Series(valores, dtype=object).take(orden))
+            por_grupo = np.argsort(codigos, kind="stable")  # (grupo, día, _id); los nulos (-1) primero
+            cortes = np.searchsorted(codigos[por_grupo], np.arange(len(unicos) + 1))
+            self._grupos[col] = (
+                {v: i for i, v in enumerate(unicos)},
+                np.asarray(unicos, dtype=object),
+                codigos,
+                por_grupo,
+                cortes,
+                self._dias[por_grupo],
+            )
+        self._cambios: dict[int, tuple | None] = {}  # _id -> (versión, día, grupos) o None
+        self._monticulos: dict[tuple, list] = {}  # () o (columna, valor) -> [(día, _id, versión)]
+        self._empujes = 0
+
+    def __len__(self) -> int:
+        vivas = int(self._viva.sum())
+        return vivas + sum(1 for c in self._cambios.values() if c is not None)
+
+    # ---------------------------------------------------------
+    # Mantenimiento
+    # ---------------------------------------------------------
+    def _tocar(self, row_id: int) -> None:
+        """Marca como vieja la entrada de la base de *row_id* (la primera vez)."""
+        if row_id in self._cambios or not len(self._ids_ordenados):
+            return
+        i = int(np.searchsorted(self._ids_ordenados, row_id))
+        if i < len(self._ids_ordenados) and self._ids_ordenados[i] == row_id:
+            self._viva[self._por_id[i]] = False
+
+    def _poner(self, row_id: int, dia: int | None, grupos: tuple) -> None:
+        self._tocar(row_id)
+        if dia is None:
+            self._cambios[row_id] = None
+            return
+        self._version += 1
+        self._cambios[row_id] = (self._version, dia, grupos)
+        entrada = (dia, row_id, self._version)
+        heapq.heappush(self._monticulos.setdefault((), []), entrada)
+        for col, valor in zip(self.spec.grupos, grupos):
+            if valor is not None:
+                heapq.heappush(self._monticulos.setdefault((col, valor), []), entrada)
+        self._empujes += 1
+
+    def row(self, row_id: int, row: dict) -> None:
+        """Alta o edición de una fila (*row* con al menos ``spec.columnas``)."""
+        spec = self.spec
+        dia = None
+        if row.get(spec.estado) not in spec.cerrados:
+            dia = dia_limite(row.get(spec.fecha), row.get(spec.plazo))
+        self._poner(int(row_id), dia, tuple(_clave_valor(row.get(c)) for c in spec.grupos))
+        self._quizas_fundir()
+
+    def append(self, rows: pd.DataFrame, id_col: str = "_id") -> None:
+        """Altas en bloque (*rows* con ``_id``); la fecha límite se calcula vectorizada."""
+        if rows.empty:
+            return
+        ids, dias, grupos = self._abiertas(rows, id_col)
+        columnas = [grupos[c].tolist() for c in self.spec.grupos]
+        for rid, dia, *valores in zip(ids.tolist(), dias.tolist(), *columnas):
+            self._poner(rid, dia, tuple(_clave_valor(v) for v in valores))
+        self._quizas_fundir()
+
+    def discard(self, ids: Iterable[int]) -> None:
+        """Bajas por ``_id``."""
+        for rid in ids:
+            self._poner(int(rid), None, ())
+        self._quizas_fundir()
+
+    def _quizas_fundir(self) -> None:
+        if len(self._cambios) + self._empujes > max(self.MIN_CAMBIOS, len(self._ids) // 8):
+            self._fundir()
+
+    def _fundir(self) -> None:
+        """Base nueva con las entradas vigentes (base viva + cambios)."""
+        vivas = self._viva
+        nuevos = [(rid, c[1], c[2]) for rid, c in self._cambios.items() if c is not None]
+        ids = np.concatenate([self._ids[vivas], np.fromiter((n[0] for n in nuevos), np.int64, len(nuevos))])
+        dias = np.concatenate([self._dias[vivas], np.fromiter((n[1] for n in nuevos), np.int64, len(nuevos))])
+        grupos = {}
+        for j, col in enumerate(self.spec.grupos):
+            _, unicos, codigos, *_ = self._grupos[col]
+            base = np.full(len(codigos), None, dtype=object)
+            base[codigos >= 0] = unicos[codigos[codigos >= 0]]
+            grupos[col] = np.concatenate([base[vivas], np.array([n[2][j] for n in nuevos], dtype=object)])
+        self._base(ids, dias, grupos)
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def proximas(self, hasta: int, filtros: dict | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """``(_id, día)`` de las filas abiertas que vencen hasta el día *hasta*,
+        ordenadas por ``(día, _id)``.
+
+        *filtros* (``columna de grupos -> valor``; ``None`` = sin filtro): el
+        primero elige la rebanada del índice y los demás se comprueban sobre
+        esas filas.
+        """
+        activos = {c: v for c, v in (filtros or {}).items() if v is not None}
+        for col in activos:
+            if col not in self.spec.grupos:
+                raise KeyError(f"Columna sin índice de plazos: {col!r}")
+        principal = next(iter(activos), None)
+        if principal is None:
+            n = int(np.searchsorted(self._dias, hasta, side="right"))
+            pos = np.arange(n)
+            clave = ()
+        else:
+            valores, _, _, por_grupo, cortes, dias_grupo = self._grupos[principal]
+            codigo = valores.get(activos[principal])
+            if codigo is None:
+                pos = np.zeros(0, dtype=np.int64)
+            else:
+                ini, fin = int(cortes[codigo]), int(cortes[codigo + 1])
+                n = int(np.searchsorted(dias_grupo[ini:fin], hasta, side="right"))
+                pos = por_grupo[ini : ini + n]
+            clave = (principal, activos[principal])
+        pos = pos[self._viva[pos]]
+        for col, valor in activos.items():
+            if col != principal:
+                valores, _, codigos, *_ = self._grupos[col]
+                codigo = valores.get(valor)
+                pos = pos[codigos[pos] == codigo] if codigo is not None else pos[:0]
+
+        ids, dias = self._del_monticulo(clave, hasta, activos)
+        ids = np.concatenate([self._ids[pos], np.asarray(ids, dtype=np.int64)])
+        dias = np.concatenate([self._dias[pos], np.asarray(dias, dtype=np.int64)])
+        orden = np.lexsort((ids, dias))
+        return ids[orden], dias[orden]
+
+    def _del_monticulo(self, clave: tuple, hasta: int, activos: dict) -> tuple[list, list]:
+        """Entradas vigentes del montículo *clave* con día <= *hasta*: se recorre
+        el árbol desde la raíz sin bajar por las ramas que ya pasan de *hasta*."""
+        monticulo = self._monticulos.get(clave)
+        ids: list[int] = []
+        dias: list[int] = []
+        if not monticulo:
+            return ids, dias
+        posiciones = {c: self.spec.grupos.index(c) for c in activos}
+        pila = [0]
+        while pila:
+            i = pila.pop()
+            if i >= len(monticulo):
+                continue
+            dia, rid, version = monticulo[i]
+            if dia > hasta:
+                continue
+            actual = self._cambios.get(rid)
+            if actual is not None and actual[0] == version and all(
+                actual[2][j] == activos[c] for c, j in posiciones.items()
+            ):
+                ids.append(rid)
+                dias.append(dia)
+            pila.append(2 * i + 1)
+            pila.append(2 * i + 2)
+        return ids, dias
+
+
+def agenda(filas: pd.DataFrame, hoy: date | None = None) -> pd.DataFrame:
+    """Agrega a *filas* (con ``Vencimiento``) los días que faltan (negativos =
+    atraso) y la situación: vencida (antes de *hoy*) o por vencer."""
+    hoy = pd.Timestamp(hoy or date.today())
+    out = filas.copy(deep=False)
+    dias = (out[VENCIMIENTO] - hoy).dt.days
+    out[DIAS] = dias.astype("int64")
+    out[SITUACION] = np.where(dias < 0, VENCIDA, POR_VENCER)
+    return out
+
+
+def resumen_md(responsable: str, filas: pd.DataFrame, hoy: date | None = None, dias: int = 7) -> str:
+    """Resumen en Markdown de la :func:`agenda` de un responsable."""
+    hoy = hoy or date.today()
+    lineas = [f"# Plazos de {responsable} al {hoy:%d/%m/%Y}", ""]
+    secciones = [
+        (VENCIDA, "Vencidas"),
+        (POR_VENCER, f"Vencen en los próximos {dias} días"),
+    ]
+    for situacion, titulo in secciones:
+        parte = filas[filas[SITUACION] == situacion]
+        lineas.append(f"## {titulo} ({len(parte)})")
+        lineas.append("")
+        for r in parte.to_dict("records"):
+            n = int(r[DIAS])
+            cuando = f"{-n} día(s) de atraso" if n < 0 else ("hoy" if n == 0 else f"en {n} día(s)")
+            accion = str(r.get("Acción correctiva") or "").strip() or "(sin acción)"
+            lineas.append(
+                f"- {r[VENCIMIENTO]:%d/%m/%Y} · {r.get('Código', '')} · {r.get('Sucursal', '')} · {accion} ({cuando})"
+            )
+        if not len(parte):
+            lineas.append("- Nada pendiente")
+        lineas.append("")
+    return "\n".join(lineas)
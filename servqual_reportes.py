@@ -0,0 +1,178 @@
+"""
+Reportes mensuales por sucursal (un libro ``.xlsx`` por sucursal), en paralelo.
+
+Cada libro tiene tres hojas:
+
+- **Resumen**: avance por dimensión (filas por estado, % completado, avance
+  medio y vencidas) más el total, con ``servqual_kpi``.
+- **Vencidas**: acciones abiertas cuya fecha límite (``servqual_plazos``) ya
+  pasó, de la más atrasada a la más reciente.
+- **Plan de acción**: las filas de la sucursal.
+
+La matriz se particiona **una vez**: se ordena por sucursal y se escribe en un
+``.sqcol`` temporal (``servqual_snapshot``) con el rango de filas de cada
+sucursal en los metadatos. Cada tarea recibe solo ``(archivo, inicio, fin)`` y
+lee su rango con :func:`servqual_snapshot.read_columnar_rows`, que mapea el
+archivo en memoria: ningún DataFrame viaja serializado entre procesos y las
+páginas se comparten a través de la caché del sistema operativo. Las tareas
+corren en un pool de procesos *spawn* (no heredan almacenes ni bloqueos), las
+sucursales más grandes primero, y cada libro se escribe por bloques
+(``servqual_export.write_workbook``).
+"""
+from __future__ import annotations
+
+import multiprocessing
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import servqual_export
+import servqual_plazos
+from servqual_kpi import KpiCells, KpiSpec, resumen
+from servqual_plazos import PlazoSpec
+from servqual_snapshot import read_columnar_rows, write_columnar
+
+HOJA_RESUMEN = "Resumen"
+HOJA_VENCIDAS = "Vencidas"
+HOJA_PLAN = "Plan de acción"
+COLS_VENCIDAS = [
+    servqual_plazos.VENCIMIENTO,
+    "Días de atraso",
+    "Código",
+    "Dimensión",
+    "Responsable",
+    "Acción correctiva",
+    "Plazo",
+    "Estado",
+    "% Avance",
+]
+
+
+@dataclass(frozen=True)
+class ReporteSpec:
+    """Qué lleva cada libro (se envía a cada proceso; debe ser liviano)."""
+
+    columnas: tuple[str, ...]
+    dtypes: dict[str, str] = field(default_factory=dict)
+    kpi: KpiSpec = KpiSpec()
+    plazos: PlazoSpec = PlazoSpec()
+    estados: tuple[str, ...] = ()
+    por: str = "Sucursal"
+    dimension: str = "Dimensión"
+
+
+def nombre_archivo(texto: str) -> str:
+    """*texto* apto como nombre de archivo."""
+    return re.sub(r"[^\w.-]+", "_", texto).strip("_") or "sin_sucursal"
+
+
+def particionar(df: pd.DataFrame, spec: ReporteSpec, ruta: Path) -> dict[str, tuple[int, int]]:
+    """Escribe *df* ordenado por ``spec.por`` en *ruta* (``.sqcol``) y devuelve
+    ``valor -> (inicio, fin)``. Las filas sin valor se omiten."""
+    valores = df[spec.por]
+    if isinstance(valores.dtype, pd.CategoricalDtype):
+        codigos, unicos = valores.cat.codes.to_numpy(), valores.cat.categories
+    else:
+        codigos, unicos = pd.factorize(valores.astype(object), use_na_sentinel=True)
+    orden = np.argsort(codigos, kind="stable")
+    codigos = codigos[orden]
+    cortes = np.searchsorted(codigos, np.arange(len(unicos) + 1))
+    rangos = {
+        str(v): (int(cortes[i]), int(cortes[i + 1]))
+        for i, v in enumerate(unicos)
+        if cortes[i + 1] > cortes[i]
+    }
+    write_columnar(df.take(orden), ruta, spec.dtypes, meta={"por": spec.por}, fsync=False)
+    return rangos
+
+
+def hojas(df: pd.DataFrame, spec: ReporteSpec, hoy: date) -> list[tuple[str, pd.DataFrame, list[str]]]:
+    """Las hojas ``(título, df, columnas)`` del reporte de un bloque de la matriz."""
+    kpi, plazos = spec.kpi, spec.plazos
+    hoy = pd.Timestamp(hoy)
+    limite = servqual_plazos.vencimientos(df[plazos.fecha], df[plazos.plazo])
+    vencida = (limite < hoy).to_numpy() & ~df[plazos.estado].isin(plazos.cerrados).to_numpy()
+
+    celdas = KpiCells.build(df, kpi).frame()
+    por_dimension = resumen(celdas, kpi, [spec.dimension], hoy, spec.estados)
+    total = resumen(celdas, kpi, (), hoy, spec.estados).reset_index(drop=True)
+    total.insert(0, spec.dimension, "Total")
+    tabla = pd.concat([por_dimension, total], ignore_index=True)
+    # Vencidas según la fecha límite (seguimiento + plazo), como en la hoja Vencidas
+    cuenta = pd.Series(df.loc[vencida, spec.dimension].astype(str)).value_counts()
+    tabla["Vencidas"] = tabla[spec.dimension].astype(str).map(cuenta).fillna(0).astype("int64")
+    tabla.loc[tabla.index[-1], "Vencidas"] = int(vencida.sum())
+
+    atrasadas = df[vencida].assign(**{servqual_plazos.VENCIMIENTO: limite[vencida].to_numpy()})
+    atrasadas["Días de atraso"] = (hoy - atrasadas[servqual_plazos.VENCIMIENTO]).dt.days.astype("int64")
+    atrasadas = atrasadas.sort_values([servqual_plazos.VENCIMIENTO, "Código"], kind="stable")
+    return [
+        (HOJA_RESUMEN, tabla, list(tabla.columns)),
+        (HOJA_VENCIDAS, atrasadas, [c for c in COLS_VENCIDAS if c in atrasadas.columns]),
+        (HOJA_PLAN, df, list(spec.columnas)),
+    ]
+
+
+def tarea_reporte(particion: str, inicio: int, fin: int, destino: str, spec: ReporteSpec, hoy: date) -> int:
+    """Escribe el libro de las filas ``[inicio, fin)`` de *particion*; devuelve cuántas."""
+    df, _ = read_columnar_rows(Path(particion), inicio, fin)
+    servqual_export.write_workbook(hojas(df, spec, hoy), Path(destino))
+    return len(df)
+
+
+def generar(
+    df: pd.DataFrame,
+    destino: Path,
+    spec: ReporteSpec,
+    procesos: int = 1,
+    hoy: date | None = None,
+    log=None,
+) -> tuple[dict[str, Path], dict[str, Exception]]:
+    """Un libro por valor de ``spec.por`` en *destino* (``Reporte_<valor>_<AAAA-MM>.xlsx``).
+
+    Con ``procesos > 1`` los libros se arman en un pool de procesos. Devuelve
+    ``(archivos, errores)`` por sucursal; un libro que falla no detiene a los
+    demás. Si se indica *log* (archivo de texto), anota ahí cada sucursal.
+    """
+    hoy = hoy or date.today()
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    archivos: dict[str, Path] = {}
+    errores: dict[str, Exception] = {}
+    with tempfile.TemporaryDirectory(prefix=".particion", dir=destino) as tmp:
+        particion = Path(tmp) / "matriz.sqcol"
+        rangos = particionar(df, spec, particion)
+        # las más grandes primero: el pool termina parejo
+        tareas = sorted(rangos.items(), key=lambda r: r[1][0] - r[1][1])
+        rutas = {v: destino / f"Reporte_{nombre_archivo(v)}_{hoy:%Y-%m}.xlsx" for v in rangos}
+
+        def anotar(valor: str, obtener) -> None:
+            try:
+                filas = obtener()
+                archivos[valor] = rutas[valor]
+                if log is not None:
+                    print(f"{valor}: {filas} fila(s)", file=log, flush=True)
+            except Exception as exc:  # se informa y sigue con las demás
+                errores[valor] = exc
+                if log is not None:
+                    print(f"{valor}: ERROR {type(exc).__name__}: {exc}", file=log, flush=True)
+
+        def argumentos(valor: str, rango: tuple[int, int]) -> tuple:
+            return (str(particion), *rango, str(rutas[valor]), spec, hoy)
+
+        if procesos <= 1 or len(tareas) <= 1:
+            for valor, rango in tareas:
+                anotar(valor, lambda: tarea_reporte(*argumentos(valor, rango)))
+        else:
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(min(procesos, len(tareas)), mp_context=contexto) as pool:
+                futuros = {pool.submit(tarea_reporte, *argumentos(v, r)): v for v, r in tareas}
+                for futuro in as_completed(futuros):
+                    anotar(futuros[futuro], futuro.result)
+    return archivos, errores
@@ -0,0 +1,260 @@
+"""
+Formato binario columnar para la instantánea de la matriz (``.sqcol``).
+
+Diseño (sin ``pyarrow``; solo NumPy)::
+
+    b"SQCOL\\x01"                      firma + versión
+    uint32 little-endian              largo del encabezado
+    encabezado JSON (utf-8)           filas y descripción de cada columna
+    bloques de datos alineados a 8    un arreglo NumPy contiguo por columna
+
+Tipos de columna admitidos:
+
+- ``category``: códigos enteros (int8/16/32 según cardinalidad) + categorías en
+  el encabezado. Se carga como ``pd.Categorical`` (p. ej. Dimensión, Estado).
+- ``text``: igual que ``category`` en disco (diccionario), pero se carga como
+  texto ``object``; las cadenas repetidas comparten un único objeto en memoria.
+- ``int`` / ``float``: arreglo numérico con el dtype más pequeño que alcanza.
+- ``date``: días desde 1970-01-01 en int32 (``INT32_MIN`` = fecha vacía).
+
+La carga no analiza texto fila por fila: todo se resuelve con
+``np.frombuffer`` + ``take``, por lo que una matriz de 500k filas se lee en
+fracciones de segundo.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"SQCOL\x01"
+_ALIGN = 8
+_NAT = np.iinfo(np.int32).min
+
+
+def _codes_dtype(n: int) -> np.dtype:
+    for dt in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dt).max:
+            return np.dtype(dt)
+    return np.dtype(np.int64)
+
+
+def _int_dtype(values: np.ndarray) -> np.dtype:
+    if not len(values):
+        return np.dtype(np.int8)
+    return np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+
+
+# -------------------------------------------------------------
+# Tipado en memoria
+# -------------------------------------------------------------
+def coerce_column(s: pd.Series, kind: str) -> pd.Series:
+    """Convierte una columna al tipo en memoria que corresponde a *kind*."""
+    if kind == "category":
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return s
+        return s.astype(object).where(s.notna(), None).astype("category")
+    if kind == "text":
+        return s.astype(object).where(s.notna(), np.nan)
+    if kind == "int":
+        return pd.to_numeric(s, errors="coerce").fillna(0).astype("int64")
+    if kind == "float":
+        return pd.to_numeric(s, errors="coerce").astype("float64")
+    if kind == "date":
+        return pd.to_datetime(s, errors="coerce").astype("datetime64[ns]").dt.normalize()
+    raise ValueError(f"Tipo de columna desconocido: {kind!r}")
+
+
+def coerce_frame(df: pd.DataFrame, dtypes: dict[str, str]) -> pd.DataFrame:
+    """Aplica :func:`coerce_column` a las columnas de *df* presentes en *dtypes*."""
+    out = df.copy()
+    for col, kind in dtypes.items():
+        if col in out.columns:
+            out[col] = coerce_column(out[col], kind)
+    return out
+
+
+def coerce_value(value, kind: str):
+    """Versión escalar de :func:`coerce_column` (para ediciones de una fila)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 0 if kind == "int" else (pd.NaT if kind == "date" else np.nan)
+    if kind == "int":
+        v = pd.to_numeric(value, errors="coerce")
+        return 0 if pd.isna(v) else int(v)
+    if kind == "float":
+        return float(pd.to_numeric(value, errors="coerce"))
+    if kind == "date":
+        fecha = pd.to_datetime(value, errors="coerce")
+        return pd.NaT if pd.isna(fecha) else fecha.normalize()  # "" o ilegible: sin fecha
+    return value
+
+
+def concat_typed(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    """``pd.concat`` que conserva las columnas categóricas (une las categorías)."""
+    if a.empty:
+        return b.reset_index(drop=True)
+    if b.empty:
+        return a.reset_index(drop=True)
+    a = a.copy(deep=False)
+    b = b.copy(deep=False)
+    for col in a.columns:
+        if col in b.columns and isinstance(a[col].dtype, pd.CategoricalDtype):
+            cats = a[col].cat.categories
+            extra = pd.Index(b[col].dropna().unique()).difference(cats)
+            if len(extra):
+                a[col] = a[col].cat.add_categories(extra)
+                cats = a[col].cat.categories
+            b[col] = pd.Categorical(b[col].astype(object).where(b[col].notna(), None), categories=cats)
+    return pd.concat([a, b], ignore_index=True)
+
+
+def ensure_category(df: pd.DataFrame, col: str, values) -> None:
+    """Agrega a la columna categórica *col* las categorías nuevas de *values*."""
+    s = df[col]
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        return
+    extra = pd.Index([v for v in values if not pd.isna(v)]).difference(s.cat.categories)
+    if len(extra):
+        df[col] = s.cat.add_categories(extra)
+
+
+# -------------------------------------------------------------
+# Escritura / lectura
+# -------------------------------------------------------------
+def _encode(s: pd.Series, kind: str) -> tuple[np.ndarray, dict]:
+    meta: dict = {"kind": kind}
+    if kind in ("category", "text"):
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            cats = s.cat.categories
+        else:
+            codes, cats = pd.factorize(s.astype(object), use_na_sentinel=True)
+        meta["categories"] = [str(c) for c in cats]
+        arr = codes.astype(_codes_dtype(len(cats)))
+    elif kind == "int":
+        vals = pd.to_numeric(s, errors="coerce").fillna(0).to_numpy(dtype="int64")
+        arr = vals.astype(_int_dtype(vals))
+    elif kind == "float":
+        arr = pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64")
+    elif kind == "date":
+        fechas = pd.to_datetime(s, errors="coerce")
+        dias = fechas.to_numpy(dtype="datetime64[D]").astype("int64")
+        arr = np.where(fechas.isna().to_numpy(), _NAT, dias).astype(np.int32)
+    else:
+        raise ValueError(f"Tipo de columna desconocido: {kind!r}")
+    meta["dtype"] = arr.dtype.str
+    return np.ascontiguousarray(arr), meta
+
+
+def write_columnar(
+    df: pd.DataFrame,
+    path: Path,
+    dtypes: dict[str, str],
+    meta: dict | None = None,
+    fsync: bool = True,
+) -> None:
+    """Escribe *df* en formato ``.sqcol``.
+
+    Las columnas sin entrada en *dtypes* se guardan como ``text``. No hace el
+    renombrado atómico: eso le corresponde a quien llama (ver ``servqual_store``).
+    """
+    columnas = []
+    bloques = []
+    offset = 0
+    for col in df.columns:
+        arr, info = _encode(df[col], dtypes.get(col, "text"))
+        info.update(name=col, offset=offset, nbytes=arr.nbytes)
+        columnas.append(info)
+        bloques.append(arr)
+        offset += arr.nbytes
+        offset += -offset % _ALIGN
+    header = json.dumps(
+        {"version": 1, "rows": len(df), "meta": meta or {}, "columns": columnas},
+        ensure_ascii=False,
+    ).encode("utf-8")
+    prefijo = len(MAGIC) + 4 + len(header)
+    relleno = -prefijo % _ALIGN
+
+    with open(path, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(struct.pack("<I", len(header)))
+        fh.write(header)
+        fh.write(b"\0" * relleno)
+        escrito = 0
+        for info, arr in zip(columnas, bloques):
+            fh.write(b"\0" * (info["offset"] - escrito))
+            fh.write(arr.tobytes())
+            escrito = info["offset"] + arr.nbytes
+        fh.flush()
+        if fsync:
+            os.fsync(fh.fileno())
+
+
+def read_header(path: Path) -> tuple[dict, int]:
+    """Lee el encabezado; devuelve ``(header, inicio_de_datos)``."""
+    with open(path, "rb") as fh:
+        firma = fh.read(len(MAGIC))
+        if firma != MAGIC:
+            raise ValueError(f"{path} no es una instantánea .sqcol")
+        (n,) = struct.unpack("<I", fh.read(4))
+        header = json.loads(fh.read(n).decode("utf-8"))
+    inicio = len(MAGIC) + 4 + n
+    return header, inicio + (-inicio % _ALIGN)
+
+
+def _decode(buf, base: int, info: dict, rows: int, inicio: int = 0) -> pd.Series | np.ndarray:
+    dt = np.dtype(info["dtype"])
+    arr = np.frombuffer(buf, dtype=dt, count=rows, offset=base + info["offset"] + inicio * dt.itemsize)
+    kind = info["kind"]
+    if kind == "category":
+        return pd.Categorical.from_codes(arr.astype(np.int32), categories=info["categories"])
+    if kind == "text":
+        cats = np.empty(len(info["categories"]) + 1, dtype=object)
+        cats[:-1] = info["categories"]
+        cats[-1] = np.nan
+        # Series object: pandas >= 3 inferiría ``str`` a partir del arreglo
+        return pd.Series(cats.take(np.where(arr < 0, len(cats) - 1, arr)), dtype=object, copy=False)
+    if kind == "int":
+        return arr.astype(np.int64)
+    if kind == "float":
+        return arr.copy()
+    if kind == "date":
+        out = arr.astype("datetime64[D]").astype("datetime64[ns]")
+        out[arr == _NAT] = np.datetime64("NaT")
+        return out
+    raise ValueError(f"Tipo de columna desconocido: {kind!r}")
+
+
+def read_columnar(path: Path) -> tuple[pd.DataFrame, dict]:
+    """Carga un ``.sqcol``; devuelve ``(DataFrame, meta)``."""
+    header, base = read_header(path)
+    buf = Path(path).read_bytes()
+    rows = header["rows"]
+    data = {info["name"]: _decode(buf, base, info, rows) for info in header["columns"]}
+    df = pd.DataFrame(data, columns=[c["name"] for c in header["columns"]])
+    return df, header.get("meta", {})
+
+
+def read_columnar_rows(path: Path, inicio: int, fin: int) -> tuple[pd.DataFrame, dict]:
+    """Filas ``[inicio, fin)`` de un ``.sqcol``; devuelve ``(DataFrame, meta)``.
+
+    El archivo se mapea en memoria (``mmap``): solo se leen las páginas de esa
+    rebanada de cada columna, y varios procesos que leen el mismo archivo
+    comparten la caché de páginas del sistema operativo.
+    """
+    header, base = read_header(path)
+    inicio, fin = max(0, inicio), min(fin, header["rows"])
+    filas = max(0, fin - inicio)
+    with open(path, "rb") as fh:
+        buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:  # _decode copia los datos: el mapa se puede cerrar al terminar
+        data = {info["name"]: _decode(buf, base, info, filas, inicio) for info in header["columns"]}
+    finally:
+        buf.close()
+    df = pd.DataFrame(data, columns=[c["name"] for c in header["columns"]])
+    return df, header.get("meta", {})
@@ -0,0 +1,691 @@
+"""
+Almacén SQLite (``sqlite3`` de la biblioteca estándar) para la matriz SERVQUAL.
+
+Alternativa a ``servqual_store.JournalStore`` con la misma interfaz
+(``load``/``shared``/``insert``/``update``/``delete``/``filter``/``save``...),
+pensada para varios editores a la vez, incluso desde procesos distintos:
+
+- Modo WAL: los lectores no bloquean al escritor ni viceversa.
+- Cada alta, edición o baja es un ``INSERT``/``UPDATE``/``DELETE`` de filas
+  en su propia transacción (``BEGIN IMMEDIATE``); nunca se reescribe la tabla,
+  así que dos coordinadores que editan filas distintas no se pisan.
+- La clave única (Código, Sucursal) es un índice ``UNIQUE``; también hay
+  índices sobre las columnas filtrables, y :meth:`SQLiteStore.filter` traduce
+  los filtros a ``WHERE``.
+- Con ``text_columns``, la búsqueda libre usa una tabla FTS5 ``_texto`` de
+  contenido externo (tokenizador ``unicode61`` sin diacríticos, como
+  ``servqual_index.tokens``) que mantienen triggers.
+- Con ``plazos``, la tabla ``_plazos`` guarda la fecha límite (número de día)
+  de cada fila abierta con sus grupos, indexada por (grupo, día); la mantienen
+  triggers que llaman a ``servqual_vence`` (``servqual_plazos.dia_limite``),
+  registrada en cada conexión del almacén.
+- ``_id`` es ``INTEGER PRIMARY KEY AUTOINCREMENT``: nunca se reutiliza.
+
+Con ``historial=True`` los cambios se registran en ``servqual_historia`` al
+confirmarse la transacción más externa (un ``save`` que falla no deja deltas).
+
+Cada hilo usa su propia conexión. La tabla ``_meta`` lleva un contador de
+versión que se incrementa en cada transacción de escritura; la matriz en
+memoria (:meth:`SQLiteStore.frame`) solo se vuelve a leer cuando ese contador
+cambia. Ese contador es también la *revisión* del almacén: cada fila guarda en
+``_ver`` (indexada) la de su última escritura y la tabla ``_bajas`` la de cada
+baja (las ``MAX_BAJAS`` más recientes; ``_meta.bajas_desde`` marca desde qué
+revisión están todas), así que ``update(..., version=, base=)``, ``save`` y ``cambios`` siguen
+el mismo control optimista que ``JournalStore`` y el delta de una revisión a
+otra sale de dos consultas por índice.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from servqual_index import tokens
+from servqual_kpi import FECHA, FILAS, SUMA, KpiSpec, _dia, celdas_vacias
+from servqual_plazos import VENCIMIENTO, PlazoSpec, dia_limite
+from servqual_snapshot import coerce_frame, coerce_value
+from servqual_store import (
+    ID_COL,
+    MAX_BAJAS,
+    REVISION,
+    VER_COL,
+    ConflictError,
+    Delta,
+    DuplicateKeyError,
+    _json_default,
+    _limpiar,
+    asignar_ids,
+    con_revision,
+    diferencias,
+    fusionar,
+    vigentes,
+)
+
+TABLE = "plan"
+SUFIJOS = (".db", ".sqlite", ".sqlite3")
+_LOTE = 500  # parámetros por sentencia ``IN (...)``
+_TIPOS_SQL = {"int": "INTEGER", "float": "REAL"}
+
+
+def _q(nombre: str) -> str:
+    """Identificador SQL entre comillas (las columnas llevan acentos y espacios)."""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def _valor_sql(value):
+    """Escalar de pandas/NumPy como valor admitido por ``sqlite3``."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (np.generic, pd.Timestamp)) or hasattr(value, "isoformat"):
+        value = _json_default(value)
+    return value
+
+
+class SQLiteStore:
+    """Matriz en una base SQLite con escrituras por fila.
+
+    Mismos parámetros que ``JournalStore`` (*path* es el archivo ``.db``);
+    ``compact_every`` y ``fsync`` se aceptan por compatibilidad. Sin
+    ``unique_key`` no se crea índice único.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        columns: list[str],
+        dtypes: dict[str, str] | None = None,
+        compact_every: int = 0,
+        fsync: bool = True,
+        index_columns: list[str] | None = None,
+        unique_key: tuple[str, ...] | None = None,
+        kpi: KpiSpec | None = None,
+        text_columns: list[str] | None = None,
+        historial: bool = False,
+        plazos: PlazoSpec | None = None,
+        timeout: float = 30.0,
+    ) -> None:
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.dtypes = {c: "text" for c in self.columns}
+        self.dtypes.update(dtypes or {})
+        self.dtypes[ID_COL] = "int"
+        self.dtypes[VER_COL] = "int"
+        self.fsync = fsync
+        self.timeout = timeout
+        self.index_columns = list(index_columns or [])
+        self.unique_key = tuple(unique_key or ())
+        self.kpi_spec = kpi
+        self.text_columns = list(dict.fromkeys(text_columns or []))
+        self.plazos_spec = plazos
+        self.historia = None
+        if historial:
+            from servqual_historia import Historial
+
+            self.historia = Historial(self.path, self.columns, self.dtypes, fsync=fsync)
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._cache: pd.DataFrame | None = None
+        self._cache_version: int | None = None
+        self._crear_esquema()
+
+    # ---------------------------------------------------------
+    # Conexión y esquema
+    # ---------------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            conn.create_function("servqual_vence", 2, dia_limite, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def _crear_esquema(self) -> None:
+        cols = ", ".join(
+            f"{_q(c)} {_TIPOS_SQL.get(self.dtypes[c], 'TEXT')}" for c in self.columns
+        )
+        sql = [
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ({_q(ID_COL)} INTEGER PRIMARY KEY AUTOINCREMENT, {cols}, "
+            f"{_q(VER_COL)} INTEGER NOT NULL DEFAULT 0)",
+            "CREATE TABLE IF NOT EXISTS _meta (version INTEGER NOT NULL)",
+            "INSERT INTO _meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM _meta)",
+            f"CREATE TABLE IF NOT EXISTS _bajas ({_q(ID_COL)} INTEGER PRIMARY KEY, {_q(VER_COL)} INTEGER NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS ix__bajas_ver ON _bajas ({_q(VER_COL)})",
+        ]
+        if self.unique_key:
+            sql.append(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{TABLE}_clave ON {TABLE} "
+                f"({', '.join(_q(c) for c in self.unique_key)})"
+            )
+        for i, col in enumerate(dict.fromkeys(self.index_columns)):
+            sql.append(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_{i} ON {TABLE} ({_q(col)})")
+        with self._tx(bump=False) as conn:
+            for s in sql:
+                conn.execute(s)
+            if "bajas_desde" not in [r[1] for r in conn.execute("PRAGMA table_info(_meta)")]:
+                conn.execute("ALTER TABLE _meta ADD COLUMN bajas_desde INTEGER NOT NULL DEFAULT 0")
+            if VER_COL not in [r[1] for r in conn.execute(f"PRAGMA table_info({TABLE})")]:
+                # base anterior a las revisiones: sus filas quedan en la versión 0
+                conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {_q(VER_COL)} INTEGER NOT NULL DEFAULT 0")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_ver ON {TABLE} ({_q(VER_COL)})")
+            if self.kpi_spec is not None:
+                self._crear_kpi(conn)
+            if self.text_columns:
+                self._crear_texto(conn)
+            if self.plazos_spec is not None:
+                self._crear_plazos(conn)
+
+    def _crear_kpi(self, conn: sqlite3.Connection) -> None:
+        """Tabla ``_kpi`` de celdas de conteo + triggers que la mantienen.
+
+        Las claves nulas se guardan como ``''`` (las claves de una tabla SQLite
+        no pueden agrupar nulos). Si la tabla es nueva se llena con un único
+        ``GROUP BY`` sobre las filas existentes.
+        """
+        spec = self.kpi_spec
+        claves = list(spec.claves) + [spec.fecha]
+        cols = ", ".join(_q(c) for c in claves)
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_kpi'"
+        ).fetchone()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS _kpi ({', '.join(f'{_q(c)} TEXT NOT NULL' for c in claves)}, "
+            f"filas INTEGER NOT NULL, suma REAL NOT NULL, PRIMARY KEY ({cols}))"
+        )
+
+        def valores(fila: str) -> str:
+            return ", ".join(f"COALESCE({fila}.{_q(c)}, '')" for c in claves)
+
+        def donde(fila: str) -> str:
+            return " AND ".join(f"{_q(c)} = COALESCE({fila}.{_q(c)}, '')" for c in claves)
+
+        avance = _q(spec.avance)
+        sumar = (
+            f"INSERT INTO _kpi ({cols}, filas, suma) VALUES ({valores('NEW')}, 1, COALESCE(NEW.{avance}, 0)) "
+            f"ON CONFLICT ({cols}) DO UPDATE SET filas = filas + 1, suma = suma + excluded.suma;"
+        )
+        restar = (
+            f"UPDATE _kpi SET filas = filas - 1, suma = suma - COALESCE(OLD.{avance}, 0) WHERE {donde('OLD')}; "
+            f"DELETE FROM _kpi WHERE filas = 0 AND {donde('OLD')};"
+        )
+        columnas = ", ".join(_q(c) for c in spec.columnas)
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS kpi_ins AFTER INSERT ON {TABLE} BEGIN {sumar} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS kpi_del AFTER DELETE ON {TABLE} BEGIN {restar} END")
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS kpi_upd AFTER UPDATE OF {columnas} ON {TABLE} BEGIN {restar} {sumar} END"
+        )
+        if not existe:
+            conn.execute(
+                f"INSERT INTO _kpi ({cols}, filas, suma) "
+                f"SELECT {', '.join(f'COALESCE({_q(c)}, {chr(39) * 2})' for c in claves)}, "
+                f"COUNT(*), SUM(COALESCE({avance}, 0)) FROM {TABLE} GROUP BY {', '.join(str(i + 1) for i in range(len(claves)))}"
+            )
+
+    def _crear_texto(self, conn: sqlite3.Connection) -> None:
+        """Tabla FTS5 ``_texto`` sobre ``text_columns`` + triggers que la mantienen.
+
+        Es de contenido externo (no duplica el texto, lo lee de la tabla). Si no
+        existía, o indexaba otras columnas, se rearma desde las filas actuales.
+        """
+        actuales = [r[1] for r in conn.execute("PRAGMA table_info(_texto)")]
+        if actuales == self.text_columns:
+            return
+        for nombre in ("texto_ins", "texto_del", "texto_upd"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+        conn.execute("DROP TABLE IF EXISTS _texto")
+        cols = ", ".join(_q(c) for c in self.text_columns)
+        conn.execute(
+            f"CREATE VIRTUAL TABLE _texto USING fts5({cols}, content={_q(TABLE)}, "
+            f"content_rowid={_q(ID_COL)}, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+        def fila(alias: str) -> str:
+            return ", ".join(f"{alias}.{_q(c)}" for c in self.text_columns)
+
+        alta = f"INSERT INTO _texto (rowid, {cols}) VALUES (NEW.{_q(ID_COL)}, {fila('NEW')});"
+        baja = (
+            f"INSERT INTO _texto (_texto, rowid, {cols}) "
+            f"VALUES ('delete', OLD.{_q(ID_COL)}, {fila('OLD')});"
+        )
+        conn.execute(f"CREATE TRIGGER texto_ins AFTER INSERT ON {TABLE} BEGIN {alta} END")
+        conn.execute(f"CREATE TRIGGER texto_del AFTER DELETE ON {TABLE} BEGIN {baja} END")
+        conn.execute(f"CREATE TRIGGER texto_upd AFTER UPDATE OF {cols} ON {TABLE} BEGIN {baja} {alta} END")
+        conn.execute("INSERT INTO _texto (_texto) VALUES ('rebuild')")
+
+    def _crear_plazos(self, conn: sqlite3.Connection) -> None:
+        """Tabla ``_plazos`` (fecha límite de las filas abiertas) + triggers.
+
+        Si la tabla es nueva se llena desde las filas existentes.
+        """
+        spec = self.plazos_spec
+        grupos = ", ".join(_q(c) for c in spec.grupos)
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_plazos'"
+        ).fetchone()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS _plazos ({_q(ID_COL)} INTEGER PRIMARY KEY, dia INTEGER NOT NULL, "
+            f"{', '.join(f'{_q(c)} TEXT' for c in spec.grupos)})"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix__plazos_dia ON _plazos (dia)")
+        for i, col in enumerate(spec.grupos):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix__plazos_{i} ON _plazos ({_q(col)}, dia)")
+
+        cerrados = ", ".join("'" + c.replace("'", "''") + "'" for c in spec.cerrados) or "NULL"
+
+        def abiertas(fila: str, desde: str = "") -> str:
+            return (
+                f"INSERT INTO _plazos ({_q(ID_COL)}, dia, {grupos}) SELECT * FROM ("
+                f"SELECT {fila}{_q(ID_COL)}, servqual_vence({fila}{_q(spec.fecha)}, {fila}{_q(spec.plazo)}) AS dia, "
+                f"{', '.join(f'{fila}{_q(c)}' for c in spec.grupos)}{desde}"
+                f" WHERE COALESCE({fila}{_q(spec.estado)}, '') NOT IN ({cerrados})) WHERE dia IS NOT NULL"
+            )
+
+        baja = f"DELETE FROM _plazos WHERE {_q(ID_COL)} = OLD.{_q(ID_COL)};"
+        columnas = ", ".join(_q(c) for c in spec.columnas)
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS plazos_ins AFTER INSERT ON {TABLE} BEGIN {abiertas('NEW.')}; END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS plazos_del AFTER DELETE ON {TABLE} BEGIN {baja} END")
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS plazos_upd AFTER UPDATE OF {columnas} ON {TABLE} "
+            f"BEGIN {baja} {abiertas('NEW.')}; END"
+        )
+        if not existe:
+            conn.execute(abiertas("", f" FROM {TABLE}"))
+
+    @contextmanager
+    def _tx(self, bump: bool = True):
+        """Transacción de escritura (``BEGIN IMMEDIATE``); incrementa la versión.
+
+        Dentro de otra transacción (p. ej. en :meth:`save`) se anida como
+        ``SAVEPOINT``: si falla se deshace solo esa parte.
+        """
+        conn = self._conn()
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT anidada")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO anidada")
+                conn.execute("RELEASE anidada")
+                raise
+            conn.execute("RELEASE anidada")
+            return
+        if self.historia is not None and bump and not self.historia.iniciado:
+            self.historia.iniciar(self.frame())  # corte inicial, antes del primer delta
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.historia = []
+        if bump:  # revisión de esta transacción (con el bloqueo de escritura tomado)
+            self._local.rev = self.version + 1
+        try:
+            yield conn
+            if bump:
+                conn.execute("UPDATE _meta SET version = version + 1")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            pendientes, self._local.historia = self._local.historia, []
+        for registrar in pendientes:
+            registrar()
+
+    def _historiar(self, metodo: str, *args) -> None:
+        """Deja un registro de historial para cuando confirme la transacción."""
+        if self.historia is not None:
+            self._local.historia.append(lambda: getattr(self.historia, metodo)(*args))
+
+    def _fila_sql(self, row: dict) -> list:
+        valores = []
+        for c in self.columns:
+            v = _valor_sql(row.get(c))
+            if v is None and c in self.unique_key:
+                v = ""  # la clave trata los nulos como "" (igual que KeyIndex)
+            valores.append(v)
+        return valores
+
+    def _tipar(self, df: pd.DataFrame) -> pd.DataFrame:
+        return coerce_frame(df.reindex(columns=[ID_COL] + self.columns + [VER_COL]), self.dtypes)
+
+    def _leer(self, where: str = "", params: Iterable = ()) -> pd.DataFrame:
+        sql = f"SELECT * FROM {TABLE}{where} ORDER BY {_q(ID_COL)}"
+        return self._tipar(pd.read_sql_query(sql, self._conn(), params=list(params)))
+
+    # ---------------------------------------------------------
+    # Lectura
+    # ---------------------------------------------------------
+    @property
+    def version(self) -> int:
+        return int(self._conn().execute("SELECT version FROM _meta").fetchone()[0])
+
+    @property
+    def revision(self) -> int:
+        """Última escritura confirmada (el contador de ``_meta``)."""
+        return self.version
+
+    def load(self) -> pd.DataFrame:
+        """Lee la tabla completa y devuelve una copia."""
+        with self._lock:
+            self._cache = None
+            df = self.frame()
+            return con_revision(df.copy(), self._cache_version)
+
+    def refresh(self) -> bool:
+        """Descarta la copia en memoria si alguien escribió; ``True`` si cambió."""
+        with self._lock:
+            if self._cache is not None and self._cache_version == self.version:
+                return False
+            self._cache = None
+            return True
+
+    def frame(self) -> pd.DataFrame:
+        """Matriz completa en memoria, releída solo si cambió la versión."""
+        with self._lock:
+            version = self.version
+            if self._cache is None or self._cache_version != version:
+                self._cache = self._leer()
+                self._cache_version = version
+            return self._cache
+
+    def shared(self) -> pd.DataFrame:
+        """Vista compartida (copia superficial; con Copy-on-Write no se altera)."""
+        with self._lock:
+            df = self.frame()
+            return con_revision(df.copy(deep=False), self._cache_version)
+
+    def filter(self, filters: dict, q: str | None = None) -> pd.DataFrame:
+        """Filas que cumplen ``columna -> valor`` (``None`` = sin filtro) y la
+        búsqueda *q* (``MATCH`` sobre ``_texto``), vía ``WHERE``."""
+        where, params = self._where(filters, q)
+        if not where:
+            return self.shared()
+        return self._leer(where, params)
+
+    def _where(self, filters: dict, q: str | None = None) -> tuple[str, list]:
+        activos = {c: v for c, v in filters.items() if v is not None}
+        for col in activos:
+            if col not in self.columns:
+                raise KeyError(f"Columna desconocida: {col!r}")
+        condiciones = [f"{_q(c)} = ?" for c in activos]
+        params = [_valor_sql(v) for v in activos.values()]
+        if q:
+            if not self.text_columns:
+                raise ValueError("El almacén no tiene columnas de texto (text_columns) para buscar")
+            palabras = tokens(q)
+            if palabras:
+                # cada palabra como prefijo entre comillas; FTS5 las une con AND
+                condiciones.append(f"{_q(ID_COL)} IN (SELECT rowid FROM _texto WHERE _texto MATCH ?)")
+                params.append(" ".join(f'"{p}"*' for p in palabras))
+        if not condiciones:
+            return "", []
+        return " WHERE " + " AND ".join(condiciones), params
+
+    def page(
+        self,
+        filters: dict | None = None,
+        offset: int = 0,
+        limit: int = 50,
+        sort: str | None = None,
+        descending: bool = False,
+        q: str | None = None,
+    ) -> tuple[pd.DataFrame, int]:
+        """Una página ``(filas, total)`` con ``ORDER BY ... LIMIT/OFFSET`` en SQL."""
+        where, params = self._where(filters or {}, q)
+        if sort is not None and sort not in self.columns + [ID_COL]:
+            raise KeyError(f"Columna desconocida: {sort!r}")
+        sentido = " DESC" if descending else ""
+        orden = f"{_q(ID_COL)}{sentido}"
+        if sort is not None and sort != ID_COL:
+            orden = f"{_q(sort)} IS NULL{sentido}, {_q(sort)}{sentido}, {orden}"
+        conn = self._conn()
+        total = int(conn.execute(f"SELECT COUNT(*) FROM {TABLE}{where}", params).fetchone()[0])
+        sql = f"SELECT * FROM {TABLE}{where} ORDER BY {orden} LIMIT ? OFFSET ?"
+        df = pd.read_sql_query(sql, conn, params=params + [int(limit), max(0, int(offset))])
+        return self._tipar(df), total
+
+    def kpi_cells(self) -> pd.DataFrame:
+        """Celdas de conteo de los indicadores (tabla ``_kpi``, ver ``servqual_kpi``)."""
+        if self.kpi_spec is None:
+            raise ValueError("El almacén no tiene indicadores configurados")
+        spec = self.kpi_spec
+        df = pd.read_sql_query("SELECT * FROM _kpi", self._conn())
+        if df.empty:
+            return celdas_vacias(spec)
+        df = df.rename(columns={spec.fecha: FECHA, "filas": FILAS, "suma": SUMA})
+        df[FECHA] = pd.to_datetime(df[FECHA].replace("", None), errors="coerce")
+        return df[list(spec.claves) + [FECHA, FILAS, SUMA]]
+
+    def vencimientos(self, hasta, filters: dict | None = None) -> pd.DataFrame:
+        """Filas abiertas que vencen hasta *hasta* (``_plazos`` por su índice
+        (grupo, día)), de la más atrasada a la más lejana, con ``Vencimiento``."""
+        spec = self.plazos_spec
+        if spec is None:
+            raise ValueError("El almacén no tiene plazos configurados")
+        activos = {c: v for c, v in (filters or {}).items() if v is not None}
+        for col in activos:
+            if col not in spec.grupos:
+                raise KeyError(f"Columna sin índice de plazos: {col!r}")
+        condiciones = ["p.dia <= ?"] + [f"p.{_q(c)} = ?" for c in activos]
+        params = [_dia(hasta)] + [_valor_sql(v) for v in activos.values()]
+        sql = (
+            f"SELECT t.*, p.dia AS _dia_limite FROM _plazos p JOIN {TABLE} t "
+            f"ON t.{_q(ID_COL)} = p.{_q(ID_COL)} WHERE {' AND '.join(condiciones)} "
+            f"ORDER BY p.dia, p.{_q(ID_COL)}"
+        )
+        df = pd.read_sql_query(sql, self._conn(), params=params)
+        dias = pd.to_numeric(df.pop("_dia_limite")).to_numpy(dtype="int64")
+        df = self._tipar(df)
+        df[VENCIMIENTO] = pd.to_datetime(dias, unit="D")
+        return df
+
+    def get_rows(self, ids) -> pd.DataFrame:
+        """Filas con los ``_id`` indicados (los inexistentes se omiten)."""
+        ids = [int(i) for i in ids]
+        partes = [
+            self._leer(f" WHERE {_q(ID_COL)} IN ({','.join('?' * len(lote))})", lote)
+            for lote in (ids[i : i + _LOTE] for i in range(0, len(ids), _LOTE))
+        ]
+        if not partes:
+            return self._leer(" WHERE 0")
+        return partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+
+    def _claves(self, rows: pd.DataFrame) -> list[tuple]:
+        partes = [
+            rows[c].astype(object).where(rows[c].notna(), "").astype(str).tolist()
+            for c in self.unique_key
+        ]
+        return list(zip(*partes))
+
+    def _existentes(self, conn: sqlite3.Connection, claves: list[tuple]) -> set[tuple]:
+        """Cuáles de *claves* ya están en la tabla (usa el índice único)."""
+        primera = sorted({k[0] for k in claves})
+        cols = ", ".join(_q(c) for c in self.unique_key)
+        existentes: set[tuple] = set()
+        for i in range(0, len(primera), _LOTE):
+            lote = primera[i : i + _LOTE]
+            sql = f"SELECT {cols} FROM {TABLE} WHERE {_q(self.unique_key[0])} IN ({','.join('?' * len(lote))})"
+            existentes.update(tuple(str(v) for v in r) for r in conn.execute(sql, lote))
+        return existentes
+
+    def has_keys(self, rows: pd.DataFrame) -> np.ndarray:
+        """Máscara de las filas de *rows* cuya clave única ya existe."""
+        if not self.unique_key:
+            raise ValueError("El almacén no tiene clave única")
+        claves = self._claves(rows)
+        existentes = self._existentes(self._conn(), claves)
+        return np.fromiter((k in existentes for k in claves), dtype=bool, count=len(claves))
+
+    # ---------------------------------------------------------
+    # Escritura (por fila)
+    # ---------------------------------------------------------
+    def insert(self, rows: pd.DataFrame, skip_duplicates: bool = False) -> pd.DataFrame:
+        """Inserta filas nuevas en una transacción (un ``executemany``); devuelve
+        las insertadas con ``_id``.
+
+        Si alguna repite la clave única se lanza :class:`DuplicateKeyError`
+        sin insertar nada, salvo con *skip_duplicates*: esas filas se omiten.
+        Las claves se comprueban antes de insertar, con la transacción de
+        escritura ya tomada.
+        """
+        rows = coerce_frame(rows.reindex(columns=self.columns).reset_index(drop=True), self.dtypes)
+        cols = ", ".join(_q(c) for c in self.columns + [VER_COL])
+        sql = f"INSERT INTO {TABLE} ({cols}) VALUES ({', '.join('?' * (len(self.columns) + 1))})"
+        with self._lock, self._tx() as conn:
+            rev = self._local.rev
+            if self.unique_key and len(rows):
+                claves = self._claves(rows)
+                existentes = self._existentes(conn, claves)
+                dup = np.fromiter((k in existentes for k in claves), dtype=bool, count=len(claves))
+                dup |= pd.Series(claves, dtype=object).duplicated().to_numpy()
+                if dup.any():
+                    if not skip_duplicates:
+                        raise DuplicateKeyError([k for k, d in zip(claves, dup) if d])
+                    rows = rows[~dup].reset_index(drop=True)
+            # AUTOINCREMENT con la escritura tomada: los _id nuevos son consecutivos
+            ultimo = conn.execute(
+                f"SELECT max(coalesce((SELECT seq FROM sqlite_sequence WHERE name = ?), 0), "
+                f"coalesce((SELECT max({_q(ID_COL)}) FROM {TABLE}), 0))",
+                [TABLE],
+            ).fetchone()[0]
+            conn.executemany(sql, (self._fila_sql(_limpiar(r)) + [rev] for r in rows.to_dict("records")))
+            rows.insert(0, ID_COL, np.arange(ultimo + 1, ultimo + 1 + len(rows), dtype="int64"))
+            rows[VER_COL] = np.full(len(rows), rev, dtype="int64")
+            if len(rows):
+                self._historiar("altas", rows)
+        return rows
+
+    def update(self, row_id: int, values: dict, version: int | None = None, base: dict | None = None) -> int:
+        """``UPDATE`` de las columnas indicadas de una fila por ``_id``; devuelve
+        su nueva versión. *version* y *base* como en ``JournalStore.update``
+        (la comparación se hace dentro de la transacción)."""
+        values = {k: v for k, v in _limpiar(values).items() if k in self.columns}
+        if not values and version is None:
+            actual = self.get_rows([row_id])
+            if actual.empty:
+                raise KeyError(row_id)
+            return int(actual[VER_COL].iloc[0])
+        with self._lock:
+            try:
+                with self._tx() as conn:
+                    antes = None
+                    if version is not None or self.historia is not None:
+                        antes = self.get_rows([row_id])
+                        if antes.empty and version is not None:
+                            raise ConflictError([row_id])  # la dio de baja otra sesión
+                    if version is not None and int(antes[VER_COL].iloc[0]) != int(version):
+                        if base is None:
+                            raise ConflictError([row_id])
+                        values = fusionar(row_id, antes.iloc[0].to_dict(), base, values, self.dtypes)
+                    if not values:  # todo lo editado ya estaba así
+                        return int(antes[VER_COL].iloc[0])
+                    rev = self._local.rev
+                    asignaciones = ", ".join(f"{_q(k)} = ?" for k in values)
+                    sql = f"UPDATE {TABLE} SET {asignaciones}, {_q(VER_COL)} = ? WHERE {_q(ID_COL)} = ?"
+                    fila = self._fila_sql(values)
+                    posiciones = [self.columns.index(k) for k in values]
+                    cur = conn.execute(sql, [fila[p] for p in posiciones] + [rev, int(row_id)])
+                    if cur.rowcount == 0:
+                        raise KeyError(row_id)
+                    if self.historia is not None:
+                        despues = {k: coerce_value(v, self.dtypes.get(k, "text")) for k, v in values.items()}
+                        self._historiar("ediciones", int(row_id), antes.iloc[0].to_dict(), despues)
+                    return rev
+            except sqlite3.IntegrityError:
+                clave = {**self.get_rows([row_id]).iloc[0].to_dict(), **values}
+                raise DuplicateKeyError([tuple(str(clave.get(c) or "") for c in self.unique_key)]) from None
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """``DELETE`` por ``_id``; devuelve cuántas filas existían."""
+        ids = sorted({int(i) for i in ids})
+        borradas = 0
+        with self._lock, self._tx() as conn:
+            if self.historia is not None and ids:
+                self._historiar("bajas", self.get_rows(ids))
+            for i in range(0, len(ids), _LOTE):
+                lote = ids[i : i + _LOTE]
+                marcas = ",".join("?" * len(lote))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO _bajas ({_q(ID_COL)}, {_q(VER_COL)}) "
+                    f"SELECT {_q(ID_COL)}, ? FROM {TABLE} WHERE {_q(ID_COL)} IN ({marcas})",
+                    [self._local.rev] + lote,
+                )
+                cur = conn.execute(f"DELETE FROM {TABLE} WHERE {_q(ID_COL)} IN ({marcas})", lote)
+                borradas += cur.rowcount
+            if borradas:
+                self._podar_bajas(conn)
+        return borradas
+
+    def _podar_bajas(self, conn: sqlite3.Connection) -> None:
+        """Deja en ``_bajas`` solo las ``MAX_BAJAS`` más recientes (por el índice
+        de ``_ver``); ``bajas_desde`` pasa a la revisión más nueva descartada."""
+        corte = conn.execute(
+            f"SELECT {_q(VER_COL)} FROM _bajas ORDER BY {_q(VER_COL)} DESC LIMIT 1 OFFSET ?", [MAX_BAJAS]
+        ).fetchone()
+        if corte is None:
+            return
+        conn.execute("UPDATE _meta SET bajas_desde = max(bajas_desde, ?)", [corte[0]])
+        conn.execute(f"DELETE FROM _bajas WHERE {_q(VER_COL)} <= ?", [corte[0]])
+
+    def save(self, df: pd.DataFrame, desde: int | None = None) -> None:
+        """Persiste *df* escribiendo solo las diferencias, en una única transacción.
+
+        Mismo contrato que ``JournalStore.save``: los ``_id`` asignados a las
+        filas nuevas se escriben en *df* (in situ) y *desde* (por defecto
+        ``df.attrs["revision"]``) evita pisar o borrar filas escritas después.
+        """
+        desde = df.attrs.get(REVISION) if desde is None else desde
+        with self._lock:
+            with self._tx():
+                previa = self.version
+                ids, conocidos, borrados, cambios = diferencias(self.frame(), df, self.columns, self.dtypes)
+                borrados = vigentes(self.frame(), df, cambios, borrados, desde)
+                if borrados:
+                    self.delete(borrados)
+                for rid, valores in cambios:
+                    self.update(rid, valores)
+                if (~conocidos).any():
+                    nuevos = self.insert(df.loc[~conocidos, self.columns])
+                    asignar_ids(df, ids, conocidos, nuevos[ID_COL].to_numpy())
+            if desde is not None and previa == desde:
+                con_revision(df, self.version)
+
+    def cambios(self, desde: int) -> Delta:
+        """Lo escrito después de la revisión *desde* (ver ``JournalStore.cambios``):
+        filas por el índice de ``_ver`` y bajas por el de ``_bajas``, leídas en
+        una misma transacción de lectura."""
+        conn = self._conn()
+        with self._lock:
+            propia = not conn.in_transaction
+            if propia:
+                conn.execute("BEGIN")
+            try:
+                revision, bajas_desde = conn.execute("SELECT version, bajas_desde FROM _meta").fetchone()
+                if desde <= 0 or desde < bajas_desde or desde > revision:
+                    return Delta(revision, self._leer(), [], True)
+                filas = self._leer(f" WHERE {_q(VER_COL)} > ?", [int(desde)])
+                borradas = [
+                    int(r[0])
+                    for r in conn.execute(
+                        f"SELECT {_q(ID_COL)} FROM _bajas WHERE {_q(VER_COL)} > ? ORDER BY 1", [int(desde)]
+                    )
+                ]
+                return Delta(revision, filas, borradas, False)
+            finally:
+                if propia:
+                    conn.execute("COMMIT")
+
+    def compact(self) -> None:
+        """Vuelca el WAL a la base (``wal_checkpoint(TRUNCATE)``)."""
+        self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        """Cierra la conexión del hilo actual."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
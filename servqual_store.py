@@ -0,0 +1,1377 @@
+"""
+Motor de almacenamiento con bitácora (journal) de solo-anexar.
+
+La matriz se persiste como una *instantánea* binaria columnar (``.sqcol``, ver
+``servqual_snapshot``) más una bitácora de cambios ``<archivo>.journal`` con un
+registro JSON por línea:
+
+    {"op": "ins", "id": 7, "v": 41, "row": {...fila completa...}}
+    {"op": "upd", "id": 7, "v": 42, "row": {"Estado": "Completado"}}
+    {"op": "del", "id": 7, "v": 43}
+    {"op": "lote", "v": 44, "del": [3], "upd": [[7, {...}]], "ins": [[9, {...}]]}
+
+Un guardado completo (:meth:`JournalStore.save`) es un solo registro ``lote``
+con una sola revisión: al reproducirlo se aplica entero o, si la línea quedó
+cortada, nada.
+
+Cada fila lleva un identificador estable (columna ``_id``) asignado de forma
+monótona por el almacén. Guardar una fila cuesta un ``append`` + ``fsync`` a la
+bitácora (E/S O(1)); cada ``compact_every`` registros la bitácora se compacta en
+una instantánea nueva que se escribe en un archivo temporal y se publica con
+``os.replace`` (renombrado atómico). Así, un corte a mitad de escritura nunca
+deja la matriz a medias: a lo sumo se pierde la última línea incompleta de la
+bitácora, que se descarta al cargar.
+
+La reproducción de la bitácora es idempotente, por lo que un corte entre la
+publicación de la instantánea y el vaciado de la bitácora tampoco corrompe datos.
+
+El CSV original queda como formato de importación: si aún no existe la
+instantánea ``.sqcol`` se lee el CSV (con o sin columna ``_id``).
+
+Hay un único almacén por archivo y por proceso (:func:`get_store`): todas las
+sesiones de Streamlit comparten el mismo DataFrame en memoria
+(:meth:`JournalStore.shared`), que solo se recarga cuando cambian el tamaño o la
+fecha de modificación de los archivos. Si lo que creció fue únicamente la
+bitácora (otro proceso anexó cambios) se aplica solo la parte nueva, con los
+mismos ganchos de índices que las escrituras locales. Las ediciones escriben en
+su lugar sobre la matriz interna, que es del almacén: las sesiones reciben
+vistas (Copy-on-Write de pandas) y un bloque solo se copia si alguna de ellas
+aún conserva la versión anterior.
+
+Opcionalmente el almacén mantiene un índice de filtros
+(``servqual_index.FilterIndex``) sobre ``index_columns``, actualizado en cada
+alta, edición y baja; :meth:`JournalStore.filter` lo usa para devolver solo las
+filas que cumplen los filtros sin recorrer ni copiar la matriz completa.
+Con ``text_columns`` mantiene también la búsqueda libre
+(``servqual_index.TextIndex``, sin tildes ni mayúsculas) que ``filter`` y
+``page`` combinan con esos filtros mediante el argumento ``q``.
+
+Las bajas no reacomodan la matriz: cada fila ocupa una *ranura* fija (la matriz
+interna está ordenada por ``_id``, así que ``_id -> ranura`` se resuelve con
+búsqueda binaria) y borrar solo la marca como lápida. Las lápidas se purgan de
+forma diferida, cuando son muchas o al compactar. Las ediciones escriben cada
+columna tocada con una asignación posicional sobre sus ranuras.
+
+Si se indica ``unique_key`` (p. ej. ``("Código", "Sucursal")``), el almacén
+garantiza una fila por clave con un índice hash (``servqual_index.KeyIndex``)
+que se reconstruye al cargar y se actualiza en cada cambio: las altas y
+ediciones que duplicarían una clave se rechazan con :class:`DuplicateKeyError`.
+
+Con ``kpi`` (``servqual_kpi.KpiSpec``) el almacén mantiene además las celdas de
+conteo de los indicadores de avance, también de forma incremental. Con
+``plazos`` (``servqual_plazos.PlazoSpec``), el índice de fechas límite
+(``servqual_plazos.Vencimientos``) que :meth:`JournalStore.vencimientos`
+consulta sin recorrer la matriz.
+
+Con ``historial=True`` cada cambio queda además como delta en
+``servqual_historia.Historial`` (la bitácora se vacía al compactar; el
+historial no), que permite reconstruir la matriz a cualquier fecha.
+
+Cada escritura (un alta en lote, una edición, una baja en lote) recibe el
+siguiente número de *revisión* del almacén (``"v"``), que persiste en la
+instantánea y es común a todos los procesos. Cada fila guarda en ``_ver`` la
+revisión de su última escritura, y las bajas recientes se recuerdan con la
+suya. Con eso:
+
+- :meth:`JournalStore.update` con ``version=`` es un *compare-and-swap*: si la
+  fila cambió desde esa versión se rechaza con :class:`ConflictError` o, con
+  ``base=`` (la fila tal como se leyó), se fusiona por columnas: se escriben
+  solo las columnas que la edición cambió y hay conflicto únicamente si alguna
+  de ellas también cambió en la fila actual (:func:`fusionar`).
+- :meth:`JournalStore.save` no pisa filas escritas después de la revisión en
+  que se leyó el DataFrame (``df.attrs["revision"]``, que ponen ``load`` y
+  ``shared``).
+- :meth:`JournalStore.cambios` devuelve solo lo escrito desde una revisión
+  (:class:`Delta`), para que una sesión se ponga al día sin recargar la matriz
+  (:func:`aplicar_cambios`).
+
+Varios procesos pueden escribir la misma matriz (p. ej. la app y los trabajos
+de ``servqual_cli``): cada escritura toma un bloqueo exclusivo sobre
+``<archivo>.lock`` y, antes de escribir, aplica lo que los demás anexaron, así
+que ``_id``, claves únicas e índices se validan contra el estado del disco.
+Las lecturas de disco toman el mismo bloqueo en modo compartido para no ver
+una compactación a medias.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import servqual_metricas
+from servqual_index import FilterIndex, KeyIndex, TextIndex
+from servqual_kpi import KpiCells, KpiSpec, _dia
+from servqual_plazos import VENCIMIENTO, PlazoSpec, Vencimientos
+from servqual_snapshot import (
+    coerce_frame,
+    coerce_value,
+    concat_typed,
+    ensure_category,
+    read_columnar,
+    write_columnar,
+)
+
+try:  # bloqueo de archivos entre procesos
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+ID_COL = "_id"
+VER_COL = "_ver"  # revisión de la última escritura de la fila
+REVISION = "revision"  # clave de ``df.attrs``: revisión en que se leyó la matriz
+MAX_BAJAS = 10_000  # bajas que la instantánea recuerda para ``cambios``
+
+# Copy-on-Write: las sesiones comparten el DataFrame sin copiarlo (pandas >= 3
+# lo trae siempre activado; en pandas 2.x hay que encenderlo).
+if int(pd.__version__.split(".")[0]) < 3:  # pragma: no cover - depende de la versión
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _json_default(value):
+    """Serializa escalares de NumPy/pandas y fechas para la bitácora."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp) and value == value.normalize():
+        return value.date().isoformat()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _limpiar(row: dict) -> dict:
+    """Convierte NaN/NA en ``None`` para que la línea JSON sea válida."""
+    limpio = {}
+    for k, v in row.items():
+        if v is None or v is pd.NA or v is pd.NaT:
+            limpio[k] = None
+        elif isinstance(v, float) and math.isnan(v):
+            limpio[k] = None
+        else:
+            limpio[k] = v
+    return limpio
+
+
+def _abrir_lote(rec: dict) -> list[dict]:
+    """Registros ``del``/``upd``/``ins`` de un ``lote``, todos con su revisión."""
+    v = rec["v"]
+    return (
+        [{"op": "del", "id": rid, "v": v} for rid in rec.get("del", ())]
+        + [{"op": "upd", "id": rid, "v": v, "row": row} for rid, row in rec.get("upd", ())]
+        + [{"op": "ins", "id": rid, "v": v, "row": row} for rid, row in rec.get("ins", ())]
+    )
+
+
+def _fsync_dir(path: Path) -> None:
+    """Persiste la entrada de directorio tras un ``os.replace`` (POSIX)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # pragma: no cover - p. ej. Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:  # pragma: no cover
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def bloqueo_archivo(path: Path, compartido: bool = False):
+    """Bloqueo consultivo entre procesos sobre *path* (se crea si no existe).
+
+    Espera hasta obtenerlo. Con *compartido* varios lectores lo tienen a la
+    vez (en Windows siempre es exclusivo).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_SH if compartido else fcntl.LOCK_EX)
+        else:  # pragma: no cover - Windows
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:  # pragma: no cover - Windows
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class DuplicateKeyError(ValueError):
+    """Una alta o edición repetiría una clave única ya existente."""
+
+    def __init__(self, keys: list[tuple]) -> None:
+        self.keys = keys
+        muestra = ", ".join(" / ".join(k) for k in keys[:5])
+        extra = f" (y {len(keys) - 5} más)" if len(keys) > 5 else ""
+        super().__init__(f"Clave duplicada: {muestra}{extra}")
+
+
+class ConflictError(ValueError):
+    """Otra sesión o proceso escribió las filas desde la versión que se editó."""
+
+    def __init__(self, ids: list[int], columnas: list[str] | None = None) -> None:
+        self.ids = [int(i) for i in ids]
+        self.columnas = list(columnas or [])
+        muestra = ", ".join(str(i) for i in self.ids[:5])
+        extra = f" (y {len(self.ids) - 5} más)" if len(self.ids) > 5 else ""
+        detalle = f"; columnas: {', '.join(self.columnas)}" if self.columnas else ""
+        super().__init__(f"Fila(s) modificadas por otra sesión: {muestra}{extra}{detalle}")
+
+
+class Delta(NamedTuple):
+    """Lo escrito después de una revisión (ver :meth:`JournalStore.cambios`)."""
+
+    revision: int  # revisión actual: el ``desde`` de la próxima consulta
+    filas: pd.DataFrame  # altas y ediciones (la fila completa, con ``_ver``)
+    borradas: list[int]  # ``_id`` dados de baja
+    completa: bool  # ``filas`` es la matriz entera (``desde`` muy antiguo o 0)
+
+
+class JournalStore:
+    """Instantánea columnar + bitácora de cambios para una matriz de columnas fijas.
+
+    *path* es el CSV de la matriz: la instantánea se guarda junto a él con
+    extensión ``.sqcol`` y la bitácora como ``<path>.journal``. *dtypes* asigna a
+    cada columna un tipo de ``servqual_snapshot`` (``category``, ``text``,
+    ``int``, ``float`` o ``date``); las columnas no listadas son ``text``.
+
+    No requiere Streamlit. Es seguro entre hilos (las sesiones de Streamlit
+    comparten proceso) y entre procesos: las escrituras se serializan con un
+    bloqueo sobre ``<path>.lock`` (ver :meth:`_escritura`).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        columns: list[str],
+        dtypes: dict[str, str] | None = None,
+        compact_every: int = 1000,
+        fsync: bool = True,
+        index_columns: list[str] | None = None,
+        unique_key: tuple[str, ...] | None = None,
+        kpi: KpiSpec | None = None,
+        text_columns: list[str] | None = None,
+        historial: bool = False,
+        plazos: PlazoSpec | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.snapshot = self.path.with_suffix(".sqcol")
+        self.journal = self.path.with_name(self.path.name + ".journal")
+        self.lockfile = self.path.with_name(self.path.name + ".lock")
+        self.columns = list(columns)
+        self.dtypes = {c: "text" for c in self.columns}
+        self.dtypes.update(dtypes or {})
+        self.dtypes[ID_COL] = "int"
+        self.dtypes[VER_COL] = "int"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._bloqueado = False  # este proceso ya tiene el bloqueo de archivo
+        self._df: pd.DataFrame | None = None  # matriz interna (con lápidas), por _id
+        self._dead: np.ndarray | None = None  # máscara de lápidas por ranura
+        self._ndead = 0
+        self._live: pd.DataFrame | None = None  # matriz visible (sin lápidas, con _ver), en caché
+        self._vers = np.zeros(0, dtype=np.int64)  # _ver por ranura (privado: se escribe en su lugar)
+        self._next_id = 1
+        self._pending = 0  # registros en la bitácora desde la última compactación
+        self._offset = 0  # bytes de la bitácora ya aplicados en memoria
+        self._sig: tuple | None = None
+        self.version = 0  # aumenta con cada cambio o recarga (solo en memoria)
+        self.revision = 0  # última escritura confirmada (persistente, entre procesos)
+        self._bajas: dict[int, int] = {}  # _id -> revisión de su baja
+        self._bajas_desde = 0  # antes de esta revisión las bajas pueden estar incompletas
+        self.index_columns = list(index_columns or [])
+        self._index: FilterIndex | None = None  # se construye en la primera consulta
+        self.text_columns = list(text_columns or [])
+        self._texto: TextIndex | None = None  # se construye en la primera búsqueda
+        self.unique_key = tuple(unique_key or ())
+        self._keys: KeyIndex | None = None
+        self._orden: dict[tuple, np.ndarray] = {}  # órdenes de página por versión
+        self.kpi_spec = kpi
+        self._kpi: KpiCells | None = None  # se construye en la primera consulta
+        self.plazos_spec = plazos
+        self._vence: Vencimientos | None = None  # se construye en la primera consulta
+        self.historia = None
+        if historial:
+            from servqual_historia import Historial
+
+            self.historia = Historial(self.path, self.columns, self.dtypes, fsync=fsync)
+
+    # ---------------------------------------------------------
+    # Lectura
+    # ---------------------------------------------------------
+    def _empty(self) -> pd.DataFrame:
+        return coerce_frame(pd.DataFrame(columns=[ID_COL] + self.columns + [VER_COL]), self.dtypes)
+
+    def _read_snapshot(self) -> tuple[pd.DataFrame, dict]:
+        """Devuelve ``(df, meta)`` desde el ``.sqcol`` o, si no existe, el CSV.
+
+        Las matrices anteriores a las revisiones traen ``_ver = 0``.
+        """
+        if self.snapshot.exists():
+            df, meta = read_columnar(self.snapshot)
+        elif not self.path.exists() or self.path.stat().st_size == 0:
+            return self._empty(), {}
+        else:
+            try:
+                df, meta = import_csv(self.path, self.columns, self.dtypes), {}
+            except pd.errors.EmptyDataError:
+                # CSV sin encabezado (solo espacios o saltos de línea)
+                return self._empty(), {}
+        if VER_COL not in df.columns:
+            df[VER_COL] = np.zeros(len(df), dtype="int64")
+        return df, meta
+
+    def _read_journal(self, start: int = 0) -> tuple[list[dict], int]:
+        """Lee la bitácora desde el byte *start*.
+
+        Devuelve ``(registros, fin)``, donde *fin* es el byte siguiente a la
+        última línea completa (cada ``lote`` se abre en sus registros simples). Una última línea sin ``\\n`` (escritura cortada o
+        en curso en otro proceso) se ignora; las líneas ilegibles se saltan.
+        """
+        if not self.journal.exists():
+            return [], 0
+        with open(self.journal, "rb") as fh:
+            fh.seek(start)
+            raw = fh.read()
+        records: list[dict] = []
+        good = 0
+        pos = 0
+        while pos < len(raw):
+            end = raw.find(b"\n", pos)
+            if end == -1:
+                break
+            line = raw[pos:end]
+            pos = good = end + 1
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("op") == "lote":
+                records.extend(_abrir_lote(rec))
+            else:
+                records.append(rec)
+        return records, start + good
+
+    def _signature(self) -> tuple:
+        """(mtime, tamaño) de instantánea, CSV y bitácora."""
+        def stat(p: Path):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                return None
+            return (st.st_mtime_ns, st.st_size)
+
+        return (stat(self.snapshot), stat(self.path), stat(self.journal))
+
+    def _publish(self, df: pd.DataFrame, firmar: bool = True) -> None:
+        """Reemplaza el DataFrame compartido por una versión nueva.
+
+        Con *firmar*, la versión corresponde al disco actual (se llama con
+        el bloqueo de archivo tomado); sin él, solo cambió la memoria.
+        """
+        self._df = df
+        self._live = None
+        self.version += 1
+        if firmar:
+            self._sig = self._signature()
+
+    def _locate(self, ids) -> np.ndarray:
+        """Ranuras de *ids* en la matriz interna (``-1`` si no existe o está borrada).
+
+        La matriz interna está ordenada por ``_id``: O(log N) por id.
+        """
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        base = self._df[ID_COL].to_numpy()
+        if not len(base):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.searchsorted(base, ids)
+        pos[pos >= len(base)] = len(base) - 1
+        ok = base[pos] == ids
+        if self._dead is not None:
+            ok &= ~self._dead[pos]
+        return np.where(ok, pos, -1)
+
+    def _purge(self) -> None:
+        """Elimina físicamente las filas con lápida (reacomoda las ranuras)."""
+        if not self._ndead:
+            return
+        borradas = np.flatnonzero(self._dead)
+        if self._index is not None:
+            self._index.remove(borradas)
+        if self._texto is not None:
+            self._texto.remove(borradas)
+        vivas = ~self._dead
+        df = self._df[vivas].reset_index(drop=True)
+        self._vers = self._vers[vivas]
+        self._dead = None
+        self._ndead = 0
+        self._publish(df, firmar=False)
+
+    def _maybe_purge(self) -> None:
+        if self._ndead > max(1024, len(self._df) // 4):
+            self._purge()
+
+    def _replay(self, df: pd.DataFrame, records: list[dict]) -> pd.DataFrame:
+        """Aplica los registros de la bitácora sobre la instantánea en bloque (al cargar)."""
+        next_id = max(self._next_id, int(df[ID_COL].max()) + 1 if len(df) else 1)
+        if not records:
+            self._next_id = next_id
+            return df
+
+        revision = self.revision
+        # solo los ids que nombra la bitácora, no toda la matriz
+        nombrados = np.unique(np.fromiter((int(r["id"]) for r in records), dtype=np.int64, count=len(records)))
+        en_snapshot = set(nombrados[np.isin(nombrados, df[ID_COL].to_numpy())].tolist())
+        insertados: dict[int, dict] = {}
+        cambios: dict[int, dict] = {}
+        borrados: set[int] = set()
+        for rec in records:
+            op = rec.get("op")
+            rid = int(rec["id"])
+            next_id = max(next_id, rid + 1)
+            # las bitácoras sin revisiones cuentan una por registro
+            v = int(rec.get("v") or revision + 1)
+            revision = max(revision, v)
+            if op == "ins":
+                self._bajas.pop(rid, None)
+                if rid in en_snapshot:
+                    borrados.discard(rid)
+                    cambios[rid] = {**rec["row"], VER_COL: v}
+                else:
+                    insertados[rid] = {**rec["row"], VER_COL: v}
+            elif op == "upd":
+                if rid in insertados:
+                    insertados[rid].update(rec["row"], **{VER_COL: v})
+                elif rid in en_snapshot and rid not in borrados:
+                    cambios.setdefault(rid, {}).update(rec["row"], **{VER_COL: v})
+            elif op == "del":
+                self._bajas[rid] = v
+                insertados.pop(rid, None)
+                cambios.pop(rid, None)
+                if rid in en_snapshot:
+                    borrados.add(rid)
+        self._next_id = next_id
+        self.revision = revision
+
+        if borrados:
+            df = df[~df[ID_COL].isin(borrados)].reset_index(drop=True)
+        if not df[ID_COL].is_monotonic_increasing:
+            df = df.sort_values(ID_COL, kind="stable").reset_index(drop=True)
+        if cambios:
+            upd = pd.DataFrame.from_dict(cambios, orient="index")
+            pos = pd.Index(df[ID_COL]).get_indexer(upd.index)
+            df = df.copy(deep=False)
+            for col in upd.columns:
+                if col not in df.columns:
+                    continue
+                mask = np.array([col in cambios[i] for i in upd.index], dtype=bool)
+                df = self._assign(df, pos[mask], col, upd[col][mask].tolist())
+        if insertados:
+            nuevos = pd.DataFrame.from_dict(insertados, orient="index")
+            nuevos.index.name = ID_COL
+            nuevos = nuevos.reset_index().reindex(columns=[ID_COL] + self.columns + [VER_COL])
+            df = concat_typed(df, coerce_frame(nuevos, self.dtypes))
+        return df
+
+    def load(self) -> pd.DataFrame:
+        """Relee instantánea + bitácora desde disco y devuelve una copia."""
+        with self._lock:
+            self._reload()
+            return con_revision(self.frame().copy(), self.revision)
+
+    @contextmanager
+    def _bloqueo(self, compartido: bool):
+        """Bloqueo de ``lockfile`` (reentrante; se usa con ``_lock`` tomado)."""
+        if self._bloqueado:
+            yield
+            return
+        with bloqueo_archivo(self.lockfile, compartido):
+            self._bloqueado = True
+            try:
+                yield
+            finally:
+                self._bloqueado = False
+
+    @contextmanager
+    def _escritura(self):
+        """Exclusión para escribir, entre hilos y entre procesos (reentrante).
+
+        Al tomarla se aplican los cambios que otros procesos hayan anexado,
+        así que ``_id``, claves únicas e índices están al día antes de escribir.
+        """
+        with self._lock, self._bloqueo(compartido=False):
+            self.refresh()
+            if self.historia is not None and not self.historia.iniciado:
+                self.historia.iniciar(self.frame())  # corte inicial, antes del primer delta
+            yield
+
+    def _reload(self) -> None:
+        # Con el bloqueo compartido: nadie compacta ni anexa hasta que la
+        # firma (_publish) corresponda a lo leído
+        with self._bloqueo(compartido=True):
+            df, meta = self._read_snapshot()
+            self._next_id = int(meta.get("next_id", 1))
+            self.revision = int(meta.get(REVISION, 0))
+            ids, revisiones = meta.get("bajas", ([], []))
+            self._bajas = dict(zip(ids, revisiones))
+            self._bajas_desde = int(meta.get("bajas_desde", self.revision))
+            records, self._offset = self._read_journal()
+            self._pending = len(records)
+            self._index = None
+            self._texto = None
+            self._kpi = None
+            self._vence = None
+            self._dead = None
+            self._ndead = 0
+            self._instalar(self._replay(df, records))
+        if self.unique_key:
+            self._keys = KeyIndex.build(self._df, self.unique_key, ID_COL)
+
+    def refresh(self) -> bool:
+        """Sincroniza la memoria con el disco si otro proceso lo modificó.
+
+        Devuelve ``True`` si hubo que recargar o reproducir la bitácora.
+        """
+        with self._lock:
+            if self._df is None:
+                self._reload()
+                return True
+            sig = self._signature()
+            if sig == self._sig:
+                return False
+            jsize = sig[2][1] if sig[2] else 0
+            if sig[:2] == self._sig[:2] and jsize >= self._offset:
+                # Solo creció la bitácora: se aplica la cola nueva
+                with self._bloqueo(compartido=True):
+                    if self._signature()[:2] != sig[:2]:  # compactaron mientras tanto
+                        self._reload()
+                        return True
+                    records, self._offset = self._read_journal(self._offset)
+                    self._pending += len(records)
+                    if not self._aplicar_ajenos(records):
+                        self._reload()
+                        return True
+                    self._sig = self._signature()
+                self._maybe_purge()
+            else:
+                self._reload()
+            return True
+
+    def _aplicar_ajenos(self, records: list[dict]) -> bool:
+        """Aplica registros que anexó otro proceso con los mismos ganchos que
+        las escrituras locales: los índices se actualizan, no se reconstruyen.
+
+        Los registros seguidos de la misma operación van en bloque. Devuelve
+        ``False`` si un alta no encaja al final de la matriz (``_id`` ya usado o
+        fuera de orden); entonces hay que recargar.
+        """
+        for op, grupo in itertools.groupby(records, key=lambda r: r.get("op")):
+            grupo = list(grupo)
+            ids = [int(r["id"]) for r in grupo]
+            revs = []
+            for rec in grupo:
+                # las bitácoras sin revisiones cuentan una por registro
+                self.revision = max(self.revision, int(rec.get("v") or self.revision + 1))
+                revs.append(self.revision)
+            self._next_id = max(self._next_id, max(ids) + 1)
+            if op == "ins":
+                base = self._df[ID_COL].to_numpy()
+                if (len(base) and ids[0] <= base[-1]) or np.any(np.diff(ids) <= 0):
+                    return False
+                for rid in ids:
+                    self._bajas.pop(rid, None)
+                rows = pd.DataFrame.from_records([r["row"] for r in grupo]).reindex(columns=self.columns)
+                rows = coerce_frame(rows, self.dtypes)
+                rows.insert(0, ID_COL, np.asarray(ids, dtype="int64"))
+                self._agregar(rows, np.asarray(revs, dtype="int64"))
+            elif op == "upd":
+                por_fila: dict[int, list] = {}  # _id -> [valores, revisión]
+                for rid, rec, v in zip(ids, grupo, revs):
+                    fila = por_fila.setdefault(rid, [{}, v])
+                    fila[0].update((k, x) for k, x in rec["row"].items() if k in self.columns)
+                    fila[1] = v
+                pos = self._locate(list(por_fila))
+                vivas = pos >= 0
+                if vivas.any():
+                    filas = [f for f, ok in zip(por_fila.values(), vivas) if ok]
+                    self._editar(pos[vivas], [f[0] for f in filas], np.array([f[1] for f in filas], dtype="int64"))
+            elif op == "del":
+                self._bajas.update(zip(ids, revs))
+                pos = np.unique(self._locate(ids))
+                pos = pos[pos >= 0]
+                if len(pos):
+                    self._marcar_bajas(pos, self._df.take(pos))
+        return True
+
+    def _instalar(self, df: pd.DataFrame) -> None:
+        """Publica *df* (con ``_ver``) como matriz interna; las versiones pasan a ``_vers``."""
+        self._vers = df[VER_COL].to_numpy(dtype=np.int64, copy=True)
+        self._publish(df.drop(columns=[VER_COL]))
+
+    def _cargar(self) -> None:
+        if self._df is None:
+            self._reload()
+
+    def frame(self) -> pd.DataFrame:
+        """Matriz visible en memoria, con ``_ver`` (se carga de disco la primera vez).
+
+        Se arma una sola vez por versión, sin las lápidas: es una vista que las
+        escrituras posteriores no alteran.
+        """
+        with self._lock:
+            self._cargar()
+            if self._live is None:
+                if self._ndead:
+                    vivas = ~self._dead
+                    live = self._df[vivas].reset_index(drop=True)
+                    live[VER_COL] = self._vers[vivas]
+                else:
+                    live = self._df.copy(deep=False)
+                    live[VER_COL] = self._vers.copy()
+                self._live = live
+            return self._live
+
+    def _filas(self, pos: np.ndarray) -> pd.DataFrame:
+        """Copia de las filas de las ranuras *pos*, con su ``_ver``."""
+        filas = self._df.take(pos)
+        filas[VER_COL] = self._vers[pos]
+        return filas
+
+    def shared(self) -> pd.DataFrame:
+        """Vista compartida y al día de la matriz, sin copiar datos.
+
+        Es una copia superficial: con Copy-on-Write, modificarla no altera la
+        versión que ven las demás sesiones.
+        """
+        with self._lock:
+            self.refresh()
+            return con_revision(self.frame().copy(deep=False), self.revision)
+
+    # ---------------------------------------------------------
+    # Escritura
+    # ---------------------------------------------------------
+    def _append(self, records: Iterable[dict]) -> None:
+        payload = "".join(
+            json.dumps(r, ensure_ascii=False, default=_json_default) + "\n"
+            for r in records
+        ).encode("utf-8")
+        if not payload:
+            return
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal, "a+b") as fh:
+            fh.seek(0, os.SEEK_END)
+            if fh.tell():
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    # Cola cortada por un corte previo: la cerramos para que
+                    # quede como una línea ilegible que la lectura descarta.
+                    payload = b"\n" + payload
+            fh.write(payload)
+            fh.flush()
+            if self.fsync:
+                os.fsync(fh.fileno())
+            self._offset = fh.tell()
+        servqual_metricas.contar("bytes_bitacora", len(payload))
+
+    def _assign(self, df: pd.DataFrame, positions, col: str, values) -> pd.DataFrame:
+        """Asigna valores (ya tipados) a posiciones de una columna."""
+        kind = self.dtypes.get(col, "text")
+        values = [coerce_value(v, kind) for v in values]
+        ensure_category(df, col, values)
+        j = df.columns.get_loc(col)
+        try:
+            df.iloc[positions, j] = values
+        except (TypeError, ValueError):
+            df[col] = df[col].astype(object)
+            df.iloc[positions, j] = values
+        return df
+
+    def _kpi_filas(self, pos: np.ndarray, sign: int) -> None:
+        if len(pos) == 1:
+            p = int(pos[0])
+            self._kpi.add_row({c: self._df[c].iat[p] for c in self.kpi_spec.columnas}, sign)
+        else:
+            self._kpi.add_frame(self._df.take(pos), sign)
+
+    def _agregar(self, rows: pd.DataFrame, vers: np.ndarray, keys: list[tuple] | None = None) -> None:
+        """Agrega *rows* (tipadas, con ``_id`` mayores a los existentes) al
+        final de la matriz interna y a los índices construidos."""
+        if self._index is not None:
+            self._index.append(rows)
+        if self._texto is not None:
+            self._texto.append(rows)
+        if self._keys is not None:
+            self._keys.add(self._keys.keys(rows) if keys is None else keys, rows[ID_COL].tolist())
+        if self._kpi is not None:
+            self._kpi.add_frame(rows)
+        if self._vence is not None:
+            self._vence.append(rows, ID_COL)
+        if self._dead is not None:
+            self._dead = np.concatenate([self._dead, np.zeros(len(rows), dtype=bool)])
+        self._vers = np.concatenate([self._vers, np.asarray(vers, dtype=np.int64)])
+        self._publish(concat_typed(self._df, rows.reindex(columns=[ID_COL] + self.columns)))
+
+    def _editar(self, pos: np.ndarray, valores: list[dict], vers) -> list[tuple[int, dict, dict]]:
+        """Escribe ``valores[i]`` en la ranura ``pos[i]`` y actualiza los
+        índices; devuelve ``(_id, antes, después)`` por fila.
+
+        Cada columna tocada se escribe en su lugar con una asignación
+        posicional, y ``_ver`` en el arreglo privado: O(filas editadas).
+        """
+        self._live = None  # sin vistas propias vivas, CoW no copia nada
+        df = self._df
+        pos = np.asarray(pos, dtype=np.int64)
+        columnas = list(dict.fromkeys(k for v in valores for k in v))
+        kpi = self._kpi is not None and any(c in self.kpi_spec.columnas for c in columnas)
+        if kpi:
+            self._kpi_filas(pos, -1)
+        claves = self._keys is not None and any(c in self.unique_key for c in columnas)
+        if claves:
+            viejas = self._keys.keys(df.take(pos))
+        antes: list[dict] = [{} for _ in valores]
+        despues: list[dict] = [{} for _ in valores]
+        for col in columnas:
+            filas = [i for i, v in enumerate(valores) if col in v]
+            donde = pos[filas]
+            viejos = df[col].take(donde).tolist()
+            df = self._assign(df, donde, col, [valores[i][col] for i in filas])
+            nuevos = df[col].take(donde).tolist()
+            for i, p, old, new in zip(filas, donde.tolist(), viejos, nuevos):
+                antes[i][col] = old
+                despues[i][col] = new
+                if self._index is not None:
+                    self._index.update(p, col, old, new)
+                if self._texto is not None:
+                    self._texto.update(p, col, old, new)
+        self._vers[pos] = vers
+        self._df = df
+        ids = df[ID_COL].take(pos).tolist()
+        if kpi:
+            self._kpi_filas(pos, 1)
+        if self._vence is not None and any(c in self.plazos_spec.columnas for c in columnas):
+            plazos = df[list(self.plazos_spec.columnas)].take(pos).to_dict("records")
+            for rid, fila in zip(ids, plazos):
+                self._vence.row(rid, fila)
+        if claves:
+            self._keys.discard(viejas)
+            self._keys.add(self._keys.keys(df.take(pos)), ids)
+        self._publish(df)
+        return list(zip(ids, antes, despues))
+
+    def _marcar_bajas(self, pos: np.ndarray, filas: pd.DataFrame) -> None:
+        """Pone lápida a las ranuras *pos* (*filas*: sus datos) y las saca de los índices."""
+        if self._index is not None:
+            self._index.discard(pos, filas)
+        if self._texto is not None:
+            self._texto.discard(pos, filas)
+        if self._keys is not None:
+            self._keys.discard(self._keys.keys(filas))
+        if self._kpi is not None:
+            self._kpi.add_frame(filas, -1)
+        if self._vence is not None:
+            self._vence.discard(filas[ID_COL].tolist())
+        if self._dead is None:
+            self._dead = np.zeros(len(self._df), dtype=bool)
+        self._dead[pos] = True
+        self._ndead += len(pos)
+        self._publish(self._df)
+
+    def insert(self, rows: pd.DataFrame, skip_duplicates: bool = False) -> pd.DataFrame:
+        """Inserta filas nuevas (una sola escritura a la bitácora).
+
+        Devuelve las filas insertadas con su ``_id`` asignado. Si alguna
+        repite una clave única (contra la matriz o dentro del lote) se lanza
+        :class:`DuplicateKeyError` sin escribir nada, salvo que
+        *skip_duplicates* sea ``True``: entonces esas filas se omiten.
+        """
+        with self._escritura():
+            rows = coerce_frame(rows.reindex(columns=self.columns).reset_index(drop=True), self.dtypes)
+            keys: list[tuple] | None = None
+            if self._keys is not None and len(rows):
+                keys = self._keys.keys(rows)
+                dup = self._keys.contains(keys) | pd.Series(keys, dtype=object).duplicated().to_numpy()
+                if dup.any():
+                    if not skip_duplicates:
+                        raise DuplicateKeyError([k for k, d in zip(keys, dup) if d])
+                    rows = rows[~dup].reset_index(drop=True)
+                    keys = [k for k, d in zip(keys, dup) if not d]
+            if rows.empty:
+                return rows.assign(**{ID_COL: pd.Series(dtype="int64")})
+            ids = np.arange(self._next_id, self._next_id + len(rows), dtype="int64")
+            rev = self.revision + 1
+            self._append(
+                {"op": "ins", "id": int(i), "v": rev, "row": _limpiar(r)}
+                for i, r in zip(ids, rows.to_dict("records"))
+            )
+            self._next_id += len(rows)
+            self.revision = rev
+            rows.insert(0, ID_COL, ids)
+            if self.historia is not None:
+                self.historia.altas(rows)
+            self._agregar(rows, np.full(len(rows), rev, dtype="int64"), keys)
+            rows[VER_COL] = np.full(len(rows), rev, dtype="int64")
+            self._pending += len(rows)
+            self._maybe_compact()
+            return rows
+
+    def update(self, row_id: int, values: dict, version: int | None = None, base: dict | None = None) -> int:
+        """Actualiza columnas de una fila por ``_id``; devuelve su nueva versión.
+
+        Con *version* (el ``_ver`` de la fila que se editó) solo escribe si la
+        fila sigue en esa versión; si no, lanza :class:`ConflictError`, salvo
+        que *base* (la fila tal como se leyó) permita fusionar (:func:`fusionar`).
+        Lanza :class:`DuplicateKeyError` si el cambio repetiría una clave única.
+        """
+        values = {k: v for k, v in values.items() if k in self.columns}
+        with self._escritura():
+            df = self._df
+            p = int(self._locate([row_id])[0])
+            if p < 0:
+                if version is not None:
+                    raise ConflictError([row_id])  # la dio de baja otra sesión
+                raise KeyError(row_id)
+            actual = int(self._vers[p])
+            if version is not None and actual != int(version):
+                if base is None:
+                    raise ConflictError([row_id])
+                values = fusionar(row_id, {k: df[k].iat[p] for k in values}, base, values, self.dtypes)
+            if not values:
+                return actual
+            if self._keys is not None and any(c in values for c in self.unique_key):
+                fila = {c: df[c].iat[p] for c in self.unique_key}
+                nueva = self._keys.key({**fila, **values})
+                otro = self._keys.get(nueva)
+                if otro is not None and otro != int(row_id):
+                    raise DuplicateKeyError([nueva])
+            rev = self.revision + 1
+            self._append([{"op": "upd", "id": int(row_id), "v": rev, "row": _limpiar(values)}])
+            self.revision = rev
+            ((_, antes, despues),) = self._editar(np.array([p]), [values], rev)
+            if self.historia is not None:
+                self.historia.ediciones(row_id, antes, despues)
+            self._pending += 1
+            self._maybe_compact()
+            return rev
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """Elimina filas por ``_id``; devuelve cuántas existían.
+
+        Solo marca lápidas: la matriz no se reacomoda hasta la purga diferida.
+        """
+        with self._escritura():
+            pos = np.unique(self._locate([int(i) for i in ids]))
+            pos = pos[pos >= 0]
+            if not len(pos):
+                return 0
+            filas = self._df.take(pos)
+            rev = self.revision + 1
+            self._append({"op": "del", "id": int(i), "v": rev} for i in filas[ID_COL])
+            self.revision = rev
+            self._bajas.update(dict.fromkeys(filas[ID_COL].tolist(), rev))
+            if self.historia is not None:
+                self.historia.bajas(filas)
+            self._marcar_bajas(pos, filas)
+            self._pending += len(pos)
+            self._maybe_purge()
+            self._maybe_compact()
+            return len(pos)
+
+    # ---------------------------------------------------------
+    # Consultas
+    # ---------------------------------------------------------
+    def filter(self, filters: dict, q: str | None = None) -> pd.DataFrame:
+        """Filas que cumplen ``columna -> valor`` (``None`` = sin filtro) y,
+        con *q*, que contienen todas sus palabras en ``text_columns``.
+
+        Usa el índice de filtros: el costo depende de cuántas filas cumplen
+        el filtro más selectivo, no del total. El índice de las filas
+        devueltas es su ranura interna (usa ``_id`` para referirte a ellas).
+        """
+        with self._lock:
+            self.refresh()
+            pos = self._lookup(filters, q)
+            return self.frame().copy(deep=False) if pos is None else self._filas(pos)
+
+    def _lookup(self, filters: dict, q: str | None = None) -> np.ndarray | None:
+        """Ranuras que cumplen *filters* y la búsqueda *q* (``None`` = sin filtros activos)."""
+        if q and not self.text_columns:
+            raise ValueError("El almacén no tiene columnas de texto (text_columns) para buscar")
+        if self._index is None or (q and self._texto is None):
+            if self._ndead:
+                self._purge()
+            if self._index is None:
+                self._index = FilterIndex.build(self._df, self.index_columns)
+            if q and self._texto is None:
+                self._texto = TextIndex.build(self._df, self.text_columns)
+        pos = self._index.lookup(filters)
+        if q:
+            encontradas = self._texto.search(q, pos)
+            if encontradas is not None:
+                pos = encontradas
+        return pos
+
+    def page(
+        self,
+        filters: dict | None = None,
+        offset: int = 0,
+        limit: int = 50,
+        sort: str | None = None,
+        descending: bool = False,
+        q: str | None = None,
+    ) -> tuple[pd.DataFrame, int]:
+        """Una página de las filas que cumplen *filters* (y la búsqueda *q*):
+        ``(filas, total)``.
+
+        Solo se materializan las *limit* filas pedidas. El orden por defecto es
+        ``_id``; con *sort* se ordena por esa columna (empates por ``_id``) y el
+        orden calculado se reutiliza para las demás páginas mientras la matriz
+        no cambie.
+        """
+        with self._lock:
+            self.refresh()
+            clave = (self.version, tuple(sorted((filters or {}).items())), sort, descending, q or None)
+            pos = self._orden.get(clave)
+            if pos is None:
+                pos = self._lookup(filters or {}, q)
+                if pos is None:
+                    pos = np.flatnonzero(~self._dead) if self._ndead else np.arange(len(self._df))
+                if sort is not None and sort != ID_COL:
+                    pos = pos[np.argsort(_sort_key(self._df[sort].take(pos)), kind="stable")]
+                if descending:
+                    pos = pos[::-1]
+                if len(self._orden) >= 16 or any(k[0] != self.version for k in self._orden):
+                    self._orden.clear()
+                self._orden[clave] = pos
+            offset = max(0, int(offset))
+            return self._filas(pos[offset : offset + int(limit)]), len(pos)
+
+    def kpi_cells(self) -> pd.DataFrame:
+        """Celdas de conteo de los indicadores (ver ``servqual_kpi``).
+
+        Se arman con un ``groupby`` la primera vez; después cada alta,
+        edición o baja las actualiza en O(1).
+        """
+        with self._lock:
+            if self.kpi_spec is None:
+                raise ValueError("El almacén no tiene indicadores configurados")
+            self.refresh()
+            if self._kpi is None:
+                self._kpi = KpiCells.build(self.frame(), self.kpi_spec)
+            return self._kpi.frame()
+
+    def vencimientos(self, hasta, filters: dict | None = None) -> pd.DataFrame:
+        """Filas abiertas cuya fecha límite es *hasta* o anterior, de la más
+        atrasada a la más lejana, con la columna ``Vencimiento``.
+
+        *filters* admite las columnas de ``plazos.grupos`` (p. ej. Responsable,
+        Sucursal). El índice se arma la primera vez; después cada alta, edición
+        o baja lo actualiza y la consulta cuesta O(k log N) para *k* filas.
+        """
+        with self._lock:
+            if self.plazos_spec is None:
+                raise ValueError("El almacén no tiene plazos configurados")
+            self.refresh()
+            if self._vence is None:
+                self._vence = Vencimientos.build(self.frame(), self.plazos_spec, ID_COL)
+            ids, dias = self._vence.proximas(_dia(hasta), filters)
+            pos = self._locate(ids)
+            vivas = pos >= 0
+            filas = self._filas(pos[vivas]).reset_index(drop=True)
+            filas[VENCIMIENTO] = pd.to_datetime(np.asarray(dias)[vivas], unit="D")
+            return filas
+
+    def get_rows(self, ids) -> pd.DataFrame:
+        """Filas con los ``_id`` indicados (los inexistentes se omiten); O(k log N)."""
+        with self._lock:
+            self.refresh()
+            pos = self._locate(ids)
+            return self._filas(pos[pos >= 0])
+
+    def has_keys(self, rows: pd.DataFrame) -> np.ndarray:
+        """Máscara de las filas de *rows* cuya clave única ya existe (O(1) c/u)."""
+        with self._lock:
+            self.refresh()
+            if self._keys is None:
+                raise ValueError("El almacén no tiene clave única")
+            return self._keys.contains(self._keys.keys(rows))
+
+    def save(self, df: pd.DataFrame, desde: int | None = None) -> None:
+        """Persiste *df* escribiendo solo las diferencias contra la copia en memoria.
+
+        Las filas sin ``_id`` (o con uno desconocido) se insertan, los ``_id``
+        ausentes se eliminan y las filas con algún valor distinto se actualizan,
+        todo en un solo registro ``lote`` de la bitácora (una revisión). Los
+        ``_id`` asignados se escriben en *df* (in situ).
+
+        *desde* es la revisión en que se leyó *df* (por defecto
+        ``df.attrs["revision"]``). Si alguna fila editada fue escrita después
+        por otra sesión, se lanza :class:`ConflictError` sin escribir nada; las
+        filas ausentes de *df* que son posteriores a esa revisión no se borran
+        (sin revisión, las de ``_id`` mayor que el último de *df*). Si nadie más escribió desde entonces, *df* queda anotado con la
+        revisión nueva (se puede seguir editando y guardando).
+        """
+        desde = df.attrs.get(REVISION) if desde is None else desde
+        with self._escritura():
+            previa = self.revision
+            cur = self.frame()
+            ids, conocidos, borrados, cambios = diferencias(cur, df, self.columns, self.dtypes)
+            borrados = vigentes(cur, df, cambios, borrados, desde)
+            del cur  # sin vistas vivas, las ediciones se escriben en su lugar
+            nuevas = coerce_frame(df.loc[~conocidos, self.columns].reset_index(drop=True), self.dtypes)
+            if borrados or cambios or len(nuevas):
+                nuevos = self._lote(borrados, cambios, nuevas)
+                if len(nuevos):
+                    asignar_ids(df, ids, conocidos, nuevos)
+            if desde is not None and previa == desde:
+                con_revision(df, self.revision)
+
+    def _lote(self, borrados: list[int], cambios: list[tuple[int, dict]], nuevas: pd.DataFrame) -> np.ndarray:
+        """Bajas, ediciones y altas de un guardado como un solo registro de la
+        bitácora; devuelve los ``_id`` de las altas.
+
+        Las claves únicas se validan antes de escribir: o se guarda todo o
+        nada. Cada parte se aplica en bloque con los mismos ganchos que las
+        escrituras sueltas.
+        """
+        pos_b = np.unique(self._locate(borrados))
+        pos_b = pos_b[pos_b >= 0]
+        pos_c = self._locate([rid for rid, _ in cambios])
+        valores = [{k: v for k, v in vals.items() if k in self.columns} for _, vals in cambios]
+        keys = self._claves_lote(pos_b, pos_c, valores, nuevas) if self._keys is not None else None
+        ids = np.arange(self._next_id, self._next_id + len(nuevas), dtype="int64")
+        rev = self.revision + 1
+        filas_b = self._df.take(pos_b)
+        bajas = filas_b[ID_COL].tolist()
+        self._append([{
+            "op": "lote",
+            "v": rev,
+            "del": bajas,
+            "upd": [[rid, _limpiar(v)] for (rid, _), v in zip(cambios, valores)],
+            "ins": [[int(i), _limpiar(r)] for i, r in zip(ids, nuevas.to_dict("records"))],
+        }])
+        self.revision = rev
+        self._next_id += len(nuevas)
+        if len(pos_b):
+            self._bajas.update(dict.fromkeys(bajas, rev))
+            self._marcar_bajas(pos_b, filas_b)
+        editadas = self._editar(pos_c, valores, rev) if len(pos_c) else []
+        if len(nuevas):
+            nuevas.insert(0, ID_COL, ids)
+            self._agregar(nuevas, np.full(len(nuevas), rev, dtype="int64"), keys)
+        if self.historia is not None:
+            self.historia.lote(filas_b, editadas, nuevas)
+        self._pending += len(bajas) + len(cambios) + len(nuevas)
+        self._maybe_purge()
+        self._maybe_compact()
+        return ids
+
+    def _claves_lote(
+        self, pos_b: np.ndarray, pos_c: np.ndarray, valores: list[dict], nuevas: pd.DataFrame
+    ) -> list[tuple]:
+        """Claves de *nuevas*; lanza :class:`DuplicateKeyError` si el guardado
+        repetiría una clave única (las de filas borradas o editadas quedan libres)."""
+        tocadas = [i for i, v in enumerate(valores) if any(c in v for c in self.unique_key)]
+        libres = set(self._keys.keys(self._df.take(np.concatenate([pos_b, pos_c[tocadas]]))))
+        editadas = [
+            self._keys.key({**{c: self._df[c].iat[pos_c[i]] for c in self.unique_key}, **valores[i]})
+            for i in tocadas
+        ]
+        claves = self._keys.keys(nuevas) if len(nuevas) else []
+        candidatas = editadas + claves
+        ocupadas = [k in self._keys and k not in libres for k in candidatas]
+        dup = pd.Series(candidatas, dtype=object).duplicated().to_numpy() | np.asarray(ocupadas, dtype=bool)
+        if dup.any():
+            raise DuplicateKeyError([k for k, d in zip(candidatas, dup) if d])
+        return claves
+
+    def cambios(self, desde: int) -> Delta:
+        """Lo escrito después de la revisión *desde* (:class:`Delta`).
+
+        Las filas salen de comparar las versiones de fila (un recorrido
+        vectorizado, sin armar la matriz visible); las bajas, de las que el almacén recuerda. Con
+        *desde* 0, anterior a las bajas recordadas o posterior a la revisión
+        actual (otra matriz), devuelve la matriz completa.
+        """
+        with self._lock:
+            self.refresh()
+            if desde <= 0 or desde < self._bajas_desde or desde > self.revision:
+                return Delta(self.revision, self.frame().copy(deep=False), [], True)
+            nuevas = self._vers > desde
+            if self._ndead:
+                nuevas &= ~self._dead
+            borradas = sorted(i for i, v in self._bajas.items() if v > desde)
+            return Delta(self.revision, self._filas(np.flatnonzero(nuevas)), borradas, False)
+
+    # ---------------------------------------------------------
+    # Compactación
+    # ---------------------------------------------------------
+    def _maybe_compact(self) -> None:
+        if self.compact_every and self._pending >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """Vuelca la matriz a una instantánea nueva y vacía la bitácora.
+
+        Ambos archivos se escriben a un temporal y se publican con
+        ``os.replace``, que es atómico en el mismo sistema de archivos. El
+        siguiente ``_id`` viaja en los metadatos de la instantánea para que los
+        identificadores nunca se reutilicen.
+        """
+        with self._escritura():
+            self._purge()
+            df = self._df.assign(**{VER_COL: self._vers})
+            self.snapshot.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot.with_name(self.snapshot.name + ".tmp")
+            if len(self._bajas) > MAX_BAJAS:
+                recientes = sorted(self._bajas.items(), key=lambda b: b[1])
+                self._bajas_desde = recientes[-MAX_BAJAS - 1][1]
+                self._bajas = dict(recientes[-MAX_BAJAS:])
+            meta = {
+                "next_id": self._next_id,
+                REVISION: self.revision,
+                "bajas": [list(self._bajas), list(self._bajas.values())],
+                "bajas_desde": self._bajas_desde,
+            }
+            write_columnar(df, tmp, self.dtypes, meta=meta, fsync=self.fsync)
+            servqual_metricas.contar("bytes_instantanea", tmp.stat().st_size)
+            os.replace(tmp, self.snapshot)
+
+            jtmp = self.journal.with_name(self.journal.name + ".tmp")
+            with open(jtmp, "wb") as fh:
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+            os.replace(jtmp, self.journal)
+            if self.fsync:
+                _fsync_dir(self.snapshot.parent)
+            self._pending = 0
+            self._offset = 0
+            self._sig = self._signature()
+
+
+def diferencias(
+    cur: pd.DataFrame, df: pd.DataFrame, columns: list[str], dtypes: dict[str, str]
+) -> tuple[pd.Series, pd.Series, list[int], list[tuple[int, dict]]]:
+    """Compara *df* (editado por el usuario) con la matriz actual *cur*.
+
+    Devuelve ``(ids, conocidos, borrados, cambios)``: los ``_id`` de *df*, la
+    máscara de sus filas que ya existen, los ``_id`` que ya no están en *df* y
+    ``(_id, {columna: valor})`` de las filas con algún valor distinto. Las
+    filas fuera de ``conocidos`` son altas.
+    """
+    if ID_COL in df.columns:
+        ids = pd.to_numeric(df[ID_COL], errors="coerce")
+    else:
+        ids = pd.Series(np.nan, index=df.index)
+    conocidos = ids.isin(cur[ID_COL]) & ids.notna()
+
+    presentes = df.loc[conocidos, columns].copy()
+    presentes.index = ids[conocidos].astype("int64").to_numpy()
+    borrados = cur.loc[~cur[ID_COL].isin(presentes.index), ID_COL].tolist()
+
+    cambios = []
+    if len(presentes):
+        presentes = coerce_frame(presentes, dtypes)
+        base = cur.set_index(ID_COL).loc[presentes.index, columns]
+        distinto = _comparable(presentes).ne(_comparable(base))
+        for rid in presentes.index[distinto.any(axis=1).to_numpy()]:
+            cols = distinto.columns[distinto.loc[rid].to_numpy()]
+            cambios.append((int(rid), presentes.loc[rid, cols].to_dict()))
+    return ids, conocidos, borrados, cambios
+
+
+def asignar_ids(df: pd.DataFrame, ids: pd.Series, conocidos: pd.Series, nuevos) -> None:
+    """Escribe en *df* (in situ) los ``_id`` asignados a sus filas nuevas."""
+    col = ids.astype("Int64")
+    col[~conocidos] = nuevos
+    df[ID_COL] = col
+
+
+def con_revision(df: pd.DataFrame, revision: int) -> pd.DataFrame:
+    """Anota en *df* (in situ) la revisión del almacén en que se leyó."""
+    df.attrs = {**df.attrs, REVISION: int(revision)}
+    return df
+
+
+def _versiones(cur: pd.DataFrame, ids) -> np.ndarray:
+    """``_ver`` de *ids* en *cur* (ordenada por ``_id``; los ids deben existir)."""
+    pos = np.searchsorted(cur[ID_COL].to_numpy(), np.asarray(ids, dtype=np.int64))
+    return cur[VER_COL].to_numpy()[pos]
+
+
+def vigentes(
+    cur: pd.DataFrame, df: pd.DataFrame, cambios: list[tuple[int, dict]], borrados: list[int], desde: int | None
+) -> list[int]:
+    """Control optimista de ``save`` sobre el resultado de :func:`diferencias`.
+
+    Con *desde* (o ``df.attrs["revision"]``), lanza :class:`ConflictError` si
+    alguna fila editada en *df* se escribió después de esa revisión, y devuelve
+    los *borrados* sin las filas posteriores a ella (altas o ediciones de otras
+    sesiones que *df* no llegó a ver). Sin revisión solo borra hasta el mayor
+    ``_id`` de *df*: los ``_id`` son crecientes, así que los posteriores son
+    altas que *df* no llegó a ver.
+    """
+    if desde is None:
+        desde = df.attrs.get(REVISION)
+    if desde is None:
+        visto = pd.to_numeric(df[ID_COL], errors="coerce").max() if ID_COL in df.columns else np.nan
+        return [] if pd.isna(visto) else [rid for rid in borrados if rid <= visto]
+    if VER_COL not in cur.columns:
+        return borrados
+    if cambios:
+        ids = [rid for rid, _ in cambios]
+        choques = np.asarray(ids)[_versiones(cur, ids) > desde]
+        if len(choques):
+            raise ConflictError(choques.tolist())
+    if borrados:
+        borrados = np.asarray(borrados)[_versiones(cur, borrados) <= desde].tolist()
+    return borrados
+
+
+def _mismo(a, b, kind: str) -> bool:
+    """¿Dos valores de una celda son iguales? (vacío, ``None`` y NaN lo son entre sí)."""
+    a, b = coerce_value(a, kind), coerce_value(b, kind)
+    vacio_a = a is None or bool(pd.isna(a)) or a == ""
+    vacio_b = b is None or bool(pd.isna(b)) or b == ""
+    if vacio_a or vacio_b:
+        return vacio_a and vacio_b
+    return bool(a == b)
+
+
+def editadas(base: dict, values: dict, dtypes: dict[str, str]) -> dict:
+    """Las columnas de *values* que difieren de la fila *base* (la que se editó)."""
+    return {
+        col: valor
+        for col, valor in values.items()
+        if col not in base or not _mismo(valor, base[col], dtypes.get(col, "text"))
+    }
+
+
+def fusionar(row_id: int, actual: dict, base: dict, values: dict, dtypes: dict[str, str]) -> dict:
+    """Edición *values*, hecha sobre la fila *base*, aplicada a la fila *actual*.
+
+    Devuelve solo las columnas que la edición cambió respecto de *base*
+    (:func:`editadas`): las demás no se escriben, para no revertir lo que
+    escribió otra sesión. Lanza :class:`ConflictError` si alguna de ellas
+    también cambió en *actual* a un valor distinto del editado.
+    """
+    propias = editadas(base, values, dtypes)
+    choques: list[str] = []
+    for col, valor in propias.items():
+        kind = dtypes.get(col, "text")
+        if col in base and not _mismo(actual[col], base[col], kind) and not _mismo(valor, actual[col], kind):
+            choques.append(col)
+    if choques:
+        raise ConflictError([row_id], choques)
+    return propias
+
+
+def aplicar_cambios(df: pd.DataFrame, delta: Delta) -> pd.DataFrame:
+    """Copia de la matriz *df* puesta al día con *delta* (ordenada por ``_id``)."""
+    if delta.completa:
+        return con_revision(delta.filas.copy(), delta.revision)
+    quitar = delta.filas[ID_COL].tolist() + list(delta.borradas)
+    out = df[~df[ID_COL].isin(quitar)]
+    out = concat_typed(out, delta.filas).sort_values(ID_COL, kind="stable", ignore_index=True)
+    return con_revision(out, delta.revision)
+
+
+def _sort_key(s: pd.Series) -> np.ndarray:
+    """Clave de orden de una columna: categorías por texto, nulos al final."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = s.cat.categories
+        rango = np.empty(len(cats) + 1, dtype=np.int64)
+        rango[np.argsort(np.asarray(cats.astype(str), dtype=object), kind="stable")] = np.arange(len(cats))
+        rango[-1] = len(cats)  # código -1 (nulo)
+        return rango[s.cat.codes.to_numpy()]
+    if s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+        codes, uniques = pd.factorize(s, sort=True, use_na_sentinel=True)
+        return np.where(codes < 0, len(uniques), codes)
+    return s.to_numpy()
+
+
+def _comparable(df: pd.DataFrame) -> pd.DataFrame:
+    """Representación textual comparable (NaN -> "", 5.0 -> "5")."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        texto = s.astype(object).astype(str)
+        if pd.api.types.is_float_dtype(s):
+            entero = (s.notna() & (s == s.round())).to_numpy()
+            texto = texto.where(~entero, s.fillna(0).astype("int64").astype(str))
+        out[col] = texto.where(s.notna(), "")
+    return pd.DataFrame(out, index=df.index)
+
+
+def import_csv(path: Path, columns: list[str], dtypes: dict[str, str]) -> pd.DataFrame:
+    """Lee un CSV de la matriz y lo tipa; asigna ``_id`` si no los trae.
+
+    Los identificadores de un CSV heredado se asignan por posición, lo que es
+    determinista mientras el archivo no cambie.
+    """
+    df = pd.read_csv(path, keep_default_na=False)
+    for col in columns:
+        if col not in df.columns:
+            df[col] = pd.NA
+    if ID_COL not in df.columns:
+        df.insert(0, ID_COL, np.arange(1, len(df) + 1, dtype="int64"))
+    df = df[[ID_COL] + columns].reset_index(drop=True)
+    return coerce_frame(df, {ID_COL: "int", **dtypes})
+
+
+def export_csv(df: pd.DataFrame, path: Path, columns: list[str]) -> None:
+    """Escribe *columns* de *df* como CSV (formato de intercambio)."""
+    df.reindex(columns=columns).to_csv(path, index=False)
+
+
+_STORES: dict[tuple[Path, tuple[str, ...]], object] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(path: Path, columns: list[str], **kwargs):
+    """Devuelve el almacén (único por proceso) asociado a *path*.
+
+    Con extensión ``.db``/``.sqlite``/``.sqlite3`` es un
+    ``servqual_sqlite.SQLiteStore``; si no, un :class:`JournalStore`.
+    """
+    key = (Path(path).resolve(), tuple(columns))
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            from servqual_sqlite import SUFIJOS, SQLiteStore
+
+            clase = SQLiteStore if Path(path).suffix.lower() in SUFIJOS else JournalStore
+            store = _STORES[key] = clase(Path(path), list(columns), **kwargs)
+        return store
+
+
+def close_stores(path: Path | None = None) -> None:
+    """Olvida los almacenes del proceso (los de *path*, o todos) y cierra sus
+    conexiones; la siguiente llamada a :func:`get_store` abre uno nuevo."""
+    with _STORES_LOCK:
+        claves = [k for k in _STORES if path is None or k[0] == Path(path).resolve()]
+        for key in claves:
+            store = _STORES.pop(key)
+            if hasattr(store, "close"):
+                store.close()
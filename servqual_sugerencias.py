@@ -0,0 +1,72 @@
+"""
+Sugerencias de acción correctiva a partir del texto del subproblema.
+
+Port de ``suggestionRules`` / ``suggestActionFromText`` de la app JSX: cada
+regla es un patrón (sin distinguir mayúsculas) y una acción; gana la **primera**
+regla que aparece en el texto y, si ninguna, :data:`ACCION_GENERAL`.
+
+En vez de probar los patrones uno por uno, se compilan en una sola expresión::
+
+    ^(?:(?=.*?(?:patrón_0))|(?=.*?(?:patrón_1))|...)
+
+El motor de ``re`` prueba las alternativas en orden, así que la regla que
+coincide es la de menor índice (misma prioridad que el ciclo de JS) con una
+sola llamada. Los resultados se memorizan por texto distinto, y
+:func:`sugerir_columna` factoriza la columna: con 100k filas solo se evalúan
+los pocos textos distintos (las subopciones del catálogo).
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# (patrón, acción) en orden de prioridad, igual que en la app JSX
+REGLAS: tuple[tuple[str, str], ...] = (
+    (r"confus|confusa|confuso", "Estandarizar guion y checklist; capacitar en comunicación clara; validar con técnica de 'retorno de información'."),
+    (r"falt(ó|o) info|incomplet", "Diseñar lista de información mínima; agregar señalética paso a paso; supervisión de cumplimiento diario."),
+    (r"t(á|a)rd|demora|espera|cola", "Implementar gestión de colas; priorización por hora; reforzar cajas/personal en picos; monitoreo de TME en tablero."),
+    (r"sistema lento|lento", "Revisar desempeño del SI; plan de contingencia; ventanilla offline; escalamiento a TI con métricas."),
+    (r"no (informaron|explicaron|recib[ií]|atendieron|examin[oó])", "Retroalimentación 1:1; reentrenar protocolo; auditoría por muestreo; reforzar cultura de servicio."),
+    (r"muy t[eé]cnico", "Capacitar en lenguaje sencillo; plantilla de explicación; evaluar comprensión del paciente."),
+    (r"examen superficial|no examin|faltaron pruebas", "Recordar estándar de examen físico; checklist por especialidad; doble firma en casos críticos."),
+    (r"precios altos|caro|no vale", "Revisar política de precios y comunicación de valor; opciones de paquetes; transparencia de costos."),
+    (r"sin disponibilidad|sin rampas|barreras|acceso dif", "Plan de accesibilidad: rampas, señalética, rutas; calendarizar correcciones con Mantenimiento."),
+    (r"ba[nñ]os|mal olor|sucio", "Refuerzo de limpieza con rondas programadas; checklist y bitácora; responsable por turno."),
+    (r"telemedicina|virtual|tecnolog", "Mapear flujos de telemedicina; capacitar; asegurar equipos y conectividad; protocolo de consentimiento."),
+    (r"no preguntaron|no escuch[oó]|interrump", "Entrenamiento en escucha activa; prohibir interrupciones; guía de entrevista clínica."),
+    (r"preferencias injustas|saltaron turnos|orden", "Sistema de turnos visible; auditoría aleatoria; sanción por alteración de cola; educación al usuario."),
+)
+
+ACCION_GENERAL = (
+    "Analizar causa raíz (Ishikawa/5 porqués); definir acción SMART con responsable y fecha; "
+    "medir impacto en 30 días."
+)
+
+
+def compilar(reglas=REGLAS) -> re.Pattern:
+    """Una sola expresión con una alternativa (con nombre ``r<i>``) por regla."""
+    ramas = "|".join(f"(?=.*?(?P<r{i}>{patron}))" for i, (patron, _) in enumerate(reglas))
+    return re.compile(f"^(?:{ramas})", re.IGNORECASE | re.DOTALL)
+
+
+_PATRON = compilar()
+_ACCIONES = tuple(accion for _, accion in REGLAS)
+
+
+@lru_cache(maxsize=4096)
+def sugerir(texto: str) -> str:
+    """Acción sugerida para *texto* (subproblema y, opcionalmente, la pregunta)."""
+    m = _PATRON.match(texto or "")
+    if m is None:
+        return ACCION_GENERAL
+    return _ACCIONES[int(m.lastgroup[1:])]
+
+
+def sugerir_columna(textos: pd.Series) -> pd.Series:
+    """:func:`sugerir` sobre toda una columna, evaluando cada texto distinto una vez."""
+    codigos, distintos = pd.factorize(textos.astype(object).where(textos.notna(), ""))
+    acciones = np.array([sugerir(str(t)) for t in distintos] or [ACCION_GENERAL], dtype=object)
+    return pd.Series(acciones.take(codigos), index=textos.index, name="Acción correctiva")
@@ -0,0 +1,31 @@
+"""
+Normalización de textos común a todos los módulos.
+
+:func:`normalizar` deja un texto comparable, sin tildes ni mayúsculas. La usan
+la búsqueda libre (``servqual_index``), los encabezados de libros y catálogos
+(``servqual_libro``, ``servqual_catalog``) y los textos de las encuestas
+(``servqual_encuestas``). Solo usa la biblioteca estándar: importarlo no carga
+pandas.
+"""
+from __future__ import annotations
+
+import string
+import unicodedata
+
+SEPARADOR = "\x01"  # se conserva al normalizar: separa valores al tokenizar en bloque
+# bytes ASCII en minúscula: letras, dígitos y el separador se quedan, el resto es espacio
+_SOLO_PALABRAS = bytes(
+    c if chr(c) in string.ascii_lowercase + string.digits + SEPARADOR else 32 for c in range(256)
+)
+
+
+def normalizar(texto) -> str:
+    """Texto comparable: sin tildes (NFKD, se descarta lo que no es ASCII), en
+    minúsculas y solo con ``[a-z0-9]``; lo demás queda como un espacio simple
+    (``" Cód_Pregunta "`` -> ``"cod pregunta"``). Acepta cualquier valor
+    (``None`` -> ``""``).
+    """
+    if not isinstance(texto, str):
+        texto = "" if texto is None else str(texto)
+    base = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").lower()
+    return " ".join(base.translate(_SOLO_PALABRAS).decode().split())
@@ -0,0 +1,7 @@
+"""Punto de entrada de la app web: ``streamlit run streamlit_app.py``.
+
+La UI vive en ``app_servqual_plan_accion``, que al importarse no la lanza.
+"""
+from app_servqual_plan_accion import run_streamlit_app
+
+run_streamlit_app()
@@ -0,0 +1,47 @@
+"""Fixtures comunes: cada prueba trabaja sobre una matriz nueva en ``tmp_path``."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+import app_servqual_plan_accion as app  # noqa: E402
+import servqual_metricas  # noqa: E402
+import servqual_store  # noqa: E402
+
+
+def _apuntar(monkeypatch, datafile: Path):
+    monkeypatch.setattr(app, "DATAFILE", datafile)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def _aislar():
+    """Olvida los almacenes abiertos y las métricas al terminar cada prueba."""
+    yield
+    servqual_store.close_stores()
+    servqual_metricas.desactivar()
+    servqual_metricas.reiniciar()
+
+
+@pytest.fixture
+def matriz(tmp_path, monkeypatch):
+    """``app`` con ``DATAFILE`` en una matriz vacía con bitácora."""
+    return _apuntar(monkeypatch, tmp_path / "plan.csv")
+
+
+@pytest.fixture(params=[".csv", ".db"], ids=["bitacora", "sqlite"])
+def almacen(request, tmp_path, monkeypatch):
+    """Como :func:`matriz`, con cada motor de almacenamiento."""
+    return _apuntar(monkeypatch, tmp_path / f"plan{request.param}")
+
+
+@pytest.fixture
+def fia():
+    """Las 5 filas de FIABILIDAD para la primera sucursal (sin guardar)."""
+    vacia = app.pd.DataFrame(columns=app.COLS)
+    return app.upsert_por_dimension(vacia, "FIABILIDAD", app.RESPONSABLES[0], app.ESTADOS[0], app.SUCURSALES[0])
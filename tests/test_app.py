@@ -0,0 +1,88 @@
+"""Modo librería: importación liviana, carga por dimensión y sugerencias."""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pandas as pd
+
+import servqual_sugerencias
+from conftest import RAIZ
+
+
+def test_importar_no_carga_pandas_ni_streamlit():
+    codigo = "import sys, app_servqual_plan_accion; print({'pandas.core', 'streamlit.runtime'} & set(sys.modules))"
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True, cwd=RAIZ)
+    assert salida.stdout.strip() == "set()"
+
+
+def test_smoke_no_deja_archivos(tmp_path):
+    salida = subprocess.run(
+        [sys.executable, str(RAIZ / "app_servqual_plan_accion.py")],
+        capture_output=True, text=True, check=True, cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(RAIZ)},
+    )
+    assert "Pruebas básicas superadas" in salida.stdout
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upsert_por_dimension_no_duplica(matriz, fia):
+    assert set(matriz.COLS) <= set(fia.columns) and len(fia) == 5
+    otra = matriz.upsert_por_dimension(
+        fia, "FIABILIDAD", matriz.RESPONSABLES[0], matriz.ESTADOS[0], matriz.SUCURSALES[0]
+    )
+    assert len(otra) == len(fia)
+
+
+def test_catalogo_precalculado(matriz):
+    cat = matriz.CATALOGO
+    assert matriz.preguntas_por_dimension("FIA") == matriz.preguntas_por_dimension("FIABILIDAD") == list(cat.codigos[:5])
+    assert cat.posicion["SEG_P010"] == 9
+    assert cat.pregunta_de_subcodigo("FIA_P001A - Explicación confusa") == "FIA_P001"
+
+
+def test_plan_de_varias_dimensiones_y_sucursales(matriz, fia):
+    plan = matriz.construir_plan(["FIABILIDAD", "EMPATÍA"], matriz.SUCURSALES[:2], matriz.RESPONSABLES[0])
+    df = matriz.upsert_plan(fia, plan)
+    assert len(df) == len(fia) + 5 + 3 * 2
+    assert len(matriz.upsert_plan(df, plan)) == len(df)
+
+
+def test_upsert_plan_igual_que_por_pares(matriz, fia):
+    responsables = {"FIABILIDAD": matriz.RESPONSABLES[0], "EMPATÍA": matriz.RESPONSABLES[1]}
+    fecha = date(2025, 1, 31)
+    plan = matriz.construir_plan(list(responsables), matriz.SUCURSALES[:2], responsables, matriz.ESTADOS[1], fecha)
+    por_pares = fia
+    for dimension, responsable in responsables.items():
+        for sucursal in matriz.SUCURSALES[:2]:
+            por_pares = matriz.upsert_por_dimension(por_pares, dimension, responsable, matriz.ESTADOS[1], sucursal, fecha)
+    pd.testing.assert_frame_equal(matriz.upsert_plan(fia, plan), por_pares)
+
+
+def test_sugerencias_no_pisan_lo_escrito(matriz, fia):
+    con_sub = fia.head(3).assign(**{"Subproblema identificado": ["FIA_P001A - Explicación confusa", "", "Otro"]})
+    con_sub.loc[con_sub.index[2], "Acción correctiva"] = "Manual"
+    acciones = matriz.completar_acciones(con_sub)["Acción correctiva"].tolist()
+    assert acciones[0].startswith("Estandarizar guion") and acciones[1:] == ["", "Manual"]
+    assert servqual_sugerencias.sugerir("Otro") == servqual_sugerencias.ACCION_GENERAL
+    assert isinstance(matriz.sugerir_acciones(con_sub), pd.Series)
+
+
+def test_cargar_agregar_y_guardar_no_borra_altas_ajenas(almacen, fia):
+    almacen.insert_rows(fia[almacen.COLS])
+    df = almacen.load_data()
+    fiabilidad = ("FIABILIDAD", almacen.RESPONSABLES[0], almacen.ESTADOS[0])
+    almacen.insert_rows(almacen.construir_filas_dimension(*fiabilidad, almacen.SUCURSALES[1]))  # otra sesión
+    df = almacen.upsert_por_dimension(df, *fiabilidad, almacen.SUCURSALES[2])
+    assert "revision" in df.attrs
+    almacen.save_data(df)
+    assert len(almacen.load_data()) == 15
+
+    sin_revision = almacen.load_data()
+    sin_revision.attrs = {}
+    empatia = ("EMPATÍA", almacen.RESPONSABLES[0], almacen.ESTADOS[0], almacen.SUCURSALES[0])
+    almacen.insert_rows(almacen.construir_filas_dimension(*empatia))  # 3 filas que no vio
+    almacen.save_data(sin_revision.iloc[1:])  # la baja de la primera sí se guarda
+    assert len(almacen.load_data()) == 15 - 1 + 3
@@ -0,0 +1,41 @@
+"""Búsqueda libre: sin tildes ni mayúsculas, por prefijo y con los filtros."""
+from __future__ import annotations
+
+from servqual_index import tokens
+from servqual_store import ID_COL
+
+
+def _cargar(app):
+    plan = app.construir_plan(["FIABILIDAD", "EMPATÍA"], app.SUCURSALES[:2], app.RESPONSABLES[0])
+    app.agregar_plan(plan)
+    return app.load_data()
+
+
+def test_busqueda_en_la_bitacora(matriz):
+    todo = _cargar(matriz)
+    emp = matriz.filter_data(q="Empatia")
+    esperado = todo[matriz.TEXT_COLS].map(lambda v: any(t.startswith("empatia") for t in tokens(v))).any(axis=1)
+    assert len(emp) and sorted(emp[ID_COL]) == sorted(todo.loc[esperado, ID_COL])
+    rid = int(emp[ID_COL].iloc[0])
+    matriz.update_row(rid, {"Causa raíz": "Señalización deficiente en ADMISIÓN"})
+    assert matriz.filter_data(q="senal admision")[ID_COL].tolist() == [rid]
+    suc = emp["Sucursal"].iloc[0]
+    assert set(matriz.filter_data(sucursal=suc, q="empat")["Sucursal"]) == {suc}
+    assert matriz.page_data(q="senalizacion", page_size=5)[1] == 1
+    matriz.delete_rows([rid])
+    assert matriz.filter_data(q="senalizacion").empty
+    assert len(matriz.filter_data(q="  ¿?  ")) == len(todo) - 1
+
+
+def test_busqueda_combinada(almacen):
+    _cargar(almacen)
+    emp = almacen.filter_data(q="EMPATIA")
+    assert len(emp) and set(emp["Dimensión"]) == {"EMPATÍA"}
+    rid = emp[ID_COL].iloc[0]
+    almacen.update_row(rid, {"Acción correctiva": "Capacitación en atención"})
+    assert almacen.filter_data(q="capacitacion aten")[ID_COL].tolist() == [rid]
+    assert almacen.page_data(sucursal=emp["Sucursal"].iloc[0], q="capacit")[1] == 1
+
+
+def test_tokens_sin_tildes():
+    assert tokens("EMPATÍA / Señalización") == ["empatia", "senalizacion"]
@@ -0,0 +1,69 @@
+"""Catálogos externos validados y compilados a un artefacto."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import servqual_catalog
+from conftest import RAIZ
+
+
+def test_catalogo_json_compilado(tmp_path):
+    ruta = tmp_path / "catalogo.json"
+    ruta.write_text(json.dumps({"responsables": ["A", "B"]}), encoding="utf-8")
+    externo = servqual_catalog.cargar_catalogo(ruta)
+    assert externo.responsables == ("A", "B")
+    assert externo.codigos == servqual_catalog.CATALOGO_INTEGRADO.codigos
+    assert len(list(tmp_path.glob(".catalogo.json.*.catalogo.json"))) == 1
+    assert servqual_catalog.cargar_catalogo(ruta).datos() == externo.datos()
+
+
+def test_listas_deben_ser_de_textos(tmp_path):
+    ruta = tmp_path / "catalogo.json"
+    ruta.write_text(json.dumps({"responsables": "Ana", "subopciones": {"FIA_P001": "Otro"}}), encoding="utf-8")
+    with pytest.raises(servqual_catalog.CatalogoInvalido) as exc:
+        servqual_catalog.cargar_catalogo(ruta)
+    assert len(exc.value.errores) == 2
+
+
+def test_artefacto_no_escribible_no_impide_cargar(tmp_path):
+    ruta = tmp_path / "catalogo.json"
+    ruta.write_bytes(json.dumps({"estados": ["Abierto", "Cerrado"]}).encode())
+    digest = hashlib.sha256(ruta.read_bytes()).hexdigest()
+    (tmp_path / f".catalogo.json.{digest[:16]}.catalogo.tmp").mkdir()  # el temporal no se puede crear
+    assert servqual_catalog.cargar_catalogo(ruta).estados == ("Abierto", "Cerrado")
+    assert not list(tmp_path.glob("*.catalogo.json"))
+
+
+def test_archivo_ilegible_es_catalogo_invalido(tmp_path):
+    for nombre, contenido in (("basura.xlsx", b"no es un zip"), ("lista.json", b"[]"), ("malo.json", b"\xff{")):
+        ruta = tmp_path / nombre
+        ruta.write_bytes(contenido)
+        with pytest.raises(servqual_catalog.CatalogoInvalido):
+            servqual_catalog.cargar_catalogo(ruta)
+        with pytest.warns(RuntimeWarning, match=nombre):
+            assert servqual_catalog.catalogo_vigente(ruta) is servqual_catalog.CATALOGO_INTEGRADO
+
+
+def test_importar_con_catalogo_invalido_usa_el_integrado(tmp_path):
+    (tmp_path / "malo.json").write_text("{", encoding="utf-8")
+    (tmp_path / "malo.xlsx").write_bytes(b"PK\x03\x04 cortado")
+    codigo = "import app_servqual_plan_accion as a, servqual_catalog as c; print(a.CATALOGO is c.CATALOGO_INTEGRADO)"
+    for ruta in (tmp_path / "malo.json", tmp_path / "malo.xlsx", tmp_path / "no_existe.json"):
+        salida = subprocess.run(
+            [sys.executable, "-c", codigo], capture_output=True, text=True, check=True, cwd=RAIZ,
+            env={**os.environ, "SERVQUAL_CATALOGO": str(ruta)},
+        )
+        assert salida.stdout.strip() == "True"
+        assert "RuntimeWarning" in salida.stderr and ruta.name in salida.stderr
+
+
+def test_catalogo_no_carga_pandas():
+    codigo = "import sys, servqual_catalog; print('pandas' in sys.modules)"
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True, cwd=RAIZ)
+    assert salida.stdout.strip() == "False"
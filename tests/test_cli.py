@@ -0,0 +1,34 @@
+"""Línea de comandos: alta masiva, verificación, bajas y resúmenes."""
+from __future__ import annotations
+
+import contextlib
+import io
+from datetime import date, timedelta
+
+import servqual_cli
+import servqual_store
+from servqual_store import ID_COL
+
+
+def test_plan_verificar_y_eliminar(matriz, tmp_path):
+    cli = ["--datos", str(tmp_path / "cli.csv")]
+    sucursales = list(matriz.SUCURSALES)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        assert servqual_cli.main(cli + ["plan", "--dimensiones", "FIA", "EMP", "--sucursales", *sucursales]) == 0
+        assert servqual_cli.main(cli + ["verificar"]) == 0
+        assert servqual_cli.main(cli + ["eliminar", "--dimension", "EMP", "--confirmar"]) == 0
+    filas = servqual_store.get_store(tmp_path / "cli.csv", matriz.COLS).load()
+    assert len(filas) == 5 * len(sucursales) and set(filas["Dimensión"]) == {"FIABILIDAD"}
+
+
+def test_resumenes_por_responsable(matriz, fia, tmp_path):
+    nuevas = matriz.insert_rows(fia[matriz.COLS])
+    resp = nuevas["Responsable"].iloc[0]
+    vencida = {"Fecha seguimiento": str(date.today() - timedelta(days=40)), "Plazo": "30 días"}
+    matriz.update_row(nuevas[ID_COL].iloc[0], vencida)
+    resumenes = tmp_path / "resumenes"
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert servqual_cli.main(["--datos", str(matriz.DATAFILE), "resumenes", str(resumenes)]) == 0
+    texto = (resumenes / f"{servqual_cli._archivo_de(resp)}.md").read_text(encoding="utf-8")
+    assert texto.startswith(f"# Plazos de {resp}")
+    assert servqual_cli.escribir_resumenes(resumenes, 7) == 0  # sin cambios no reescribe
@@ -0,0 +1,34 @@
+"""Ingesta de encuestas por bloques y alta de las preguntas críticas."""
+from __future__ import annotations
+
+
+def test_ingerir_encuestas(matriz, tmp_path):
+    sucursal = matriz.SUCURSALES[-1]
+    encuestas = tmp_path / "respuestas.csv"
+    encuestas.write_text(
+        "Clínica,FIA_P001,E_FIA_P001,FIA_P001_SUB,EMP_P016\n"
+        + f"{sucursal.lower()},2,5,Explicación confusa,5\n" * 30
+        + f"{sucursal},4,4,,Sí\n" * 10,
+        encoding="utf-8",
+    )
+    indicadores, agregadas = matriz.ingerir_encuestas(encuestas, chunk_rows=7)
+    fia = indicadores.set_index("Código").loc["FIA_P001"]
+    assert fia["Respuestas"] == 40 and fia["% Insatisfacción"] == 75.0
+    assert fia["Brecha media"] == -2.25 and fia["Subproblema frecuente"].startswith("FIA_P001A")
+    assert agregadas[["Código", "Sucursal"]].values.tolist() == [["FIA_P001", sucursal]]
+    assert agregadas["Acción correctiva"].iloc[0].startswith("Estandarizar guion")
+    assert matriz.ingerir_encuestas(encuestas)[1].empty
+
+
+def test_formato_largo_con_bloques_sin_codigo(matriz, tmp_path):
+    sucursal = matriz.SUCURSALES[0]
+    encuestas = tmp_path / "largo.csv"
+    encuestas.write_text(
+        "sucursal,codigo,respuesta\n"
+        + f"{sucursal},,3\n" * 5  # el primer bloque no trae ningún código
+        + f"{sucursal}, fia_p002 ,1\n" * 4,
+        encoding="utf-8",
+    )
+    indicadores, agregadas = matriz.ingerir_encuestas(encuestas, chunk_rows=5, min_respuestas=1)
+    assert indicadores.set_index("Código").loc["FIA_P002", "Respuestas"] == 4
+    assert agregadas["Código"].tolist() == ["FIA_P002"]
@@ -0,0 +1,24 @@
+"""Exportación a Excel por bloques, con tope de tamaño."""
+from __future__ import annotations
+
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+from servqual_export import ExportTooLarge
+
+
+def test_export_excel_por_bloques(matriz, fia):
+    matriz.insert_rows(fia[matriz.COLS])
+    avances = []
+    xlsx = matriz.export_excel(progress=lambda n, total: avances.append((n, total)))
+    filas = list(load_workbook(io.BytesIO(xlsx), read_only=True).active.values)
+    assert list(filas[0]) == matriz.COLS and len(filas) == len(fia) + 1
+    assert avances[-1] == (len(fia), len(fia))
+
+
+def test_export_excel_respeta_el_tope(matriz, fia):
+    matriz.insert_rows(fia[matriz.COLS])
+    with pytest.raises(ExportTooLarge):
+        matriz.export_excel(max_bytes=1024)
@@ -0,0 +1,28 @@
+"""Historial de cambios: matriz a una fecha y trayectoria de una fila."""
+from __future__ import annotations
+
+import time
+from datetime import datetime
+
+import servqual_historia
+from servqual_store import ID_COL
+
+
+def test_matriz_a_una_fecha_y_trayectoria(almacen, fia):
+    almacen.insert_rows(fia[almacen.COLS])
+    previo, marca = almacen.load_data().sort_values(ID_COL, ignore_index=True), datetime.now()
+    time.sleep(0.01)
+    fila = previo.iloc[0]
+    with servqual_historia.como_usuario("auditor"):
+        almacen.update_row(fila[ID_COL], {"% Avance": 40})
+        almacen.update_row(fila[ID_COL], {"% Avance": 80, "Estado": "Completado"})
+    pasado = almacen.matriz_a_la_fecha(marca).sort_values(ID_COL, ignore_index=True)
+    assert pasado[ID_COL].tolist() == previo[ID_COL].tolist()
+    assert pasado["% Avance"].tolist() == previo["% Avance"].tolist()
+    assert len(almacen.matriz_a_la_fecha()) == len(almacen.load_data())
+
+    trayecto = almacen.historial_cambios(fila["Código"], fila["Sucursal"], columnas=["% Avance"])
+    assert trayecto["despues"].tolist()[-2:] == [40, 80]
+    assert set(trayecto["usuario"].iloc[-2:]) == {"auditor"}
+    serie = almacen.serie_avance()
+    assert set(serie["Sucursal"]) == set(previo["Sucursal"]) and serie["Fecha"].nunique() >= 1
@@ -0,0 +1,34 @@
+"""Importación del libro de seguimiento (encabezados de la app React)."""
+from __future__ import annotations
+
+from openpyxl import Workbook
+
+
+def test_import_excel_por_bloques(matriz, tmp_path):
+    sucursal = matriz.SUCURSALES[-1]
+    wb = Workbook()
+    wb.active.title = "Catalogo"
+    hoja = wb.create_sheet("BD_SERVQUAL")
+    hoja.append(["codigo", "SUBCODIGO", "texto_subpregunta", "Sucursal", "activa", "avance"])
+    hoja.append(["fia_p002", "FIA_P002B", "Cola muy larga", sucursal, "Sí", 150])
+    hoja.append(["FIA_P002", "FIA_P002C", "", sucursal, True, 0])
+    hoja.append(["FIA_P003", "FIA_P003A", "", sucursal, False, 0])
+    hoja.append(["CAP_P006", "", "", sucursal, 1, 40])
+    libro = tmp_path / "seguimiento.xlsx"
+    wb.save(libro)
+
+    assert matriz.import_excel(libro, chunk_rows=2) == (4, 2)
+    fila = matriz.filter_data(sucursal=sucursal).set_index("Código").loc["FIA_P002"]
+    assert fila["Subproblema identificado"] == "FIA_P002B - Cola muy larga" and fila["% Avance"] == 100
+    assert fila["Acción correctiva"].startswith("Implementar gestión de colas")
+    assert fila["Pregunta evaluada"] == matriz.PREGUNTAS["FIA_P002"][1]
+    assert matriz.import_excel(libro) == (4, 0)
+
+
+def test_encabezados_con_el_normalizador_comun():
+    from servqual_catalog import buscar_hoja
+    from servqual_libro import resolver_encabezado
+
+    columnas = resolver_encabezado(["Código_Pregunta", "% Avance", " SUCURSAL ", "Acción  correctiva"])
+    assert columnas == [(0, "Código"), (1, "% Avance"), (2, "Sucursal"), (3, "Acción correctiva")]
+    assert buscar_hoja(["Resumen", "BD_SERVQUAL"], r"bd|base") == "BD_SERVQUAL"
@@ -0,0 +1,23 @@
+"""Instrumentación: tramos anidados, contadores y bitácora JSON."""
+from __future__ import annotations
+
+import json
+
+import servqual_metricas
+
+
+def test_tramos_y_contadores(matriz, fia, tmp_path):
+    matriz.insert_rows(fia[matriz.COLS])
+    bitacora = tmp_path / "metricas.jsonl"
+    servqual_metricas.activar(bitacora)
+    with servqual_metricas.tramo("prueba"):
+        matriz.load_data()
+        matriz.page_data(page_size=5)
+    servqual_metricas.desactivar()
+    tramos = {f["tramo"]: f for f in servqual_metricas.resumen()}
+    assert {"prueba", "load_data", "page_data"} <= set(tramos) and tramos["load_data"]["llamadas"] == 1
+    assert servqual_metricas.contadores()["filas_pagina"] == 5
+    eventos = [json.loads(x) for x in bitacora.read_text(encoding="utf-8").splitlines()]
+    assert any(e.get("tramo") == "load_data" and e.get("padre") == "prueba" for e in eventos)
+    matriz.load_data()
+    assert servqual_metricas.resumen() == list(tramos.values())  # apagada no registra
@@ -0,0 +1,82 @@
+"""Fechas límite (Fecha seguimiento + Plazo) indexadas por responsable y sucursal."""
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import servqual_plazos
+from servqual_store import ID_COL, VER_COL, ConflictError
+
+
+def _cargar(app):
+    plan = app.construir_plan(["FIABILIDAD", "EMPATÍA"], app.SUCURSALES[:2], app.RESPONSABLES[:2])
+    app.agregar_plan(plan)
+    return app.load_data()
+
+
+def test_agenda_por_responsable(matriz):
+    hoy = date.today()
+    abierta = _cargar(matriz).iloc[0]
+    rid, resp = int(abierta[ID_COL]), abierta["Responsable"]
+    matriz.update_row(rid, {"Fecha seguimiento": str(hoy - timedelta(days=40)), "Plazo": "30 días"})
+    agenda = matriz.agenda_plazos(responsable=resp)
+    assert agenda.loc[agenda[ID_COL] == rid, ["Situación", "Días"]].values.tolist() == [["Vencida", -10]]
+    assert agenda["Vencimiento"].is_monotonic_increasing and set(agenda["Responsable"]) == {resp}
+    matriz.update_row(rid, {"Plazo": "2 meses"})
+    assert rid not in matriz.agenda_plazos(responsable=resp)[ID_COL].tolist()
+    assert rid in matriz.agenda_plazos(responsable=resp, dias=30)[ID_COL].tolist()
+    matriz.update_row(rid, {"Estado": "Completado"})
+    assert rid not in matriz.agenda_plazos(dias=90)[ID_COL].tolist()
+
+    todo = matriz.load_data()
+    limite = servqual_plazos.vencimientos(todo["Fecha seguimiento"], todo["Plazo"])
+    esperado = (limite <= pd.Timestamp(hoy + timedelta(days=7))).to_numpy() & (todo["Estado"] != "Completado").to_numpy()
+    assert sorted(matriz.agenda_plazos()[ID_COL]) == sorted(todo.loc[esperado, ID_COL])
+
+
+def test_agenda_por_sucursal(almacen):
+    pendiente = _cargar(almacen).iloc[0]
+    rid = int(pendiente[ID_COL])
+    desde = almacen.revision_actual()
+    version = almacen.update_row(rid, {"Fecha seguimiento": str(date.today() - timedelta(days=3)), "Plazo": "1 semana"})
+    assert almacen.cambios_desde(desde).filas[ID_COL].tolist() == [rid]
+    assert almacen.get_row(rid)[VER_COL] == version
+    try:
+        almacen.update_row(rid, {"Plazo": "2 días"}, version=int(pendiente[VER_COL]))
+        raise AssertionError("Se pisó una fila cambiada")
+    except ConflictError:
+        pass
+    agenda = almacen.agenda_plazos(sucursal=pendiente["Sucursal"])
+    assert agenda.loc[agenda[ID_COL] == rid, "Días"].tolist() == [4]
+    assert set(agenda["Sucursal"]) == {pendiente["Sucursal"]}
+
+
+def test_lapsos_y_fechas_fijas():
+    lapso = servqual_plazos.lapso
+    assert lapso("2 semanas hábiles") == servqual_plazos.Lapso(habiles=10)
+    assert lapso("15 días hábiles") == servqual_plazos.Lapso(habiles=15)
+    assert lapso("2 semanas") == servqual_plazos.Lapso(dias=14)
+    for texto in ("05/03/2025", "5-3-2025", "05/03/25", "2025-03-05"):
+        assert lapso(texto) == pd.Timestamp("2025-03-05"), texto
+    assert lapso("12/13/2025") is None and lapso("31/02/2025") is None
+
+
+def test_vencimientos_omite_ids_que_ya_no_estan(matriz, monkeypatch):
+    filas = _cargar(matriz).iloc[:2]
+    for dias, rid in zip((20, 10), filas[ID_COL]):
+        matriz.update_row(int(rid), {"Fecha seguimiento": str(date.today() - timedelta(days=dias)), "Plazo": ""})
+    almacen = matriz._store()
+    hasta = date.today() - timedelta(days=5)
+    almacen.vencimientos(hasta)  # arma el índice
+    proximas = almacen._vence.proximas
+
+    def con_id_perdido(*args):  # un id que el índice aún tiene y la matriz ya no
+        ids, dias = proximas(*args)
+        return np.append(ids, 10**9), np.append(dias, dias.max() + 1)
+
+    monkeypatch.setattr(almacen._vence, "proximas", con_id_perdido)
+    vencidas = almacen.vencimientos(hasta)
+    assert vencidas[ID_COL].tolist() == filas[ID_COL].tolist()
+    assert [d.date() for d in vencidas["Vencimiento"]] == [date.today() - timedelta(days=d) for d in (20, 10)]
@@ -0,0 +1,48 @@
+"""Reportes por sucursal: en el proceso y en un pool dan los mismos libros."""
+from __future__ import annotations
+
+import contextlib
+import io
+from datetime import date, timedelta
+
+import pandas as pd
+from openpyxl import load_workbook
+
+import servqual_cli
+import servqual_plazos
+from servqual_store import ID_COL
+
+
+def test_reportes_por_sucursal(matriz, tmp_path):
+    hoy = date.today()
+    plan = matriz.construir_plan(["FIABILIDAD", "EMPATÍA"], matriz.SUCURSALES[:3], matriz.RESPONSABLES[0])
+    nuevas = matriz.agregar_plan(plan)
+    matriz.update_row(nuevas[ID_COL].iloc[0], {"Fecha seguimiento": str(hoy - timedelta(days=40)), "Plazo": "30 días"})
+    todo = matriz.load_data()
+
+    uno, errores = matriz.generar_reportes(tmp_path / "rep1", hoy=hoy)
+    assert not errores and set(uno) == set(todo["Sucursal"].astype(str))
+    dos, errores = matriz.generar_reportes(tmp_path / "rep2", procesos=2, hoy=hoy)
+    assert not errores and {p.name for p in dos.values()} == {p.name for p in uno.values()}
+
+    sucursal = str(todo.loc[todo[ID_COL] == nuevas[ID_COL].iloc[0], "Sucursal"].iloc[0])
+    propias = todo[todo["Sucursal"].astype(str) == sucursal]
+    limite = servqual_plazos.vencimientos(propias["Fecha seguimiento"], propias["Plazo"])
+    vencidas = int(((limite < pd.Timestamp(hoy)).to_numpy() & (propias["Estado"] != "Completado").to_numpy()).sum())
+    assert vencidas == 1
+    for libros in (uno, dos):
+        wb = load_workbook(libros[sucursal], read_only=True)
+        assert wb.sheetnames == ["Resumen", "Vencidas", "Plan de acción"]
+        assert sum(1 for _ in wb["Plan de acción"].iter_rows()) == len(propias) + 1
+        assert sum(1 for _ in wb["Vencidas"].iter_rows()) == vencidas + 1
+        total = list(wb["Resumen"].iter_rows(values_only=True))[-1]
+        assert total[0] == "Total" and total[1] == len(propias)
+        wb.close()
+
+
+def test_reportes_desde_la_cli(matriz, fia, tmp_path):
+    matriz.insert_rows(fia[matriz.COLS])
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert servqual_cli.main(["--datos", str(matriz.DATAFILE), "reportes", str(tmp_path / "rep")]) == 0
+    assert len(list((tmp_path / "rep").glob("*.xlsx"))) == 1
+    assert not list((tmp_path / "rep").glob(".particion*"))
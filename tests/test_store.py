@@ -0,0 +1,298 @@
+"""Almacenes (bitácora y SQLite) a través del API de la app."""
+from __future__ import annotations
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import servqual_store
+from servqual_snapshot import read_columnar, read_columnar_rows, write_columnar
+from servqual_store import ID_COL, VER_COL, ConflictError, DuplicateKeyError, aplicar_cambios, editadas
+
+
+@pytest.fixture
+def guardadas(almacen, fia):
+    """Las filas de *fia* guardadas; la primera Completada y la última borrada."""
+    nuevas = almacen.insert_rows(fia[almacen.COLS])
+    almacen.update_row(nuevas[ID_COL].iloc[0], {"Estado": "Completado"})
+    almacen.delete_rows([nuevas[ID_COL].iloc[-1]])
+    return nuevas
+
+
+def test_alta_edicion_baja_y_recarga(almacen, fia, guardadas):
+    df = almacen.load_data()
+    assert len(df) == len(fia) - 1
+    assert almacen.get_row(guardadas[ID_COL].iloc[-1]) is None
+    assert almacen.get_row(guardadas[ID_COL].iloc[0])["Estado"] == "Completado"
+    assert df["Estado"].iloc[0] == "Completado"
+    assert almacen.filter_data(estado="Completado")[ID_COL].tolist() == [guardadas[ID_COL].iloc[0]]
+    almacen.compact_data()
+    compactada = almacen.load_data()
+    assert compactada[ID_COL].tolist() == df[ID_COL].tolist()
+    assert compactada["Estado"].tolist() == df["Estado"].tolist()
+
+
+def test_indicadores_incrementales(almacen, guardadas):
+    df = almacen.load_data()
+    kpi = almacen.kpi_resumen(["Sucursal"])
+    assert kpi["Filas"].sum() == len(df)
+    completadas = df.groupby("Sucursal", observed=True)["Estado"].apply(lambda e: (e == "Completado").sum())
+    assert (kpi["Completado"] == completadas.to_numpy()).all()
+    assert almacen.kpi_resumen().loc["Total", "Completado"] == 1
+
+
+def test_paginacion(almacen, guardadas):
+    df = almacen.load_data()
+    pagina, total = almacen.page_data(page=1, page_size=2)
+    assert total == len(df) and pagina[ID_COL].tolist() == df[ID_COL].tolist()[2:4]
+    pagina, total = almacen.page_data(page=1, page_size=2, sort="Estado", descending=True)
+    assert total == len(df) and len(pagina) == 2
+    assert pagina[ID_COL].tolist() == df.sort_values(["Estado", ID_COL], ascending=False)[ID_COL].tolist()[2:4]
+
+
+def test_clave_unica(almacen, fia, guardadas):
+    with pytest.raises(DuplicateKeyError):
+        almacen.insert_rows(fia[almacen.COLS].head(1))
+    plan = almacen.construir_plan(["FIABILIDAD", "EMPATÍA"], almacen.SUCURSALES[:2], almacen.RESPONSABLES[0])
+    df = almacen.load_data()
+    assert len(almacen.agregar_plan(plan)) == len(almacen.upsert_plan(df, plan)) - len(df)
+    assert almacen.agregar_plan(plan).empty
+
+
+def test_save_data_escribe_las_diferencias(almacen, guardadas):
+    df = almacen.load_data()
+    df.loc[df.index[1], "Estado"] = "Completado"
+    nueva = df.iloc[[0]].drop(columns=[ID_COL]).assign(Sucursal=almacen.SUCURSALES[1])
+    df = almacen.pd.concat([df.drop(index=df.index[2]), nueva], ignore_index=True)
+    almacen.save_data(df)
+    recargada = almacen.load_data()
+    assert recargada[ID_COL].tolist() == df[ID_COL].tolist()
+    assert recargada["Estado"].tolist() == df["Estado"].tolist()
+    assert almacen.filter_data(sucursal=almacen.SUCURSALES[1])[ID_COL].tolist() == [df[ID_COL].iloc[-1]]
+
+
+def test_load_data_sin_archivo_es_vacia(almacen):
+    df = almacen.load_data()
+    assert df.empty and set(almacen.COLS) <= set(df.columns)
+
+
+def test_load_data_no_oculta_un_archivo_danado(matriz):
+    matriz.DATAFILE.write_text("")
+    assert matriz.load_data().empty  # vacío: estructura base
+    matriz.servqual_store.close_stores()
+    matriz.DATAFILE.write_text('Código,Sucursal\n"sin cerrar')
+    with pytest.raises(matriz.pd.errors.ParserError):
+        matriz.load_data()
+
+
+def test_save_data_es_un_solo_registro(matriz, fia):
+    matriz.insert_rows(fia[matriz.COLS])
+    df = matriz.load_data().astype({"Estado": object})
+    df.loc[df.index[0], "Estado"] = "Completado"
+    df = matriz.pd.concat([df.drop(index=df.index[1]), df.iloc[[2]].assign(**{ID_COL: None, "Sucursal": "OTRA"})])
+    bitacora = matriz._store().journal
+    lineas = bitacora.read_bytes().count(b"\n")
+    matriz.save_data(df)
+    assert bitacora.read_bytes().count(b"\n") == lineas + 1
+    assert matriz.load_data()[VER_COL].max() == matriz.revision_actual()
+    fila = df.iloc[0]
+    historia = matriz.historial_cambios(fila["Código"], fila["Sucursal"], columnas=["Estado"])
+    assert historia["despues"].tolist()[-1] == "Completado"
+
+    # Una alta que repite la clave no deja escrita ninguna parte del guardado
+    df.loc[df.index[0], "Estado"] = "Pendiente"
+    repetida = df.iloc[[1]].assign(**{ID_COL: None})
+    with pytest.raises(DuplicateKeyError):
+        matriz.save_data(matriz.pd.concat([df, repetida]))
+    assert bitacora.read_bytes().count(b"\n") == lineas + 1
+    assert matriz.get_row(df[ID_COL].iloc[0])["Estado"] == "Completado"
+
+
+def test_lote_cortado_no_se_aplica_a_medias(matriz, fia):
+    matriz.insert_rows(fia[matriz.COLS])
+    df = matriz.load_data()
+    df["Estado"] = "Completado"
+    bitacora = matriz._store().journal
+    tamano = bitacora.stat().st_size
+    matriz.save_data(df.drop(index=df.index[0]))
+    with open(bitacora, "r+b") as fh:
+        fh.truncate(bitacora.stat().st_size - 20)  # corte a mitad de la línea
+    matriz.servqual_store.close_stores()
+    recargada = matriz.load_data()
+    assert len(recargada) == len(fia) and (recargada["Estado"] != "Completado").all()
+    assert bitacora.stat().st_size > tamano
+
+
+# -------------------------------------------------------------
+# Instantánea columnar (.sqcol) e índice de filtros
+# -------------------------------------------------------------
+def test_instantanea_conserva_tipos(tmp_path):
+    df = pd.DataFrame(
+        {
+            "Estado": pd.Categorical(["Pendiente", None, "Completado"]),
+            "Causa raíz": ["falta guion", None, "falta guion"],
+            "Fecha seguimiento": pd.to_datetime(["2025-01-31", None, "2025-03-05"]).astype("datetime64[ns]"),
+            "% Avance": [0, 50, 100],
+            "Nota": [1.5, np.nan, 2.0],
+        }
+    )
+    tipos = {"Estado": "category", "Causa raíz": "text", "Fecha seguimiento": "date", "% Avance": "int", "Nota": "float"}
+    ruta = tmp_path / "matriz.sqcol"
+    write_columnar(df, ruta, tipos, meta={"revision": 3}, fsync=False)
+    leida, meta = read_columnar(ruta)
+    assert meta == {"revision": 3}
+    assert isinstance(leida["Estado"].dtype, pd.CategoricalDtype)
+    assert leida["Causa raíz"].iloc[0] is leida["Causa raíz"].iloc[2]  # el diccionario comparte cadenas
+    pd.testing.assert_frame_equal(leida, df, check_dtype=False, check_categorical=False)
+    rebanada, _ = read_columnar_rows(ruta, 1, 3)
+    pd.testing.assert_frame_equal(rebanada, leida.iloc[1:3].reset_index(drop=True))
+
+
+def test_carga_despues_de_compactar(matriz, fia):
+    ids = matriz.insert_rows(fia[matriz.COLS])[ID_COL].tolist()
+    matriz.update_row(ids[1], {"Fecha seguimiento": "2025-02-28", "Causa raíz": "turnos", "Estado": "Completado"})
+    matriz.delete_rows([ids[-1]])
+    antes = matriz.load_data()
+    matriz.compact_data()
+    almacen = matriz._store()
+    assert almacen.snapshot.exists() and almacen.journal.stat().st_size == 0
+    servqual_store.close_stores()  # un proceso nuevo solo tiene la instantánea
+    despues = matriz.load_data()
+    assert isinstance(despues["Estado"].dtype, pd.CategoricalDtype)
+    assert despues["Fecha seguimiento"].dtype.kind == "M" and despues["% Avance"].dtype == "int64"
+    pd.testing.assert_frame_equal(despues, antes, check_categorical=False)
+    assert despues.attrs["revision"] == antes.attrs["revision"]
+
+
+def test_filtros_iguales_a_una_mascara(matriz):
+    plan = matriz.construir_plan(["FIABILIDAD", "EMPATÍA"], matriz.SUCURSALES[:2], matriz.RESPONSABLES[:2])
+    ids = matriz.agregar_plan(plan)[ID_COL].tolist()
+    matriz.update_row(ids[0], {"Estado": "Completado", "Responsable": matriz.RESPONSABLES[1]})
+    matriz.update_row(ids[6], {"Dimensión": "EMPATÍA"})
+    matriz.delete_rows(ids[2:4])
+    matriz.compact_data()  # purga las lápidas y recorre las posiciones del índice
+    matriz.update_row(ids[7], {"Estado": "En proceso"})
+    matriz.delete_rows([ids[8]])
+
+    df = matriz.load_data()
+    columnas = dict(zip(matriz.FILTER_COLS, ("dimension", "responsable", "estado", "sucursal")))
+    opciones = [[None, *df[col].dropna().unique()] for col in columnas]
+    for valores in product(*opciones):
+        mascara = np.ones(len(df), dtype=bool)
+        for col, valor in zip(columnas, valores):
+            if valor is not None:
+                mascara &= (df[col] == valor).to_numpy()
+        filtradas = matriz.filter_data(**dict(zip(columnas.values(), valores)))
+        assert sorted(filtradas[ID_COL]) == sorted(df.loc[mascara, ID_COL]), valores
+
+
+# -------------------------------------------------------------
+# Concurrencia optimista: versión por fila, fusión por columnas y delta
+# -------------------------------------------------------------
+def test_edicion_condicional_y_fusion(almacen, guardadas):
+    copia = almacen.load_data()
+    fila = copia.iloc[1].to_dict()
+    almacen.update_row(fila[ID_COL], {"Causa raíz": "otra sesión"})  # escribe otra sesión
+    with pytest.raises(ConflictError) as exc:
+        almacen.update_row(fila[ID_COL], {"% Avance": 55}, version=fila[VER_COL])
+    assert exc.value.ids == [fila[ID_COL]]
+
+    editada = {**{c: fila[c] for c in almacen.COLS}, "% Avance": 55}
+    assert editadas(fila, {**editada, "% Avance": "55"}, almacen.DTYPES) == {"% Avance": "55"}
+    version = almacen.update_row(fila[ID_COL], editada, version=fila[VER_COL], base=fila)
+    actual = almacen.get_row(fila[ID_COL])
+    assert actual["Causa raíz"] == "otra sesión" and actual["% Avance"] == 55 and actual[VER_COL] == version
+
+    with pytest.raises(ConflictError) as exc:
+        almacen.update_row(fila[ID_COL], {"Causa raíz": "mía"}, version=fila[VER_COL], base=fila)
+    assert exc.value.columnas == ["Causa raíz"]
+
+
+def test_save_data_no_pisa_cambios_ajenos(almacen, guardadas):
+    copia = almacen.load_data()
+    rid = copia[ID_COL].iloc[1]
+    almacen.update_row(rid, {"Causa raíz": "otra sesión"})
+    vieja = copia.copy()
+    vieja.loc[vieja[ID_COL] == rid, "Plazo"] = "1 día"
+    with pytest.raises(ConflictError):
+        almacen.save_data(vieja)
+    assert almacen.get_row(rid)["Plazo"] != "1 día"
+
+
+def test_delta_desde_una_revision(almacen, guardadas):
+    copia = almacen.load_data()
+    rid, borrada = copia[ID_COL].iloc[1], copia[ID_COL].iloc[-1]
+    almacen.update_row(rid, {"% Avance": 55})
+    almacen.delete_rows([borrada])
+    delta = almacen.cambios_desde(copia.attrs["revision"])
+    assert delta.filas[ID_COL].tolist() == [rid] and delta.borradas == [borrada]
+    al_dia = aplicar_cambios(copia, delta)
+    assert al_dia[ID_COL].tolist() == almacen.load_data()[ID_COL].tolist()
+    assert delta.revision == almacen.revision_actual()
+    assert al_dia.loc[al_dia[ID_COL] == rid, "% Avance"].tolist() == [55]
+    assert almacen.cambios_desde(delta.revision).filas.empty
+
+
+def test_edicion_en_su_lugar_sin_tocar_lecturas(matriz, fia):
+    nuevas = matriz.insert_rows(fia[matriz.COLS])
+    almacen = matriz._store()
+    rid = int(nuevas[ID_COL].iloc[1])
+    vista = almacen.shared()
+    almacen.update(rid, {"% Avance": 40})
+    assert vista["% Avance"].iloc[1] == fia["% Avance"].iloc[1]  # la lectura conserva su versión
+
+    del vista
+    direccion = lambda: almacen._df["% Avance"].to_numpy().__array_interface__["data"][0]  # noqa: E731
+    antes = direccion()
+    version = almacen.update(rid, {"% Avance": 60})
+    assert direccion() == antes  # sin lectores, la columna no se copia
+    fila = almacen.get_rows([rid]).iloc[0]
+    assert fila["% Avance"] == 60 and fila[VER_COL] == version
+
+
+def test_cambios_de_otro_proceso_por_los_ganchos(matriz, fia):
+    matriz.insert_rows(fia[matriz.COLS])
+    local = matriz._store()
+    matriz.filter_data(estado="Completado", q="fiabilidad")
+    matriz.kpi_resumen()
+    local.vencimientos("2100-01-01")
+    indices = [local._index, local._texto, local._keys, local._kpi, local._vence]
+
+    otro = type(local)(
+        local.path, local.columns, dtypes=local.dtypes, index_columns=local.index_columns,
+        unique_key=local.unique_key, kpi=local.kpi_spec, text_columns=local.text_columns,
+        plazos=local.plazos_spec,
+    )
+    ids = otro.frame()[ID_COL].tolist()
+    otro.update(ids[0], {"Estado": "Completado"})
+    otro.delete([ids[1]])
+    nuevas = otro.insert(fia[matriz.COLS].head(1).assign(Sucursal=matriz.SUCURSALES[1]))
+
+    assert local.refresh()
+    assert all(a is b for a, b in zip(indices, [local._index, local._texto, local._keys, local._kpi, local._vence]))
+    assert local.revision == otro.revision
+    assert local.frame()[ID_COL].tolist() == otro.frame()[ID_COL].tolist()
+    assert local.frame()[VER_COL].tolist() == otro.frame()[VER_COL].tolist()
+    assert matriz.filter_data(estado="Completado", q="fiabilidad")[ID_COL].tolist() == [ids[0]]
+    assert local.has_keys(nuevas).all()
+    assert matriz.kpi_resumen().loc["Total", "Completado"] == 1
+    pendientes = local.vencimientos("2100-01-01")[ID_COL].tolist()
+    assert ids[1] not in pendientes and nuevas[ID_COL].iloc[0] in pendientes
+
+
+def test_sqlite_recuerda_solo_las_bajas_recientes(matriz, fia, monkeypatch):
+    import servqual_sqlite
+
+    monkeypatch.setattr(matriz, "DATAFILE", matriz.DATAFILE.with_suffix(".db"))
+    monkeypatch.setattr(servqual_sqlite, "MAX_BAJAS", 2)
+    ids = matriz.insert_rows(fia[matriz.COLS])[ID_COL].tolist()
+    assert ids == list(range(ids[0], ids[0] + len(fia)))  # los _id del executemany
+    inicio = matriz.revision_actual()
+    for rid in ids[:4]:
+        matriz.delete_rows([rid])
+    assert matriz._store()._conn().execute("SELECT count(*) FROM _bajas").fetchone()[0] == 2
+    assert matriz.cambios_desde(inicio).completa
+    reciente = matriz.cambios_desde(matriz.revision_actual() - 2)
+    assert not reciente.completa and reciente.borradas == ids[2:4]